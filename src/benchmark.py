@@ -0,0 +1,295 @@
+"""
+帧提取性能基准
+
+在本地生成确定性的合成视频（不同分辨率、帧率、GOP 和时长），用每种提取后端和模式
+分别处理，记录处理速度、耗时、峰值内存和写入的字节数，结果保存为 JSON，
+并可以和保存的基准结果比较，发现性能回退。
+
+用法:
+    python benchmark.py                         # 快速档位，结果写入 benchmark_result.json
+    python benchmark.py --profile full --repeat 3
+    python benchmark.py --baseline baseline.json --tolerance 0.15
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from extractor.metrics import METRICS
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块，不记录峰值内存
+    resource = None
+
+# 合成视频规格: 名称 -> (宽, 高, 帧率, GOP, 时长秒)
+VIDEO_PROFILES = {
+    'quick': {
+        '480p25_gop12': (854, 480, 25, 12, 8),
+        '720p30_gop250': (1280, 720, 30, 250, 8),
+    },
+    'full': {
+        '480p25_gop12': (854, 480, 25, 12, 20),
+        '720p30_gop60': (1280, 720, 30, 60, 20),
+        '720p60_gop250': (1280, 720, 60, 250, 20),
+        '1080p30_gop30': (1920, 1080, 30, 30, 20),
+        '1080p30_gop250': (1920, 1080, 30, 250, 60),
+    },
+}
+
+# 提取后端: 名称 -> (模块, 函数, 参数)
+# patch_exe 和 patch_exe_page 的提取代码相同，这里用不依赖 tkinter 的 patch_exe_page
+CASES = {
+    'patch': ('patch', 'extract_frames', {'interval': 1.0}),
+    'patch_exe': ('patch_exe_page', 'extract_frames', {'interval': 1.0}),
+    'patch_exe_scan': ('patch_exe_page', 'extract_frames', {'interval': 1.0, 'sampling': 'scan'}),
+    'patch_exe_ffmpeg': ('patch_exe_page', 'extract_frames', {'interval': 1.0, 'decoder': 'ffmpeg'}),
+    'patch_exe_scene': ('patch_exe_page', 'extract_frames', {'interval': 1.0, 'mode': 'scene'}),
+    'keyframes': ('extract_keyframes', 'extract_keyframes', {}),
+}
+
+# 依赖 ffmpeg 命令行的后端
+FFMPEG_CASES = ('patch_exe_ffmpeg', 'keyframes')
+
+
+def has_ffmpeg():
+    return shutil.which('ffmpeg') is not None
+
+
+def synthetic_frame(index, width, height):
+    """生成第 index 帧：渐变背景加移动的色块，每 3 秒换一次底色制造场景切换"""
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    scene = index // 75
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[..., 0] = (x + index * 3) % 256
+    frame[..., 1] = (y + scene * 85) % 256
+    frame[..., 2] = (scene * 53) % 256
+    size = max(8, height // 6)
+    left = (index * 7) % max(1, width - size)
+    top = (index * 5) % max(1, height - size)
+    frame[top:top + size, left:left + size] = (255 - scene * 40 % 256, 255, 0)
+    return frame
+
+
+def generate_video(path, width, height, fps, gop, duration):
+    """
+    生成合成视频，内容只由帧序号决定
+
+    有 ffmpeg 时用 testsrc2 信号源编码成 H.264，按 gop 设置关键帧间隔；
+    否则用 OpenCV 写 mp4v，此时无法控制 GOP。
+    """
+    if has_ffmpeg():
+        source = f'testsrc2=size={width}x{height}:rate={fps}:duration={duration}'
+        cmd = ['ffmpeg', '-nostdin', '-v', 'error', '-y', '-f', 'lavfi', '-i', source,
+               '-c:v', 'libx264', '-preset', 'veryfast', '-threads', '1', '-g', str(gop),
+               '-keyint_min', str(gop), '-sc_threshold', '0', '-bf', '0', '-pix_fmt', 'yuv420p', path]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode == 0:
+            return gop
+        print(f"[!] ffmpeg 生成视频失败，改用 OpenCV: {result.stderr.strip()}")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"无法写入视频: {path}")
+    try:
+        for index in range(int(fps * duration)):
+            writer.write(synthetic_frame(index, width, height))
+    finally:
+        writer.release()
+    return None
+
+
+def prepare_videos(profile, work_dir):
+    """生成（或复用已生成的）合成视频，返回 {名称: 视频信息}"""
+    os.makedirs(work_dir, exist_ok=True)
+    videos = {}
+    for name, (width, height, fps, gop, duration) in VIDEO_PROFILES[profile].items():
+        path = os.path.join(work_dir, f'{name}_{duration}s.mp4')
+        info_path = path + '.json'
+        if os.path.exists(path) and os.path.exists(info_path):
+            with open(info_path, encoding='utf-8') as f:
+                videos[name] = json.load(f)
+            continue
+        print(f"[+] 生成合成视频: {name}")
+        actual_gop = generate_video(path, width, height, fps, gop, duration)
+        info = {'path': path, 'width': width, 'height': height, 'fps': fps, 'gop': actual_gop,
+                'duration': duration, 'frames': int(fps * duration)}
+        with open(info_path, 'w', encoding='utf-8') as f:
+            json.dump(info, f)
+        videos[name] = info
+    return videos
+
+
+def peak_rss_bytes():
+    """当前进程及其已结束子进程（ffmpeg）的峰值常驻内存"""
+    if resource is None:
+        return None
+    # Linux 上 ru_maxrss 单位是 KB，macOS 上是字节
+    scale = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * scale
+
+
+def _run_case(case, video_path, output_dir, conn):
+    """在独立进程中运行一个用例，峰值内存只反映这一次提取"""
+    module_name, func_name, kwargs = CASES[case]
+    module = __import__(module_name)
+    extract = getattr(module, func_name)
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        extract(video_path, output_dir, **kwargs)
+        wall = time.perf_counter() - start
+    # 各阶段累计耗时（秒），流水线各阶段并行执行，总和可以超过墙钟时间
+    stages = {stage: round(total, 4) for stage, (_, total) in METRICS.stage_summary('frame_stage_seconds').items()}
+    conn.send({'wall': wall, 'peak_rss': peak_rss_bytes(), 'stages': stages})
+    conn.close()
+
+
+def output_stats(output_dir):
+    """统计输出目录中的图片数量和字节数"""
+    frames = 0
+    size = 0
+    for entry in os.scandir(output_dir):
+        if entry.is_file() and entry.name.endswith('.jpg'):
+            frames += 1
+            size += entry.stat().st_size
+    return frames, size
+
+
+def run_case(case, video, work_dir):
+    """运行一次用例并返回测量结果"""
+    output_dir = tempfile.mkdtemp(prefix=f'{case}_', dir=work_dir)
+    try:
+        ctx = multiprocessing.get_context('spawn')
+        receiver, sender = ctx.Pipe(duplex=False)
+        process = ctx.Process(target=_run_case, args=(case, video['path'], output_dir, sender))
+        process.start()
+        sender.close()
+        try:
+            measured = receiver.recv()
+        except EOFError:
+            measured = None
+        process.join()
+        if measured is None:
+            raise RuntimeError(f"{case} 运行失败，退出码 {process.exitcode}")
+        frames_saved, bytes_written = output_stats(output_dir)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    wall = measured['wall']
+    return {
+        'wall_seconds': round(wall, 4),
+        'source_fps': round(video['frames'] / wall, 2) if wall > 0 else None,
+        'frames_saved': frames_saved,
+        'bytes_written': bytes_written,
+        'peak_rss_bytes': measured['peak_rss'],
+        'stage_seconds': measured['stages'],
+    }
+
+
+def run_benchmark(profile='quick', cases=None, repeat=1, work_dir=None):
+    """
+    运行整套基准
+
+    每个（视频, 后端）组合运行 repeat 次，取耗时最短的一次。
+    """
+    work_dir = work_dir or os.path.join(tempfile.gettempdir(), 'yt_short_pic_benchmark')
+    videos = prepare_videos(profile, work_dir)
+    cases = list(cases or CASES)
+    if not has_ffmpeg():
+        skipped = [case for case in cases if case in FFMPEG_CASES]
+        if skipped:
+            print(f"[!] 未检测到ffmpeg，跳过: {', '.join(skipped)}")
+        cases = [case for case in cases if case not in FFMPEG_CASES]
+
+    results = []
+    for video_name, video in videos.items():
+        for case in cases:
+            runs = [run_case(case, video, work_dir) for _ in range(max(1, repeat))]
+            best = min(runs, key=lambda run: run['wall_seconds'])
+            best.update(case=case, video=video_name)
+            results.append(best)
+            print(f"📊 {video_name:<16} {case:<18} {best['wall_seconds']:>8.3f} 秒 "
+                  f"{best['source_fps'] or 0:>9.1f} 帧/秒  保存 {best['frames_saved']} 帧")
+    return {
+        'profile': profile,
+        'repeat': repeat,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'ffmpeg': has_ffmpeg(),
+        },
+        'videos': videos,
+        'results': results,
+    }
+
+
+def compare_with_baseline(current, baseline, tolerance=0.15):
+    """
+    和基准结果比较，返回回退列表
+
+    耗时增加或峰值内存增加超过 tolerance 的比例视为回退；保存帧数不同说明输出变了，也视为回退。
+    """
+    previous = {(r['video'], r['case']): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = previous.get((result['video'], result['case']))
+        if old is None:
+            continue
+        key = f"{result['video']}/{result['case']}"
+        if result['wall_seconds'] > old['wall_seconds'] * (1 + tolerance):
+            regressions.append(f"{key}: 耗时 {old['wall_seconds']:.3f} → {result['wall_seconds']:.3f} 秒")
+        if result['peak_rss_bytes'] and old.get('peak_rss_bytes') and \
+                result['peak_rss_bytes'] > old['peak_rss_bytes'] * (1 + tolerance):
+            regressions.append(f"{key}: 峰值内存 {old['peak_rss_bytes'] // 2**20} → "
+                               f"{result['peak_rss_bytes'] // 2**20} MiB")
+        if result['frames_saved'] != old['frames_saved']:
+            regressions.append(f"{key}: 保存帧数 {old['frames_saved']} → {result['frames_saved']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='帧提取性能基准')
+    parser.add_argument('--profile', choices=sorted(VIDEO_PROFILES), default='quick', help='合成视频档位')
+    parser.add_argument('--case', action='append', choices=sorted(CASES), help='只运行指定后端，可重复')
+    parser.add_argument('--repeat', type=int, default=1, help='每个组合运行的次数，取最快的一次')
+    parser.add_argument('--work-dir', help='合成视频和临时输出的目录')
+    parser.add_argument('--output', default='benchmark_result.json', help='结果 JSON 文件')
+    parser.add_argument('--baseline', help='用于比较的基准结果 JSON 文件')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='允许的退化比例')
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.profile, args.case, args.repeat, args.work_dir)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"[+] 结果已保存: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(result, baseline, args.tolerance)
+        if regressions:
+            print("❌ 发现性能回退:")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print("✅ 与基准相比没有回退")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,7 +1,22 @@
 import os
 import subprocess
 import sys
+import multiprocessing
 from pathlib import Path
+from extractor.batch import default_workers
+from extractor.manifest import Manifest
+from extractor.metrics import METRICS
+from extractor.pipeline import STAGE_METRIC
+from extractor.dedup import dedup_folder
+from extractor.engine import process_folder, watch_folder
+from extractor.naming import keep_folder_name
+
+# 写入清单的提取参数，任一参数变化都会重新处理视频
+KEYFRAME_PARAMS = {'mode': 'keyframes', 'qscale': 2, 'naming': 'keyframe_%d.jpg'}
+
+def keyframe_params(dedup=None):
+    """关键帧提取写入清单的参数"""
+    return dict(KEYFRAME_PARAMS, dedup=dedup.params() if dedup is not None else None)
 
 # 路径
 # /Users/zzf/youtube/311
@@ -17,16 +32,28 @@ def ensure_ffmpeg():
         print("brew install ffmpeg")
         return False
 
-def extract_keyframes(video_path, output_dir):
-    """使用ffmpeg提取视频关键帧"""
+def extract_keyframes(video_path, output_dir, manifest_path=None, dedup=None, codec_threads=None):
+    """
+    使用ffmpeg提取视频关键帧
+    
+    指定 manifest_path 时在完成后写入增量处理清单；指定 dedup (FrameDeduplicator)
+    时提取完成后删除（或硬链接）与已有帧重复的关键帧；codec_threads 为 ffmpeg 的线程数
+    """
     try:
+        if manifest_path:
+            # ffmpeg 一次写完所有关键帧，中断过的视频直接整段重新提取
+            with Manifest(manifest_path) as manifest:
+                manifest.begin(video_path, keyframe_params(dedup), output_dir)
+
         # 创建输出目录
         os.makedirs(output_dir, exist_ok=True)
         print(f"[+] 创建目录: {output_dir}")
 
         # 构建ffmpeg命令
-        cmd = [
-            'ffmpeg',
+        cmd = ['ffmpeg']
+        if codec_threads:
+            cmd += ['-threads', str(codec_threads)]  # 解码线程数，避免多个进程同时占满所有核心
+        cmd += [
             '-i', str(video_path),  # 输入文件
             '-vf', 'select=eq(pict_type\,I)',  # 只选择I帧（关键帧）
             '-vsync', 'vfr',  # 可变帧率
@@ -38,15 +65,29 @@ def extract_keyframes(video_path, output_dir):
 
         # 运行ffmpeg命令
         print(f"[+] 开始提取关键帧...")
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        with METRICS.timer(STAGE_METRIC, stage='keyframes'):
+            result = subprocess.run(cmd, capture_output=True, text=True)
 
         if result.returncode != 0:
             print(f"❌ 提取关键帧失败: {result.stderr}")
+            METRICS.inc('videos_total', status='error')
             return 0
 
         # 计算提取的帧数
         frames = len([f for f in os.listdir(output_dir) if f.endswith('.jpg')])
         print(f"✅ 成功提取 {frames} 个关键帧")
+        if dedup is not None:
+            # ffmpeg 会覆盖该目录下的旧帧，先清掉旧记录再逐帧查重
+            dedup.forget_folder(output_dir)
+            frames, duplicates = dedup_folder(output_dir, dedup)
+            METRICS.inc('frames_duplicate_total', duplicates)
+            dedup.close()
+            print(f"♻️ 去除 {duplicates} 个重复关键帧，保留 {frames} 个")
+        if manifest_path:
+            with Manifest(manifest_path) as manifest:
+                manifest.finish(video_path, frames)
+        METRICS.inc('videos_total', status='ok')
+        METRICS.inc('frames_saved_total', frames)
         return frames
 
     except Exception as e:
@@ -55,41 +96,38 @@ def extract_keyframes(video_path, output_dir):
         traceback.print_exc()
         return 0
 
-def process_videos_in_folder(input_folder, output_base_folder):
-    """处理指定文件夹中的所有视频文件"""
-    video_extensions = ['.mp4', '.avi', '.mov', '.mkv']
-    total_frames = 0
-    processed_videos = 0
-    
-    # 获取所有视频文件
-    video_files = [
-        f for f in os.listdir(input_folder) 
-        if any(f.lower().endswith(ext) for ext in video_extensions)
-    ]
+def process_videos_in_folder(input_folder, output_base_folder, workers=1, incremental=True, dedup=False,
+                             codec_threads=None, recursive=True, include=None, exclude=None):
+    """
+    处理指定文件夹（默认包括子文件夹）中的所有视频文件
     
-    if not video_files:
-        print("❌ 未找到任何视频文件")
-        return 0, 0
+    workers > 1 时按视频分发到多个进程并行处理；incremental 为 True 时跳过内容没有变化的视频；
+    dedup 为 True 时使用输出基础目录中的去重索引，也可以直接传入 FrameDeduplicator；
+    codec_threads 为每个进程的 ffmpeg 线程数，None 表示按 CPU 预算分配，'auto' 表示在第一个视频上测速后选定；
+    include / exclude 为 glob 模式，只处理 / 跳过匹配的视频（见 extractor.discovery）
 
-    print(f"[+] 找到 {len(video_files)} 个视频文件")
-    
-    for filename in video_files:
-        video_path = os.path.join(input_folder, filename)
-        
-        # 创建输出目录（使用视频文件名）
-        video_name = os.path.splitext(filename)[0]
-        output_dir = os.path.join(output_base_folder, video_name)
-        
-        print(f"\n处理视频: {filename}")
-        print(f"输出目录: {output_dir}")
-        
-        frames_saved = extract_keyframes(video_path, output_dir)
-        total_frames += frames_saved
-        processed_videos += 1
-    
-    return total_frames, processed_videos
+    遍历、增量检查和线程分配都由 extractor.engine.process_folder 完成，视频边遍历边交给工作进程
+    """
+    # ffmpeg 直接写图片，不需要编码线程
+    return process_folder(input_folder, output_base_folder, extract_keyframes, keep_folder_name, workers,
+                          incremental, print, codec_threads, thread_fields=('codec_threads',),
+                          manifest_params=keyframe_params, recursive=recursive, include=include, exclude=exclude,
+                          dedup=dedup)
+
+def watch_videos_in_folder(input_folder, output_base_folder, workers=None, dedup=False, codec_threads=None,
+                           settle=2.0, stop_event=None, recursive=True, incremental=True):
+    """
+    持续监视文件夹（默认包括子文件夹），新视频写完（大小 settle 秒不变）后立即提取关键帧，按 Ctrl+C 或者设置 stop_event 时停止
+
+    启动时先处理已有的视频，清单中已经处理完成的视频不会重复处理；由 extractor.engine.watch_folder 完成，
+    输出目录、清单和其余参数同 process_videos_in_folder
+    """
+    return watch_folder(input_folder, output_base_folder, extract_keyframes, keep_folder_name, workers,
+                        incremental, print, codec_threads, settle, stop_event=stop_event, recursive=recursive,
+                        manifest_params=keyframe_params, thread_fields=('codec_threads',), dedup=dedup)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     try:
         print("[*] 视频关键帧提取工具启动中...")
         
@@ -102,6 +140,10 @@ if __name__ == "__main__":
         # 获取输入输出路径
         input_folder = input("[>] 请输入视频文件夹路径: ").strip('"').strip()
         output_base_folder = input("[>] 请输入帧保存文件夹路径: ").strip('"').strip()
+        workers_text = input(f"[>] 请输入并行进程数(直接回车使用 {default_workers()}): ").strip()
+        workers = int(workers_text) if workers_text.isdigit() else default_workers()
+        dedup = input("[>] 是否去除重复帧(y/N): ").strip().lower() == 'y'
+        watch = input("[>] 是否持续监视文件夹、自动处理新加入的视频(y/N): ").strip().lower() == 'y'
         
         if not os.path.exists(input_folder):
             print(f"❌ 错误：输入文件夹不存在: {input_folder}")
@@ -109,7 +151,12 @@ if __name__ == "__main__":
             print(f"\n🚀 开始处理文件夹: {input_folder}")
             print(f"📂 输出基础目录: {output_base_folder}")
             
-            total_frames, processed_videos = process_videos_in_folder(input_folder, output_base_folder)
+            if watch:
+                total_frames, processed_videos = watch_videos_in_folder(input_folder, output_base_folder, workers,
+                                                                        dedup=dedup)
+            else:
+                total_frames, processed_videos = process_videos_in_folder(input_folder, output_base_folder, workers,
+                                                                          dedup=dedup)
             
             print(f"\n✅ 处理完成!")
             print(f"📊 处理的视频数量: {processed_videos}")
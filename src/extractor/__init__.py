@@ -0,0 +1 @@
+"""视频帧提取公共模块"""
@@ -0,0 +1,148 @@
+"""批量处理：单进程顺序执行，或按视频分发到进程池并行执行"""
+import os
+import traceback
+from collections import deque
+from itertools import chain, islice
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from extractor.metrics import METRICS, call_with_metrics, export_from_env
+
+# 同一个视频导致工作进程崩溃的次数达到该值后不再重试
+MAX_CRASHES = 2
+
+
+def default_workers():
+    """默认并行进程数：留一个核心给主进程"""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def _run_serial(tasks, extract_fn, log_callback):
+    total_frames = 0
+    processed_videos = 0
+    for video_path, output_dir, kwargs in tasks:
+        log_callback(f"\n处理视频: {os.path.basename(video_path)}")
+        log_callback(f"输出目录: {output_dir}")
+        try:
+            frames_saved = extract_fn(video_path, output_dir, **kwargs) or 0
+        except Exception as e:
+            log_callback(f"❌ 处理视频失败: {video_path}: {str(e)}")
+            traceback.print_exc()
+            continue
+        total_frames += frames_saved
+        processed_videos += 1
+    return total_frames, processed_videos
+
+
+def _run_pool(tasks, extract_fn, workers, log_callback):
+    total_frames = 0
+    processed_videos = 0
+    crashes = {}
+    # 任务边生成边提交；因为工作进程崩溃需要重试的任务放在 pending 中优先提交
+    source = iter(tasks)
+    exhausted = False
+    pending = deque()
+    pool = ProcessPoolExecutor(max_workers=workers)
+    running = {}
+    log_callback(f"[+] 使用 {workers} 个进程并行处理视频")
+
+    def requeue(task):
+        video_path = task[0]
+        crashes[video_path] = crashes.get(video_path, 0) + 1
+        if crashes[video_path] >= MAX_CRASHES:
+            log_callback(f"❌ 视频多次导致工作进程崩溃，已跳过: {video_path}")
+        else:
+            pending.appendleft(task)
+
+    try:
+        while pending or running or not exhausted:
+            # 同时在途的任务不超过进程数，进程池崩溃时只影响正在处理的视频；
+            # 崩溃过的视频单独运行，避免再次连累其他视频
+            while len(running) < workers:
+                if any(crashes.get(task[0]) for task in running.values()):
+                    break
+                if pending:
+                    if crashes.get(pending[0][0]) and running:
+                        break
+                    task = pending.popleft()
+                else:
+                    task = next(source, None)
+                    if task is None:
+                        exhausted = True
+                        break
+                video_path, output_dir, kwargs = task
+                try:
+                    # 工作进程中的指标随结果一起传回主进程
+                    running[pool.submit(call_with_metrics, extract_fn, video_path, output_dir, **kwargs)] = task
+                except BrokenProcessPool:
+                    pending.appendleft(task)
+                    break
+
+            if not running:
+                if exhausted and not pending:
+                    break
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(max_workers=workers)
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                task = running.pop(future)
+                video_path = task[0]
+                try:
+                    frames_saved, snapshot = future.result()
+                    frames_saved = frames_saved or 0
+                    METRICS.merge(snapshot)
+                except BrokenProcessPool:
+                    broken = True
+                    requeue(task)
+                    continue
+                except Exception as e:
+                    log_callback(f"❌ 处理视频失败: {video_path}: {str(e)}")
+                    continue
+                total_frames += frames_saved
+                processed_videos += 1
+                log_callback(f"✅ {os.path.basename(video_path)}: 保存 {frames_saved} 帧")
+
+            if broken:
+                # 工作进程异常退出（例如解码器崩溃）后整个进程池不可用，
+                # 把其余在途视频放回队列，换一个新的进程池继续
+                for task in running.values():
+                    requeue(task)
+                running.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                log_callback("[!] 工作进程异常退出，重建进程池继续处理剩余视频")
+                pool = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    return total_frames, processed_videos
+
+
+def run_batch(tasks, extract_fn, workers=1, log_callback=print):
+    """
+    批量执行视频帧提取
+
+    参数:
+        tasks: [(视频路径, 输出目录, 关键字参数字典), ...]，也可以是生成器，
+            并行时边生成边提交（例如一边遍历大目录一边处理）
+        extract_fn: 提取函数，调用方式为 extract_fn(视频路径, 输出目录, **关键字参数)，
+            返回保存的帧数；并行时必须是模块级函数，以便传给子进程
+        workers: 并行进程数，1 表示在当前进程中顺序处理，None 表示按 CPU 核数自动选择
+        log_callback: 日志输出函数
+    返回:
+        (总共保存的帧数, 处理成功的视频数)
+    """
+    if workers is None:
+        workers = default_workers()
+    # 先取出最多 workers 个任务：任务比进程少时只启动需要的进程
+    tasks = iter(tasks)
+    head = list(islice(tasks, max(1, workers)))
+    workers = min(workers, len(head))
+    if workers <= 1:
+        totals = _run_serial(chain(head, tasks), extract_fn, log_callback)
+    else:
+        totals = _run_pool(chain(head, tasks), extract_fn, workers, log_callback)
+    export_from_env(log_callback)
+    return totals
@@ -0,0 +1,108 @@
+"""解码阶段：OpenCV 进程内解码 / ffmpeg 子进程管道解码"""
+import cv2
+
+from extractor.ffmpeg_reader import FFmpegFrameReader, probe_video
+from extractor.sampling import iter_frames_at, iter_sampled_frames
+from extractor.threads import apply_process_threads, open_capture
+
+
+class DecodeError(RuntimeError):
+    """视频无法打开或解码"""
+
+
+class OpenCVDecoder:
+    """
+    用 VideoCapture 解码，只解码需要保存的帧，中间的帧只 grab 不 retrieve
+
+    参数:
+        video_path: 视频文件路径
+        sampling: 'seek' / 'scan' / 'auto'
+        codec_threads: 解码线程数，None 表示使用 OpenCV 的默认值
+        log_callback: 日志输出函数
+    """
+
+    name = 'opencv'
+
+    def __init__(self, video_path, sampling='auto', codec_threads=None, log_callback=print):
+        self.video_path = str(video_path)
+        self.sampling = sampling
+        self.codec_threads = codec_threads
+        self.log_callback = log_callback
+        self.total_frames = 0
+        self.cap = None
+
+    def open(self):
+        """打开视频，返回 (fps, 总帧数)"""
+        apply_process_threads(self.codec_threads)
+        self.cap = open_capture(self.video_path, self.codec_threads)
+        if not self.cap.isOpened():
+            raise DecodeError(f"无法打开视频文件: {self.video_path}")
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        return self.cap.get(cv2.CAP_PROP_FPS), self.total_frames
+
+    def frames(self, frame_step, start_index=0, buffers=None):
+        """每 frame_step 帧取一帧，从第 start_index 个输出帧开始，产出 (帧号, 帧)"""
+        return iter_sampled_frames(self.cap, frame_step, self.sampling, self.video_path,
+                                   start=start_index * frame_step)
+
+    def frames_at(self, targets):
+        """按给定的帧号列表取帧"""
+        return iter_frames_at(self.cap, targets, self.sampling, self.video_path)
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class FFmpegDecoder:
+    """
+    由 ffmpeg 跳帧后把原始 BGR 帧通过管道传回，只支持固定间隔取帧
+
+    参数同 OpenCVDecoder，sampling 不起作用；log_callback 用于输出 ffmpeg 的错误信息
+    """
+
+    name = 'ffmpeg'
+
+    def __init__(self, video_path, sampling='auto', codec_threads=None, log_callback=print):
+        self.video_path = str(video_path)
+        self.codec_threads = codec_threads
+        self.log_callback = log_callback
+        self.total_frames = 0
+        self.info = None
+        self.reader = None
+
+    def open(self):
+        # 由 ffmpeg 解码时不需要用 OpenCV 打开视频
+        self.info = probe_video(self.video_path)
+        self.total_frames = self.info['frames']
+        return self.info['fps'], self.total_frames
+
+    def frames(self, frame_step, start_index=0, buffers=None):
+        # 缓冲区数量要比下游最多持有的帧数多一个，正在填充的缓冲区不会被编码线程读到
+        self.reader = FFmpegFrameReader(self.video_path, frame_step, buffers=buffers or 2,
+                                        start_index=start_index, info=self.info, threads=self.codec_threads,
+                                        log_callback=self.log_callback)
+        return iter(self.reader)
+
+    def frames_at(self, targets):
+        raise ValueError("ffmpeg 解码后端只支持固定间隔模式")
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+
+DECODER_TYPES = {decoder.name: decoder for decoder in (OpenCVDecoder, FFmpegDecoder)}
+
+
+def create_decoder(decoder, video_path, sampling='auto', codec_threads=None, log_callback=print):
+    """按名称创建解码器，也可以直接传入解码器类"""
+    if isinstance(decoder, str):
+        if decoder not in DECODER_TYPES:
+            raise ValueError(f"未知的解码后端: {decoder}")
+        decoder = DECODER_TYPES[decoder]
+    if decoder in DECODER_TYPES.values():
+        return decoder(video_path, sampling, codec_threads, log_callback=log_callback)
+    return decoder(video_path, sampling, codec_threads)
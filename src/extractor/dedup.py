@@ -0,0 +1,306 @@
+"""感知哈希去重：为每一帧计算 dHash/pHash，与已保存的帧比较汉明距离，重复的帧丢弃或硬链接"""
+import os
+import shutil
+import sqlite3
+import threading
+
+import cv2
+import numpy as np
+
+DEDUP_INDEX_NAME = '.frame_hashes.sqlite3'
+HASH_METHODS = ('dhash', 'phash')
+DEDUP_ACTIONS = ('drop', 'link')
+
+_SIGN_BIT = 1 << 63
+
+# 每个进程按索引路径缓存一个 DedupIndex，同一进程处理的所有视频共用，只增量加载新记录
+_INDEXES = {}
+# 从父进程继承的索引：子进程中既不使用也不关闭（关闭继承的 SQLite 连接会影响父进程）
+_INHERITED = []
+
+
+def dedup_index_path_for(output_base_folder):
+    """输出基础目录下的去重索引路径"""
+    return os.path.join(output_base_folder, DEDUP_INDEX_NAME)
+
+
+def _to_gray(image):
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def _pack_bits(bits):
+    """把布尔数组按行打包成 64 位整数"""
+    weights = np.left_shift(np.uint64(1), np.arange(bits.size, dtype=np.uint64)[::-1])
+    return int(np.bitwise_or.reduce(np.where(bits.ravel(), weights, np.uint64(0))))
+
+
+def dhash(image, hash_size=8):
+    """差值哈希：缩小到 (hash_size + 1) x hash_size 后比较相邻像素"""
+    small = cv2.resize(_to_gray(image), (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return _pack_bits(small[:, 1:] > small[:, :-1])
+
+
+def phash(image, hash_size=8):
+    """感知哈希：32x32 灰度图做 DCT，取左上角低频分量与中位数比较"""
+    size = hash_size * 4
+    small = cv2.resize(_to_gray(image), (size, size), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(small.astype(np.float32))[:hash_size, :hash_size]
+    return _pack_bits(low > np.median(low[1:, 1:]))
+
+
+def hamming(a, b):
+    """两个哈希之间的汉明距离"""
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """
+    以汉明距离为度量的 BK 树
+
+    按三角不等式剪枝，查找半径较小时只访问很少一部分节点，
+    帧数达到百万级时仍然是亚线性的。
+    """
+
+    def __init__(self):
+        # 节点结构: [哈希值, 条目列表, {距离: 子节点}]
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, radius):
+        """返回距离不超过 radius 的 (距离, 条目)，按距离升序"""
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend((distance, item) for item in node[1])
+            low, high = distance - radius, distance + radius
+            stack.extend(child for d, child in node[2].items() if low <= d <= high)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+class DedupIndex:
+    """
+    持久化的帧哈希索引（SQLite + 内存中的 BK 树）
+
+    多个工作进程可以同时使用同一个索引文件：每次查找前会把其他进程
+    新写入的记录增量加载到本进程的 BK 树中。其他进程删除的记录不会从 BK 树中移除，
+    命中时再到数据库确认记录仍然存在。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS frame_hashes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                method TEXT NOT NULL,
+                hash INTEGER NOT NULL,
+                path TEXT NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS frame_hashes_path ON frame_hashes (path)')
+        self.conn.commit()
+        self.trees = {}
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def close(self):
+        self.conn.close()
+
+    def refresh(self):
+        """加载其他进程新写入的哈希"""
+        rows = self.conn.execute('SELECT id, method, hash, path FROM frame_hashes WHERE id > ? ORDER BY id',
+                                 (self._last_id,)).fetchall()
+        for row_id, method, value, path in rows:
+            self.trees.setdefault(method, BKTree()).add(value % (1 << 64), path)
+            self._last_id = row_id
+
+    def _stored(self, method, value, path, max_distance):
+        """数据库中该路径的记录是否仍然匹配（可能已经被 forget_folder 删除，或者文件被新的帧覆盖）"""
+        rows = self.conn.execute('SELECT hash FROM frame_hashes WHERE path = ? AND method = ?',
+                                 (path, method)).fetchall()
+        return any(hamming(value, stored % (1 << 64)) <= max_distance for (stored,) in rows)
+
+    def find(self, method, value, max_distance):
+        """查找距离不超过 max_distance 且文件仍然存在的已保存帧，没有时返回 None"""
+        with self._lock:
+            self.refresh()
+            tree = self.trees.get(method)
+            if tree is None:
+                return None
+            for _, path in tree.search(value, max_distance):
+                if os.path.exists(path) and self._stored(method, value, path, max_distance):
+                    return path
+        return None
+
+    def add(self, method, value, path):
+        with self._lock:
+            stored = value - (1 << 64) if value >= _SIGN_BIT else value
+            with self.conn:
+                cursor = self.conn.execute('INSERT INTO frame_hashes (method, hash, path) VALUES (?, ?, ?)',
+                                           (method, stored, path))
+            self.trees.setdefault(method, BKTree()).add(value, path)
+            if cursor.lastrowid == self._last_id + 1:
+                self._last_id = cursor.lastrowid
+
+    def forget_folder(self, folder):
+        """删除某个输出目录下所有帧的记录（重新处理视频前调用，避免和自己的旧帧比较）"""
+        prefix = os.path.join(folder, '')
+        with self._lock:
+            with self.conn:
+                self.conn.execute('DELETE FROM frame_hashes WHERE substr(path, 1, ?) = ?',
+                                  (len(prefix), prefix))
+
+
+def shared_index(path):
+    """
+    本进程中 path 对应的 DedupIndex
+
+    同一个工作进程处理的视频共用一个索引，之后只按 id 增量加载其他进程新写入的记录，
+    不会每个视频都重新读取整张表、重建 BK 树。fork 出的子进程不使用从父进程继承的连接。
+    """
+    key = os.path.abspath(path)
+    cached = _INDEXES.get(key)
+    if cached is not None and cached[0] != os.getpid():
+        _INHERITED.append(cached)
+        cached = None
+    elif cached is not None and not os.path.exists(path):
+        # 索引文件被删除（例如清空了输出目录），重新建立
+        cached[1].close()
+        cached = None
+    if cached is None:
+        cached = _INDEXES[key] = (os.getpid(), DedupIndex(path))
+    return cached[1]
+
+
+class FrameDeduplicator:
+    """
+    帧去重配置，可以传给工作进程（索引在首次使用时才打开）
+
+    参数:
+        index_path: 去重索引文件路径，通常放在输出基础目录中
+        max_distance: 汉明距离不超过该值视为重复
+        action: 'drop' 不保存重复帧；'link' 用硬链接指向已有文件（失败时复制）
+        method: 'dhash' 或 'phash'
+    """
+
+    def __init__(self, index_path, max_distance=6, action='drop', method='dhash'):
+        if action not in DEDUP_ACTIONS:
+            raise ValueError(f"未知的去重方式: {action}")
+        if method not in HASH_METHODS:
+            raise ValueError(f"未知的哈希算法: {method}")
+        self.index_path = index_path
+        self.max_distance = max_distance
+        self.action = action
+        self.method = method
+        self._index = None
+
+    @classmethod
+    def for_output(cls, output_base_folder, **kwargs):
+        return cls(dedup_index_path_for(output_base_folder), **kwargs)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_index'] = None
+        return state
+
+    def params(self):
+        """写入增量处理清单的参数"""
+        return {'max_distance': self.max_distance, 'action': self.action, 'method': self.method}
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = shared_index(self.index_path)
+        return self._index
+
+    def close(self):
+        """释放对索引的引用；索引留在本进程的缓存中，处理下一个视频时不需要重新加载"""
+        self._index = None
+
+    def hash(self, image):
+        """计算一帧的感知哈希"""
+        return phash(image) if self.method == 'phash' else dhash(image)
+
+    def check(self, digest):
+        """返回与该哈希重复的已保存帧路径，没有重复时返回 None"""
+        return self.index.find(self.method, digest, self.max_distance)
+
+    def record(self, digest, path):
+        """记录新保存的帧"""
+        self.index.add(self.method, digest, path)
+
+    def forget_folder(self, folder):
+        self.index.forget_folder(folder)
+
+    def resolve(self, existing_path, output_path):
+        """
+        处理一个重复帧
+
+        返回:
+            True 表示在 output_path 生成了硬链接（或副本），False 表示丢弃
+        """
+        if self.action != 'link':
+            return False
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        try:
+            os.link(existing_path, output_path)
+        except OSError:
+            shutil.copyfile(existing_path, output_path)
+        return True
+
+
+def dedup_folder(folder, deduplicator, pattern_suffix='.jpg'):
+    """
+    对已经写到磁盘上的帧去重（用于 ffmpeg 直接输出图片的关键帧提取）
+
+    返回:
+        (保留的帧数, 重复的帧数)
+    """
+    kept = duplicates = 0
+    names = sorted(name for name in os.listdir(folder) if name.lower().endswith(pattern_suffix))
+    for name in names:
+        path = os.path.join(folder, name)
+        # 只需要灰度缩略图计算哈希，按 1/8 分辨率解码
+        image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if image is None:
+            continue
+        digest = deduplicator.hash(image)
+        existing = deduplicator.check(digest)
+        if existing is None or os.path.abspath(existing) == os.path.abspath(path):
+            deduplicator.record(digest, path)
+            kept += 1
+            continue
+        duplicates += 1
+        if not deduplicator.resolve(existing, path):
+            os.remove(path)
+    return kept, duplicates
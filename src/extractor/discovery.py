@@ -0,0 +1,123 @@
+"""
+流式查找输入文件
+
+iter_files 用 os.scandir 递归遍历目录，边遍历边返回匹配的文件，十万级文件的目录树
+不需要等全部遍历完就可以开始处理。扩展名预先转成小写集合，按扩展名查表匹配，不区分大小写；
+include / exclude 为 glob 模式，匹配相对路径或文件名（不区分大小写），exclude 匹配的目录整个跳过。
+"""
+import fnmatch
+import os
+import re
+from dataclasses import dataclass
+
+# 按大小排序时每次排序的文件数：在这个范围内先处理大文件，同时不需要等待整个目录遍历完
+SORT_WINDOW = 256
+
+
+@dataclass(frozen=True)
+class FoundFile:
+    """找到的文件，relative_dir 为所在目录相对于根目录的路径（根目录下为空字符串）"""
+
+    path: str
+    relative_dir: str
+    size: int
+
+
+def suffix_set(suffixes):
+    """扩展名转成小写集合，'mp4' 和 '.MP4' 都视为 '.mp4'"""
+    return frozenset(s.lower() if s.startswith('.') else '.' + s.lower() for s in suffixes)
+
+
+def _compile_globs(patterns):
+    if not patterns:
+        return None
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    return re.compile('|'.join(fnmatch.translate(p.replace('\\', '/')) for p in patterns), re.IGNORECASE)
+
+
+def _matches(pattern, relative_path, name):
+    return bool(pattern.match(relative_path) or pattern.match(name))
+
+
+def iter_files(root, suffixes, recursive=True, include=None, exclude=None, skip_hidden=True):
+    """
+    流式返回 root 下扩展名在 suffixes 中的文件（FoundFile），顺序为目录遍历顺序
+
+    include: 只返回匹配任一模式的文件，例如 '2024-*/*.mp4' 或 '*.mp4'
+    exclude: 跳过匹配任一模式的文件和目录，例如 'processed'
+    skip_hidden: 跳过以 . 开头的文件和目录（清单、临时文件等）
+    """
+    suffixes = suffix_set(suffixes)
+    include = _compile_globs(include)
+    exclude = _compile_globs(exclude)
+    # 深度优先，用栈代替递归，目录很深时也不会超出递归深度
+    stack = ['']
+    while stack:
+        relative_dir = stack.pop()
+        directory = os.path.join(root, relative_dir) if relative_dir else root
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        subdirs = []
+        with entries:
+            for entry in entries:
+                name = entry.name
+                if skip_hidden and name.startswith('.'):
+                    continue
+                relative_path = f'{relative_dir}/{name}' if relative_dir else name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if is_dir:
+                    if recursive and not (exclude and _matches(exclude, relative_path, name)):
+                        subdirs.append(relative_path)
+                    continue
+                if os.path.splitext(name)[1].lower() not in suffixes:
+                    continue
+                if exclude and _matches(exclude, relative_path, name):
+                    continue
+                if include and not _matches(include, relative_path, name):
+                    continue
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    continue
+                yield FoundFile(entry.path, relative_dir.replace('/', os.sep), size)
+        # 逆序入栈，按名称顺序处理子目录
+        stack.extend(sorted(subdirs, reverse=True))
+
+
+def _sorted_window(files, window, key, reverse):
+    buffer = []
+    for found in files:
+        buffer.append(found)
+        if len(buffer) >= window:
+            yield from sorted(buffer, key=key, reverse=reverse)
+            buffer = []
+    yield from sorted(buffer, key=key, reverse=reverse)
+
+
+def discover(root, suffixes, recursive=True, include=None, exclude=None, sort=None, window=SORT_WINDOW,
+             skip_hidden=True):
+    """
+    查找文件，返回 FoundFile 的迭代器
+
+    sort: None 按遍历顺序；'size' 按文件大小从大到小（大文件先处理，多进程时负载更均衡）；'name' 按路径
+    window: 每凑够 window 个文件排序一次后就开始返回；None 表示遍历完整个目录树再排序
+    其余参数同 iter_files
+    """
+    files = iter_files(root, suffixes, recursive, include, exclude, skip_hidden)
+    if sort is None:
+        return files
+    if sort == 'size':
+        key, reverse = (lambda found: found.size), True
+    elif sort == 'name':
+        key, reverse = (lambda found: found.path), False
+    else:
+        raise ValueError(f"不支持的排序方式: {sort}")
+    if window is None:
+        return iter(sorted(files, key=key, reverse=reverse))
+    return _sorted_window(files, window, key, reverse)
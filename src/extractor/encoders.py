@@ -0,0 +1,136 @@
+"""JPEG 编码后端：直接对 OpenCV 的 BGR 帧编码，不再先转 RGB 再交给 PIL"""
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# 自动选择时按速度从快到慢尝试
+ENCODER_BACKENDS = ('turbojpeg', 'opencv', 'pillow')
+SUBSAMPLING_MODES = ('444', '422', '420')
+
+
+class JpegEncoder:
+    """
+    JPEG 编码器基类
+
+    参数:
+        quality: 编码质量(1-100)
+        progressive: 是否输出渐进式 JPEG
+        subsampling: 色度抽样，'444' / '422' / '420'
+    """
+    name = None
+
+    def __init__(self, quality=95, progressive=False, subsampling='420'):
+        if subsampling not in SUBSAMPLING_MODES:
+            raise ValueError(f"不支持的色度抽样: {subsampling}")
+        self.quality = int(quality)
+        self.progressive = progressive
+        self.subsampling = subsampling
+
+    def encode(self, frame):
+        """把 BGR 帧编码成 JPEG 字节"""
+        raise NotImplementedError
+
+    def __repr__(self):
+        return (f"{type(self).__name__}(quality={self.quality}, "
+                f"progressive={self.progressive}, subsampling={self.subsampling!r})")
+
+
+class OpenCVEncoder(JpegEncoder):
+    """cv2.imencode 直接编码 BGR 数据"""
+    name = 'opencv'
+
+    def __init__(self, quality=95, progressive=False, subsampling='420'):
+        super().__init__(quality, progressive, subsampling)
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, self.quality,
+                       cv2.IMWRITE_JPEG_PROGRESSIVE, int(self.progressive)]
+        # 较老的 OpenCV 没有色度抽样参数，只能使用默认的 4:2:0
+        sampling_flag = getattr(cv2, f'IMWRITE_JPEG_SAMPLING_FACTOR_{self.subsampling}', None)
+        if sampling_flag is not None:
+            self.params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, sampling_flag]
+
+    def encode(self, frame):
+        ok, buffer = cv2.imencode('.jpg', frame, self.params)
+        if not ok:
+            raise RuntimeError("cv2.imencode 编码失败")
+        return buffer.tobytes()
+
+
+class PillowEncoder(JpegEncoder):
+    """Pillow 编码，BGR 数据在解包时直接按 BGR 读取，不再单独做颜色转换"""
+    name = 'pillow'
+
+    _SUBSAMPLING = {'444': 0, '422': 1, '420': 2}
+
+    def encode(self, frame):
+        frame = np.ascontiguousarray(frame)
+        height, width = frame.shape[:2]
+        img = Image.frombuffer('RGB', (width, height), frame, 'raw', 'BGR', 0, 1)
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=self.quality,
+                 progressive=self.progressive,
+                 subsampling=self._SUBSAMPLING[self.subsampling])
+        return buffer.getvalue()
+
+
+class TurboJpegEncoder(JpegEncoder):
+    """libjpeg-turbo 编码（需要安装 PyTurboJPEG 以及 libturbojpeg）"""
+    name = 'turbojpeg'
+
+    def __init__(self, quality=95, progressive=False, subsampling='420'):
+        super().__init__(quality, progressive, subsampling)
+        import turbojpeg
+        self._jpeg = turbojpeg.TurboJPEG()
+        self._pixel_format = turbojpeg.TJPF_BGR
+        self._subsample = getattr(turbojpeg, f'TJSAMP_{self.subsampling}')
+        self._flags = turbojpeg.TJFLAG_PROGRESSIVE if self.progressive else 0
+
+    def encode(self, frame):
+        return self._jpeg.encode(frame, quality=self.quality,
+                                 pixel_format=self._pixel_format,
+                                 jpeg_subsample=self._subsample,
+                                 flags=self._flags)
+
+
+_ENCODER_CLASSES = {
+    'turbojpeg': TurboJpegEncoder,
+    'opencv': OpenCVEncoder,
+    'pillow': PillowEncoder,
+}
+
+
+def available_encoders():
+    """返回当前环境可用的编码后端名称，按速度从快到慢排列"""
+    names = []
+    for name in ENCODER_BACKENDS:
+        try:
+            _ENCODER_CLASSES[name]()
+        except Exception:
+            continue
+        names.append(name)
+    return names
+
+
+def create_encoder(backend='auto', quality=95, progressive=False, subsampling='420'):
+    """
+    创建 JPEG 编码器
+
+    参数:
+        backend: 'auto' 自动选择最快的可用后端，或 'turbojpeg' / 'opencv' / 'pillow'，
+            也可以直接传入 JpegEncoder 实例
+        quality / progressive / subsampling: 见 JpegEncoder
+    """
+    if isinstance(backend, JpegEncoder):
+        return backend
+    if backend == 'auto':
+        for name in ENCODER_BACKENDS:
+            try:
+                return _ENCODER_CLASSES[name](quality, progressive, subsampling)
+            except Exception:
+                # turbojpeg 未安装或找不到动态库时退回下一个后端
+                continue
+        raise RuntimeError("没有可用的 JPEG 编码后端")
+    if backend not in _ENCODER_CLASSES:
+        raise ValueError(f"未知的编码后端: {backend}")
+    return _ENCODER_CLASSES[backend](quality, progressive, subsampling)
@@ -0,0 +1,448 @@
+"""
+统一的帧提取引擎
+
+一次提取由四个阶段组成：解码（decoders）→ 选帧（selectors）→ 编码（encoders）→ 写盘（writers），
+中间由 FramePipeline 把编码和写盘放到后台线程。各个前端（patch.py、patch_exe.py、
+patch_exe_page.py、gui.py、test.py）只负责收集参数、命名规则和日志格式。
+"""
+import os
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import Any, Optional
+
+from extractor.batch import default_workers, run_batch
+from extractor.decoders import DECODER_TYPES, DecodeError, create_decoder
+from extractor.dedup import FrameDeduplicator
+from extractor.discovery import discover
+from extractor.encoders import create_encoder
+from extractor.manifest import Manifest, ProgressTracker
+from extractor.metrics import METRICS
+from extractor.naming import alnum_folder_name
+from extractor.pipeline import STAGE_METRIC, FramePipeline
+from extractor.scene import SceneSelector
+from extractor.selectors import SELECTOR_TYPES, create_selector
+from extractor.threads import assign_threads, thread_policy_for
+from extractor.watch import WatchDaemon
+from extractor.writers import FileWriter
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# 流式规划时每批检查的视频数；清单连接只在检查一批时打开，不会在创建工作进程（fork）时被继承
+PLAN_CHUNK = 256
+
+# 分配给每个任务的线程字段；由 ffmpeg 直接写图片的提取函数只需要 ('codec_threads',)
+THREAD_FIELDS = ('codec_threads', 'encoder_threads')
+
+# 选帧模式：固定间隔 / 场景切换
+EXTRACT_MODES = tuple(SELECTOR_TYPES)
+
+# 解码后端：OpenCV 进程内解码 / ffmpeg 子进程管道
+DECODERS = tuple(DECODER_TYPES)
+
+
+@dataclass
+class ExtractionJob:
+    """
+    一个视频的提取任务
+
+    interval: 固定间隔模式下每隔多少秒取一帧，场景模式下为最小取帧间隔
+    mode: 'interval' / 'scene'，也可以是自定义的选帧器实例
+    sampling: 'seek' / 'scan' / 'auto'
+    decoder: 'opencv' / 'ffmpeg'，也可以是自定义的解码器类
+    encoder: JPEG 编码后端 'auto' / 'turbojpeg' / 'opencv' / 'pillow'，或 JpegEncoder 实例
+    quality: JPEG 质量，encoder 为实例时以实例的设置为准
+    naming: 输出文件名模板，用输出帧序号格式化
+    encoder_threads / codec_threads: 编码线程数 / 解码线程数，None 表示使用默认值
+    queue_depth: 等待编码的帧队列长度，用于限制内存占用
+    manifest_path: 增量处理清单路径，指定后记录进度，中断后从上次写完的帧继续
+    scene: 场景切换选帧器 SceneSelector，默认以 interval 作为最小取帧间隔
+    dedup: 帧去重配置 FrameDeduplicator，与已保存帧重复的帧不再写入
+    writer: 写盘阶段，默认 FileWriter
+    """
+
+    video_path: str
+    output_dir: str
+    interval: float = 6.0
+    mode: Any = 'interval'
+    sampling: str = 'auto'
+    decoder: Any = 'opencv'
+    encoder: Any = 'auto'
+    quality: int = 95
+    naming: str = 'frame_{:03d}.jpg'
+    encoder_threads: Optional[int] = None
+    codec_threads: Optional[int] = None
+    queue_depth: int = 8
+    manifest_path: Optional[str] = None
+    scene: Optional[SceneSelector] = None
+    dedup: Optional[FrameDeduplicator] = None
+    writer: Any = None
+
+    def validate(self):
+        """检查参数组合，不合法时抛出 ValueError"""
+        if isinstance(self.mode, str) and self.mode not in EXTRACT_MODES:
+            raise ValueError(f"未知的选帧模式: {self.mode}")
+        if isinstance(self.decoder, str) and self.decoder not in DECODERS:
+            raise ValueError(f"未知的解码后端: {self.decoder}")
+        if self.decoder == 'ffmpeg' and self.mode != 'interval':
+            raise ValueError("ffmpeg 解码后端只支持固定间隔模式")
+
+    def manifest_params(self, quality=None):
+        """写入清单的提取参数，任一参数变化都会重新处理视频"""
+        mode = self.mode if isinstance(self.mode, str) else self.mode.name
+        params = {'mode': mode, 'interval': self.interval,
+                  'quality': quality if quality is not None else getattr(self.encoder, 'quality', self.quality),
+                  'naming': self.naming}
+        params.update(create_selector(self.mode, self.interval, self.scene).params())
+        if self.dedup is not None:
+            params['dedup'] = self.dedup.params()
+        return params
+
+
+@dataclass
+class ExtractionResult:
+    """一个视频的提取结果"""
+
+    video_path: str
+    output_dir: str
+    saved: int = 0
+    duplicates: int = 0
+    bytes_written: int = 0
+    resumed_from: int = 0
+    fps: float = 0.0
+    total_frames: int = 0
+    elapsed: float = 0.0
+    completed: bool = False
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.completed and self.error is None
+
+
+class JobControl:
+    """暂停、继续、取消正在运行的任务，可以在任意线程中调用"""
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # 暂停中的任务也要醒过来才能退出
+        self._running.set()
+
+    def checkpoint(self):
+        """暂停时阻塞到继续或取消，返回是否应该继续运行"""
+        self._running.wait()
+        return not self._cancelled.is_set()
+
+
+def run_job(job, log=print, on_saved=None, on_duplicate=None, on_progress=None, control=None):
+    """
+    执行一个提取任务，返回 ExtractionResult
+
+    log: 日志输出函数
+    on_saved: 每写完一帧的回调，on_saved(序号, 输出路径, 字节数)
+    on_duplicate: 发现重复帧时的回调，on_duplicate(序号, 输出路径, 已有帧路径)
+    on_progress: 每处理完一帧的回调，on_progress(已完成帧数, 预计总帧数)，总帧数未知时为 None
+    control: JobControl，用于暂停或取消；取消后已写完的帧保留在清单中，下次从断点继续
+    """
+    job.validate()
+    result = ExtractionResult(job.video_path, job.output_dir)
+    writer = job.writer or FileWriter()
+    decoder = None
+    manifest = None
+    tracker = None
+    started = time.perf_counter()
+    try:
+        if not writer.prepare(job.output_dir, log):
+            result.error = "输出目录不可写"
+            return result
+
+        decoder = create_decoder(job.decoder, job.video_path, job.sampling, job.codec_threads, log)
+        try:
+            with METRICS.timer(STAGE_METRIC, stage='open'):
+                fps, total_frames = decoder.open()
+        except DecodeError as e:
+            log(f"❌ 错误：{e}")
+            result.error = str(e)
+            return result
+        result.fps, result.total_frames = fps, total_frames
+        log(f"📊 视频信息 - FPS: {fps}, 总帧数: {total_frames}")
+
+        selector = create_selector(job.mode, job.interval, job.scene)
+
+        # 直接对 BGR 帧编码，不再转换成 RGB 再交给 PIL
+        jpeg_encoder = create_encoder(job.encoder, job.quality)
+        log(f"[+] JPEG 编码器: {jpeg_encoder.name}")
+
+        # 从清单中读取上次中断时已经写完的帧数
+        start_index = 0
+        if job.manifest_path:
+            manifest = Manifest(job.manifest_path)
+            start_index = manifest.begin(job.video_path, job.manifest_params(jpeg_encoder.quality), job.output_dir)
+            if start_index:
+                log(f"[+] 从第 {start_index} 帧继续处理")
+            tracker = ProgressTracker(manifest, job.video_path, start_index)
+        result.resumed_from = start_index
+
+        # 以下回调都在写盘线程中调用
+        done = [start_index]
+
+        def progress(index):
+            if tracker is not None:
+                tracker.mark(index)
+            done[0] += 1
+            if on_progress is not None:
+                on_progress(done[0], getattr(selector, 'expected', None))
+
+        def saved(index, output_path, size):
+            if on_saved is not None:
+                on_saved(index, output_path, size)
+            progress(index)
+
+        def duplicate(index, output_path, existing_path):
+            if on_duplicate is not None:
+                on_duplicate(index, output_path, existing_path)
+            progress(index)
+
+        if job.dedup is not None and start_index == 0:
+            # 整个视频重新处理时，先清掉该目录旧帧的哈希，避免新帧和自己的旧文件比较
+            job.dedup.forget_folder(job.output_dir)
+
+        # 解码循环只负责取帧，编码和写盘交给流水线中的其他线程
+        pipeline = FramePipeline(jpeg_encoder.encode, job.encoder_threads, job.queue_depth, on_saved=saved,
+                                 dedup=job.dedup, on_duplicate=duplicate, writer=writer, log_callback=log)
+        try:
+            frames = _timed(selector.frames(decoder, fps, start_index, pipeline.max_in_flight + 1, log), 'decode')
+            for index, (frame_index, frame) in enumerate(frames, start_index):
+                if control is not None and not control.checkpoint():
+                    log("⏹️ 已取消")
+                    break
+                output_path = os.path.join(job.output_dir, job.naming.format(index))
+                pipeline.submit(index, output_path, frame)
+            else:
+                result.completed = True
+        finally:
+            pipeline.close()
+            result.saved = pipeline.saved_count
+            result.duplicates = pipeline.duplicate_count
+            result.bytes_written = pipeline.bytes_written
+        if pipeline.duplicate_count:
+            log(f"♻️ 跳过 {pipeline.duplicate_count} 个重复帧")
+        if pipeline.errors:
+            result.error = f"{len(pipeline.errors)} 帧保存失败"
+
+        if manifest is not None and result.ok:
+            manifest.finish(job.video_path, start_index + result.saved + result.duplicates)
+
+    except Exception as e:
+        log(f"处理视频时出错: {str(e)}")
+        traceback.print_exc()
+        result.error = str(e)
+    finally:
+        if decoder is not None:
+            decoder.close()
+        if manifest is not None:
+            manifest.close()
+        if job.dedup is not None:
+            job.dedup.close()
+        result.elapsed = time.perf_counter() - started
+        _record(result)
+
+    return result
+
+
+def _timed(frames, stage):
+    """逐帧记录从选帧器取出下一帧的耗时（解码、跳帧、场景检测）"""
+    iterator = iter(frames)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        METRICS.observe(STAGE_METRIC, time.perf_counter() - started, stage=stage)
+        yield item
+
+
+def _record(result):
+    """一个视频处理结束后更新计数器"""
+    status = 'error' if result.error else 'ok' if result.completed else 'cancelled'
+    METRICS.inc('videos_total', status=status)
+    METRICS.inc('frames_saved_total', result.saved)
+    METRICS.inc('frames_duplicate_total', result.duplicates)
+    METRICS.inc('bytes_written_total', result.bytes_written)
+    METRICS.observe(STAGE_METRIC, result.elapsed, stage='video')
+
+
+def extract_video(video_path, output_dir, **options):
+    """批量处理时在工作进程中调用，options 为 ExtractionJob 的字段，返回保存的帧数"""
+    return run_job(ExtractionJob(video_path, output_dir, **options)).saved
+
+
+def find_videos(input_folder, recursive=True, include=None, exclude=None, sort='size'):
+    """
+    流式查找文件夹（默认包括子文件夹）中的视频，返回 FoundFile 的迭代器
+
+    默认在每一批文件中按大小从大到小排列，参数含义见 extractor.discovery.discover
+    """
+    return discover(input_folder, VIDEO_EXTENSIONS, recursive, include, exclude, sort)
+
+
+def job_manifest_params(**options):
+    """ExtractionJob 写入清单的提取参数，options 为 ExtractionJob 的字段"""
+    return ExtractionJob('', '', **options).manifest_params()
+
+
+def _resolve_options(output_base_folder, options, manifest_params=job_manifest_params):
+    """dedup 为 True 时换成输出基础目录中的去重索引（原地修改 options），返回写入清单的提取参数"""
+    if 'dedup' in options:
+        if options['dedup'] is True:
+            options['dedup'] = FrameDeduplicator.for_output(output_base_folder)
+        options['dedup'] = options['dedup'] or None
+    return manifest_params(**options)
+
+
+def _plan_video(video_path, output_base_folder, folder_name, manifest, params, options, relative_dir=''):
+    """
+    一个视频的任务，视频和参数都没有变化、上次已经处理完成时返回 None
+
+    子文件夹中的视频输出到输出基础目录下对应的子文件夹（relative_dir），根目录下的视频输出位置不变
+    """
+    filename = os.path.basename(video_path)
+    output_dir = os.path.join(output_base_folder, relative_dir, folder_name(os.path.splitext(filename)[0]))
+    if manifest is not None and manifest.is_up_to_date(video_path, params):
+        return None
+    return video_path, output_dir, dict(options, manifest_path=manifest.path if manifest else None)
+
+
+def iter_plan_folder(input_folder, output_base_folder, folder_name=alnum_folder_name, incremental=True,
+                     log_callback=print, recursive=True, include=None, exclude=None,
+                     manifest_params=job_manifest_params, **options):
+    """
+    边遍历文件夹边生成需要处理的视频任务 (视频路径, 输出目录, ExtractionJob 的字段)
+
+    folder_name: 由视频文件名（不含扩展名）生成输出子目录名
+    incremental: 跳过内容和参数都没有变化的视频，并从上次中断的帧继续
+    recursive / include / exclude: 是否包括子文件夹、只处理 / 跳过匹配 glob 模式的视频，见 find_videos
+    manifest_params: manifest_params(**options) 返回写入清单的提取参数，默认按 ExtractionJob 计算；
+        使用其他提取函数时 options 为该函数的关键字参数
+    options: ExtractionJob 的字段；dedup 为 True 时使用输出基础目录中的去重索引
+    """
+    skipped_videos = 0
+    params = _resolve_options(output_base_folder, options, manifest_params)
+    videos = find_videos(input_folder, recursive, include, exclude)
+    while True:
+        chunk = list(islice(videos, PLAN_CHUNK))
+        if not chunk:
+            break
+        tasks = []
+        manifest = Manifest.for_output(output_base_folder) if incremental else None
+        try:
+            for found in chunk:
+                task = _plan_video(found.path, output_base_folder, folder_name, manifest, params, options,
+                                   found.relative_dir)
+                if task is None:
+                    skipped_videos += 1
+                else:
+                    tasks.append(task)
+        finally:
+            if manifest is not None:
+                manifest.close()
+        yield from tasks
+    if skipped_videos:
+        log_callback(f"[+] 跳过 {skipped_videos} 个未变化的视频")
+
+
+def plan_folder(input_folder, output_base_folder, folder_name=alnum_folder_name, incremental=True,
+                log_callback=print, **options):
+    """列出文件夹中需要处理的视频，返回任务列表，参数同 iter_plan_folder"""
+    return list(iter_plan_folder(input_folder, output_base_folder, folder_name, incremental, log_callback,
+                                 **options))
+
+
+def process_folder(input_folder, output_base_folder, extract_fn=extract_video, folder_name=alnum_folder_name,
+                   workers=1, incremental=True, log_callback=print, codec_threads=None, thread_fields=THREAD_FIELDS,
+                   **options):
+    """
+    处理文件夹中的所有视频，返回 (总共保存的帧数, 处理的视频数量)
+
+    extract_fn: 处理单个视频的函数，extract_fn(视频路径, 输出目录, **options)，多进程时必须可以 pickle
+    workers: 并行进程数，1 表示在当前进程中顺序处理
+    codec_threads: 每个进程的解码线程数，None 表示按 CPU 预算分配，'auto' 表示在第一个视频上测速后选定
+    thread_fields: 写入每个任务的线程字段，extract_fn 没有编码线程时为 ('codec_threads',)
+    folder_name / incremental / options（包括 manifest_params）同 iter_plan_folder
+
+    视频边遍历边交给工作进程，大目录不需要等遍历完才开始处理
+    """
+    tasks = iter_plan_folder(input_folder, output_base_folder, folder_name, incremental, log_callback, **options)
+    # 按最先找到的一批视频分配线程（视频比进程少时每个进程多分一些线程），之后的视频使用相同的设置
+    head = list(islice(tasks, max(1, workers or default_workers())))
+    policy = assign_threads(head, workers, codec_threads, log_callback,
+                            encoder_threads='encoder_threads' in thread_fields)
+    return run_batch(chain(head, _with_threads(tasks, policy, thread_fields)), extract_fn, workers, log_callback)
+
+
+def _set_threads(task, policy, thread_fields):
+    for field in thread_fields:
+        task[2][field] = getattr(policy, field)
+    return task
+
+
+def _with_threads(tasks, policy, thread_fields=THREAD_FIELDS):
+    for task in tasks:
+        yield _set_threads(task, policy, thread_fields)
+
+
+def watch_folder(input_folder, output_base_folder, extract_fn=extract_video, folder_name=alnum_folder_name,
+                 workers=None, incremental=True, log_callback=print, codec_threads=None, settle=2.0,
+                 poll_interval=1.0, stop_event=None, recursive=True, manifest_params=job_manifest_params,
+                 thread_fields=THREAD_FIELDS, **options):
+    """
+    持续监视文件夹（默认包括子文件夹），新视频写完后立即处理，返回 (总共保存的帧数, 处理的视频数量)
+
+    启动时先处理文件夹中已有的视频；输出目录和清单与 process_folder 相同，
+    清单中已经处理完成的视频不会重复处理。settle / poll_interval / recursive 同 WatchDaemon，
+    stop_event 被设置或者按 Ctrl+C 时停止；其余参数同 process_folder。
+    """
+    params = _resolve_options(output_base_folder, options, manifest_params)
+    workers = workers or default_workers()
+    # 没有样本视频可以测速，'auto' 时使用按 CPU 预算分配的线程数
+    policy = thread_policy_for(workers, None if codec_threads == 'auto' else codec_threads, log_callback=log_callback,
+                               encoder_threads=None if 'encoder_threads' in thread_fields else 0)
+
+    def plan(video_path, relative_dir):
+        # 进程池随时可能创建新的工作进程，清单连接只在检查时打开
+        manifest = Manifest.for_output(output_base_folder) if incremental else None
+        try:
+            task = _plan_video(video_path, output_base_folder, folder_name, manifest, params, options,
+                               relative_dir)
+        finally:
+            if manifest is not None:
+                manifest.close()
+        if task is not None:
+            _set_threads(task, policy, thread_fields)
+        return task
+
+    daemon = WatchDaemon(input_folder, plan, extract_fn, VIDEO_EXTENSIONS, workers, settle, poll_interval,
+                         log_callback=log_callback, recursive=recursive)
+    return daemon.run(stop_event)
@@ -0,0 +1,183 @@
+"""ffmpeg 管道解码：由 ffmpeg 完成抽帧和缩放，原始 BGR 帧通过 stdout 读入复用的 NumPy 缓冲区"""
+import json
+import subprocess
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+# ffmpeg 出错时保留的最后几行错误输出
+STDERR_TAIL_LINES = 20
+
+
+def probe_video(video_path):
+    """
+    读取视频的宽、高、帧率和帧数
+
+    优先使用 ffprobe，没有安装 ffprobe 时用 OpenCV 读取。
+    返回:
+        {'width': 宽, 'height': 高, 'fps': 帧率, 'frames': 帧数(未知时为 0)}
+    """
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height,r_frame_rate,nb_frames:stream_tags=rotate:stream_side_data=rotation',
+        '-of', 'json', str(video_path),
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    except FileNotFoundError:
+        result = None
+    if result is not None and result.returncode == 0:
+        streams = json.loads(result.stdout or '{}').get('streams') or []
+        if streams:
+            stream = streams[0]
+            width, height = int(stream['width']), int(stream['height'])
+            # ffmpeg 默认按旋转信息自动旋转画面，输出尺寸要相应交换
+            rotation = stream.get('tags', {}).get('rotate')
+            for side_data in stream.get('side_data_list', []):
+                rotation = side_data.get('rotation', rotation)
+            if rotation is not None and abs(int(float(rotation))) % 180 == 90:
+                width, height = height, width
+            num, _, den = stream.get('r_frame_rate', '0/1').partition('/')
+            fps = float(num) / float(den or 1) if float(den or 1) else 0.0
+            frames = int(stream['nb_frames']) if str(stream.get('nb_frames', '')).isdigit() else 0
+            return {'width': width, 'height': height, 'fps': fps, 'frames': frames}
+
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        if not cap.isOpened():
+            raise RuntimeError(f"无法读取视频信息: {video_path}")
+        return {
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': cap.get(cv2.CAP_PROP_FPS),
+            'frames': max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))),
+        }
+    finally:
+        cap.release()
+
+
+def scaled_size(width, height, target_width=None, target_height=None):
+    """按目标宽/高等比缩放，结果取偶数以满足大多数像素格式的要求"""
+    if target_width and target_height:
+        return int(target_width), int(target_height)
+    if target_width:
+        return int(target_width), max(2, int(round(height * target_width / width / 2)) * 2)
+    if target_height:
+        return max(2, int(round(width * target_height / height / 2)) * 2), int(target_height)
+    return width, height
+
+
+class FFmpegFrameReader:
+    """
+    每个视频启动一个 ffmpeg 进程，用 select/scale 滤镜在 ffmpeg 内部完成跳帧和缩放
+
+    迭代时产出 (序号, 帧)，第 k 个输出帧对应原视频的第 k * frame_step 帧，
+    与 OpenCV 路径按帧间隔取到的帧一致。帧是缓冲池中复用的数组：同一块
+    缓冲区会在 buffers 帧之后被覆盖，调用方需要保证同时持有的帧不超过 buffers 个。
+
+    参数:
+        video_path: 视频路径
+        frame_step: 每隔多少帧输出一帧，None 或 1 表示输出每一帧
+        width / height: 输出尺寸，只给一个时等比缩放，都不给时保持原尺寸
+        buffers: 缓冲池大小
+        start_index: 跳过前面的输出帧（换算成起始时间，用于断点续跑）
+        info: 已经读取过的视频信息，避免重复调用 ffprobe
+        threads: ffmpeg 解码线程数（-threads），None 表示由 ffmpeg 自行决定
+        log_callback: ffmpeg 出错时输出错误信息
+    ffmpeg 的错误输出由单独的线程持续读取（只保留最后几行），损坏的视频输出大量错误时
+    不会因为 stderr 管道写满而阻塞 ffmpeg。
+    """
+
+    def __init__(self, video_path, frame_step=None, width=None, height=None, buffers=2,
+                 start_index=0, info=None, threads=None, log_callback=print):
+        self.video_path = str(video_path)
+        self.frame_step = max(1, int(frame_step or 1))
+        self.info = info or probe_video(video_path)
+        self.width, self.height = scaled_size(self.info['width'], self.info['height'], width, height)
+        self.start_index = start_index
+        self.threads = threads
+        self.log_callback = log_callback
+        self.frame_bytes = self.width * self.height * 3
+        self._buffers = [np.empty((self.height, self.width, 3), dtype=np.uint8)
+                         for _ in range(max(1, buffers))]
+        self.process = None
+        self._stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+        self._stderr_thread = None
+
+    def command(self):
+        """构造 ffmpeg 命令"""
+        filters = []
+        if self.frame_step > 1:
+            # 按解码帧序号取帧，与 OpenCV 路径的帧号完全对应；
+            # fps 滤镜取的是每个时间段中点附近的帧，会和 OpenCV 路径错开半个间隔
+            filters.append(f'select=not(mod(n\\,{self.frame_step}))')
+        if (self.width, self.height) != (self.info['width'], self.info['height']):
+            filters.append(f'scale={self.width}:{self.height}:flags=area')
+        cmd = ['ffmpeg', '-nostdin', '-v', 'error']
+        if self.start_index and self.info['fps'] > 0:
+            # 放在 -i 之前，先按关键帧快速定位再解码到准确位置，之后的帧序号 n 从 0 重新计数
+            cmd += ['-ss', f"{self.start_index * self.frame_step / self.info['fps']:.6f}"]
+        if self.threads:
+            cmd += ['-threads', str(self.threads)]
+        cmd += ['-i', self.video_path]
+        if filters:
+            cmd += ['-vf', ','.join(filters), '-vsync', 'vfr']
+        cmd += ['-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1']
+        return cmd
+
+    def _read_into(self, buffer):
+        """把一整帧读进 buffer，读不满（视频结束）时返回 False"""
+        view = memoryview(buffer).cast('B')
+        filled = 0
+        while filled < self.frame_bytes:
+            n = self.process.stdout.readinto(view[filled:])
+            if not n:
+                return False
+            filled += n
+        return True
+
+    def _drain_stderr(self, stream):
+        for line in stream:
+            line = line.decode('utf-8', 'replace').strip()
+            if line:
+                self._stderr_tail.append(line)
+
+    def __iter__(self):
+        try:
+            self.process = subprocess.Popen(self.command(), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                            bufsize=self.frame_bytes)
+        except FileNotFoundError:
+            raise RuntimeError("未检测到ffmpeg，请先安装ffmpeg")
+        self._stderr_tail.clear()
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, args=(self.process.stderr,),
+                                               name='ffmpeg-stderr', daemon=True)
+        self._stderr_thread.start()
+        index = self.start_index
+        try:
+            while True:
+                buffer = self._buffers[index % len(self._buffers)]
+                if not self._read_into(buffer):
+                    break
+                yield index, buffer
+                index += 1
+        finally:
+            self.close()
+
+    def close(self):
+        """结束 ffmpeg 进程"""
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        returncode = process.wait()
+        if self._stderr_thread is not None:
+            self._stderr_thread.join()
+            self._stderr_thread = None
+        process.stderr.close()
+        if returncode not in (0, -9) and self._stderr_tail:
+            message = '\n'.join(self._stderr_tail)
+            self.log_callback(f"[!] ffmpeg: {message}")
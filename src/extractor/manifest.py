@@ -0,0 +1,171 @@
+"""增量处理清单：记录每个视频的指纹、提取参数和进度，用于跳过未变化的视频和断点续跑"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+MANIFEST_NAME = '.frames_manifest.sqlite3'
+
+# 内容指纹只读取文件首尾各 1 MiB，避免为大文件做全量哈希
+HASH_CHUNK = 1 << 20
+
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+
+
+def manifest_path_for(output_base_folder):
+    """输出基础目录下的清单文件路径"""
+    return os.path.join(output_base_folder, MANIFEST_NAME)
+
+
+def content_hash(video_path, size=None):
+    """计算视频文件的内容指纹（文件大小 + 首尾数据块）"""
+    if size is None:
+        size = os.path.getsize(video_path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(video_path, 'rb') as f:
+        digest.update(f.read(HASH_CHUNK))
+        if size > HASH_CHUNK:
+            f.seek(max(HASH_CHUNK, size - HASH_CHUNK))
+            digest.update(f.read(HASH_CHUNK))
+    return digest.hexdigest()
+
+
+def encode_params(params):
+    """提取参数序列化为稳定的字符串，便于比较"""
+    return json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+
+class Manifest:
+    """
+    保存在输出基础目录中的 SQLite 清单
+
+    每个视频以绝对路径为键，记录文件大小、修改时间、内容指纹、提取参数、
+    输出目录、状态以及已经连续写完的帧数。多个工作进程可以同时打开同一个清单。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # 写盘线程也会更新进度，连接允许跨线程使用（同一时间只有一个线程写）
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS videos (
+                source TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                params TEXT NOT NULL,
+                output_dir TEXT NOT NULL,
+                status TEXT NOT NULL,
+                frames_done INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    @classmethod
+    def for_output(cls, output_base_folder):
+        """打开输出基础目录下的清单"""
+        return cls(manifest_path_for(output_base_folder))
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _lookup(self, video_path, params):
+        """返回与当前文件内容和参数都匹配的记录，不匹配时返回 None"""
+        source = os.path.abspath(video_path)
+        row = self.conn.execute(
+            'SELECT size, mtime_ns, content_hash, params, output_dir, status, frames_done '
+            'FROM videos WHERE source = ?', (source,)).fetchone()
+        if row is None:
+            return None
+        size, mtime_ns, digest, saved_params, output_dir, status, frames_done = row
+        if saved_params != encode_params(params):
+            return None
+        st = os.stat(video_path)
+        if st.st_size != size:
+            return None
+        if st.st_mtime_ns != mtime_ns:
+            # 修改时间变了但内容可能没变（例如重新复制），再比较一次内容指纹
+            if content_hash(video_path, st.st_size) != digest:
+                return None
+            with self.conn:
+                self.conn.execute('UPDATE videos SET mtime_ns = ? WHERE source = ?',
+                                  (st.st_mtime_ns, source))
+        return {'output_dir': output_dir, 'status': status, 'frames_done': frames_done}
+
+    def is_up_to_date(self, video_path, params):
+        """视频及参数都没有变化且上次已经处理完成"""
+        record = self._lookup(video_path, params)
+        return (record is not None and record['status'] == STATUS_DONE
+                and os.path.isdir(record['output_dir']))
+
+    def begin(self, video_path, params, output_dir):
+        """
+        开始处理一个视频
+
+        返回:
+            可以直接跳过的帧数：上次中断时已经连续写完的帧数，新视频返回 0
+        """
+        record = self._lookup(video_path, params)
+        if (record is not None and record['status'] == STATUS_RUNNING
+                and record['output_dir'] == output_dir and os.path.isdir(output_dir)):
+            return record['frames_done']
+
+        st = os.stat(video_path)
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO videos '
+                '(source, size, mtime_ns, content_hash, params, output_dir, status, frames_done, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)',
+                (os.path.abspath(video_path), st.st_size, st.st_mtime_ns,
+                 content_hash(video_path, st.st_size), encode_params(params),
+                 output_dir, STATUS_RUNNING, time.time()))
+        return 0
+
+    def update_progress(self, video_path, frames_done):
+        """记录已经连续写完的帧数"""
+        with self.conn:
+            self.conn.execute('UPDATE videos SET frames_done = ?, updated_at = ? WHERE source = ?',
+                              (frames_done, time.time(), os.path.abspath(video_path)))
+
+    def finish(self, video_path, frames_done):
+        """标记视频处理完成"""
+        with self.conn:
+            self.conn.execute(
+                'UPDATE videos SET status = ?, frames_done = ?, updated_at = ? WHERE source = ?',
+                (STATUS_DONE, frames_done, time.time(), os.path.abspath(video_path)))
+
+
+class ProgressTracker:
+    """
+    把乱序完成的帧序号转换成连续完成的帧数并写入清单
+
+    编码线程池可能让后提交的帧先写完，续跑时只能从连续写完的位置继续。
+    """
+
+    def __init__(self, manifest, video_path, start=0):
+        self.manifest = manifest
+        self.video_path = video_path
+        self.frames_done = start
+        self._finished = set()
+
+    def mark(self, index):
+        self._finished.add(index)
+        advanced = False
+        while self.frames_done in self._finished:
+            self._finished.remove(self.frames_done)
+            self.frames_done += 1
+            advanced = True
+        if advanced:
+            self.manifest.update_progress(self.video_path, self.frames_done)
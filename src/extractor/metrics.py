@@ -0,0 +1,194 @@
+"""
+性能指标：各阶段耗时直方图和计数器
+
+提取流程（解码、哈希、编码、写盘、等待队列）和海螺提交流程（上传、等待生成、下载）都记录到
+全局的 METRICS 中，可以导出为 Prometheus 文本格式或 JSON Lines。设置环境变量
+YT_SHORT_PIC_METRICS 为输出文件路径后，批量处理结束时自动导出：
+.prom / .txt 结尾写 Prometheus 文本（覆盖），其他扩展名按 JSON Lines 追加一次快照。
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 耗时直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                   60.0, 300.0)
+
+METRICS_ENV = 'YT_SHORT_PIC_METRICS'
+
+
+def _series(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    items = [f'{key}="{value}"' for key, value in (*labels, *extra)]
+    return '{' + ','.join(items) + '}' if items else ''
+
+
+class Histogram:
+    """固定桶的直方图，counts[i] 为落在第 i 个桶（不超过 buckets[i]）的观测数，最后一个为 +Inf"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """线程安全的指标集合，按 (名称, 标签) 区分序列"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        """计数器加 value"""
+        key = _series(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """记录一次观测值（通常是秒数）"""
+        key = _series(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """记录 with 块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """可以 pickle / JSON 序列化的快照，用于从工作进程传回主进程"""
+        with self._lock:
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, dict(labels), list(h.buckets), list(h.counts), h.sum, h.count]
+                               for (name, labels), h in self._histograms.items()],
+            }
+
+    def merge(self, snapshot):
+        """合并另一个进程的快照"""
+        with self._lock:
+            for name, labels, value in snapshot['counters']:
+                key = _series(name, labels)
+                self._counters[key] = self._counters.get(key, 0) + value
+            for name, labels, buckets, counts, total, count in snapshot['histograms']:
+                key = _series(name, labels)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(buckets)
+                if histogram.buckets != tuple(buckets):
+                    raise ValueError(f"直方图的桶不一致: {name}")
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.sum += total
+                histogram.count += count
+
+    def stage_summary(self, name):
+        """某个直方图按标签汇总的 {标签值: (次数, 总秒数)}，只有一个标签时键为该标签的值"""
+        summary = {}
+        with self._lock:
+            for (series_name, labels), histogram in self._histograms.items():
+                if series_name == name:
+                    key = labels[0][1] if len(labels) == 1 else labels
+                    summary[key] = (histogram.count, histogram.sum)
+        return summary
+
+    def to_prometheus(self):
+        """Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+            typed = set()
+            for (name, labels), value in counters:
+                if name not in typed:
+                    lines.append(f'# TYPE {name} counter')
+                    typed.add(name)
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+            for (name, labels), histogram in histograms:
+                if name not in typed:
+                    lines.append(f'# TYPE {name} histogram')
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {histogram.sum}')
+                lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def to_jsonl(self, timestamp=None):
+        """JSON Lines，每个序列一行"""
+        timestamp = time.time() if timestamp is None else timestamp
+        snapshot = self.snapshot()
+        lines = [json.dumps({'ts': timestamp, 'type': 'counter', 'name': name, 'labels': labels, 'value': value},
+                            ensure_ascii=False)
+                 for name, labels, value in snapshot['counters']]
+        lines += [json.dumps({'ts': timestamp, 'type': 'histogram', 'name': name, 'labels': labels,
+                              'buckets': buckets, 'counts': counts, 'sum': total, 'count': count},
+                             ensure_ascii=False)
+                  for name, labels, buckets, counts, total, count in snapshot['histograms']]
+        return ''.join(line + '\n' for line in lines)
+
+    def export(self, path):
+        """按扩展名写入 Prometheus 文本（覆盖）或追加 JSON Lines"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if path.endswith(('.prom', '.txt')):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+        else:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(self.to_jsonl())
+
+
+# 进程内共享的指标
+METRICS = Metrics()
+
+
+def export_from_env(log_callback=print):
+    """环境变量 YT_SHORT_PIC_METRICS 指定了输出文件时导出指标"""
+    path = os.environ.get(METRICS_ENV)
+    if not path:
+        return None
+    try:
+        METRICS.export(path)
+    except OSError as e:
+        log_callback(f"[!] 写入性能指标失败: {path}: {e}")
+        return None
+    log_callback(f"[+] 性能指标已写入: {path}")
+    return path
+
+
+def call_with_metrics(fn, *args, **kwargs):
+    """在工作进程中调用 fn，返回 (结果, 这次调用产生的指标快照)"""
+    METRICS.reset()
+    result = fn(*args, **kwargs)
+    return result, METRICS.snapshot()
@@ -0,0 +1,20 @@
+"""输出目录命名规则"""
+
+
+def alnum_folder_name(name, max_length=20):
+    """只保留数字和字母"""
+    name = ''.join(c for c in name if c.isalnum())
+    return name[:max_length]
+
+
+def keep_folder_name(name):
+    """保留原文件名"""
+    return name
+
+
+def trimmed_folder_name(name, max_length=50):
+    """移除首尾空格，过长时截断后再移除尾部空格"""
+    name = name.strip()
+    if len(name) <= max_length:
+        return name
+    return name[:max_length].strip()
@@ -0,0 +1,157 @@
+"""帧保存流水线：解码线程 → 有界队列 → 编码线程池 → 写盘线程"""
+import os
+import queue
+import threading
+import time
+import traceback
+
+from extractor.metrics import METRICS
+from extractor.writers import FileWriter
+
+# 各阶段耗时记录在 frame_stage_seconds{stage=...} 中
+STAGE_METRIC = 'frame_stage_seconds'
+
+_STOP = object()
+
+
+def default_encoder_threads():
+    """默认编码线程数"""
+    return max(1, min(4, (os.cpu_count() or 1) - 1))
+
+
+class FramePipeline:
+    """
+    把 JPEG 编码和写盘从解码循环中拆出去
+
+    解码循环（调用 submit 的线程）只负责把帧放进有界队列，编码线程池
+    并行把帧编码成 JPEG 字节（OpenCV 和 Pillow 编码时都会释放 GIL），
+    单独的写盘线程把字节写入文件。队列满时 submit 会阻塞，从而限制
+    同时驻留在内存中的帧数。指定 dedup 时编码线程顺带计算感知哈希，
+    写盘线程在写入前查重，重复的帧按去重配置丢弃或硬链接。
+
+    参数:
+        encode_fn: 编码函数，encode_fn(frame) -> bytes
+        encoder_threads: 编码线程数
+        queue_depth: 等待编码、等待写盘的队列长度上限
+        on_saved: 每写完一帧的回调，on_saved(序号, 输出路径, 字节数)
+        dedup: 帧去重配置 FrameDeduplicator，None 表示不去重
+        on_duplicate: 发现重复帧时的回调，on_duplicate(序号, 输出路径, 已有帧路径)
+        writer: 写盘阶段，提供 write(输出路径, 字节) 方法，默认直接写文件
+        log_callback: 输出保存失败的帧
+    """
+
+    def __init__(self, encode_fn, encoder_threads=None, queue_depth=8, on_saved=None,
+                 dedup=None, on_duplicate=None, writer=None, log_callback=print):
+        self.encode_fn = encode_fn
+        self.encoder_threads = encoder_threads or default_encoder_threads()
+        self.queue_depth = max(1, queue_depth)
+        self.on_saved = on_saved
+        self.dedup = dedup
+        self.on_duplicate = on_duplicate
+        self.writer = writer or FileWriter()
+        self.log_callback = log_callback
+
+        self.saved_count = 0
+        self.duplicate_count = 0
+        self.bytes_written = 0
+        self.errors = []
+
+        self._frames = queue.Queue(maxsize=self.queue_depth)
+        self._encoded = queue.Queue(maxsize=self.queue_depth)
+        self._encoders = [
+            threading.Thread(target=self._encode_loop, name=f"frame-encoder-{i}", daemon=True)
+            for i in range(self.encoder_threads)
+        ]
+        self._writer = threading.Thread(target=self._write_loop, name="frame-writer", daemon=True)
+        for thread in self._encoders:
+            thread.start()
+        self._writer.start()
+        self._closed = False
+
+    @property
+    def max_in_flight(self):
+        """同时被流水线持有的帧数上限（排队等待编码 + 正在编码）"""
+        return self.queue_depth + self.encoder_threads
+
+    def submit(self, index, output_path, frame):
+        """提交一帧，队列已满时阻塞等待"""
+        # 阻塞时间说明编码/写盘跟不上解码
+        with METRICS.timer(STAGE_METRIC, stage='backpressure'):
+            self._frames.put((index, output_path, frame))
+
+    def close(self):
+        """等待所有已提交的帧写完，返回成功保存的帧数"""
+        if self._closed:
+            return self.saved_count
+        self._closed = True
+        for _ in self._encoders:
+            self._frames.put(_STOP)
+        for thread in self._encoders:
+            thread.join()
+        self._encoded.put(_STOP)
+        self._writer.join()
+        return self.saved_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _encode_loop(self):
+        while True:
+            item = self._frames.get()
+            if item is _STOP:
+                return
+            index, output_path, frame = item
+            try:
+                digest = None
+                if self.dedup is not None:
+                    with METRICS.timer(STAGE_METRIC, stage='hash'):
+                        digest = self.dedup.hash(frame)
+                with METRICS.timer(STAGE_METRIC, stage='encode'):
+                    data = self.encode_fn(frame)
+            except Exception as e:
+                self._fail(output_path, e)
+                continue
+            self._encoded.put((index, output_path, data, digest))
+
+    def _write_loop(self):
+        while True:
+            item = self._encoded.get()
+            if item is _STOP:
+                return
+            index, output_path, data, digest = item
+            try:
+                if digest is not None:
+                    existing = self.dedup.check(digest)
+                    if existing is not None and existing != output_path:
+                        self.dedup.resolve(existing, output_path)
+                        self.duplicate_count += 1
+                        self._notify(self.on_duplicate, index, output_path, existing)
+                        continue
+                started = time.perf_counter()
+                size = self.writer.write(output_path, data)
+                METRICS.observe(STAGE_METRIC, time.perf_counter() - started, stage='write')
+                if digest is not None:
+                    self.dedup.record(digest, output_path)
+            except Exception as e:
+                self._fail(output_path, e)
+                continue
+            self.saved_count += 1
+            self.bytes_written += size
+            self._notify(self.on_saved, index, output_path, size)
+
+    @staticmethod
+    def _notify(callback, *args):
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception:
+            traceback.print_exc()
+
+    def _fail(self, output_path, error):
+        self.errors.append((output_path, error))
+        self.log_callback(f"保存图片时出错: {output_path}: {str(error)}")
+        traceback.print_exc()
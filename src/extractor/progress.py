@@ -0,0 +1,74 @@
+"""限速的单行进度输出，代替每保存一帧就打印一次"""
+import multiprocessing
+import sys
+import threading
+import time
+
+
+class ProgressLine:
+    """
+    最多每 interval 秒输出一次进度
+
+    在终端中的主进程里原地刷新同一行；输出被重定向或者在工作进程中（多个进程共用终端）时逐行输出。
+    update 的参数与 run_job 的 on_progress 回调相同，可以直接作为回调传入。
+    """
+
+    def __init__(self, label='', interval=1.0, stream=None, unit='帧'):
+        self.label = label
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.unit = unit
+        self.inline = self._is_tty() and multiprocessing.parent_process() is None
+        self.done = 0
+        self.expected = None
+        self._start = time.perf_counter()
+        self._start_done = None
+        self._last = 0.0
+        self._width = 0
+        self._lock = threading.Lock()
+
+    def _is_tty(self):
+        try:
+            return self.stream.isatty()
+        except (AttributeError, ValueError):
+            return False
+
+    def _line(self):
+        elapsed = time.perf_counter() - self._start
+        rate = (self.done - (self._start_done or 0)) / elapsed if elapsed > 0 else 0.0
+        text = f"📊 {self.label} {self.done}" if self.label else f"📊 {self.done}"
+        if self.expected:
+            text += f"/{self.expected} {self.unit} ({min(100.0, self.done * 100 / self.expected):.0f}%)"
+        else:
+            text += f" {self.unit}"
+        return f"{text}  {rate:.1f} {self.unit}/秒"
+
+    def _write(self, final=False):
+        line = self._line()
+        if self.inline:
+            # 新内容比上一次短时用空格盖住旧内容
+            padding = ' ' * max(0, self._width - len(line))
+            self.stream.write('\r' + line + padding + ('\n' if final else ''))
+            self._width = len(line)
+        else:
+            self.stream.write(line + '\n')
+        self.stream.flush()
+
+    def update(self, done, expected=None):
+        """记录进度，距离上次输出超过 interval 秒时输出一次"""
+        with self._lock:
+            if self._start_done is None:
+                # 断点续跑时从已完成的帧数开始计算速度
+                self._start_done = max(0, done - 1)
+            self.done = done
+            self.expected = expected
+            now = time.perf_counter()
+            if now - self._last >= self.interval:
+                self._last = now
+                self._write()
+
+    def close(self):
+        """输出最终进度"""
+        with self._lock:
+            if self.done or self._width:
+                self._write(final=True)
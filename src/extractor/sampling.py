@@ -0,0 +1,147 @@
+"""视频帧采样：按目标帧号跳转读取，只对需要保存的帧做解码输出"""
+import cv2
+
+SAMPLING_MODES = ('auto', 'seek', 'scan')
+
+# 目标帧离当前位置不超过该帧数时直接 grab() 向前推进，比重新定位到关键帧更划算
+SEEK_THRESHOLD = 64
+
+
+def interval_targets(total_frames, frame_interval, start=0):
+    """生成按固定间隔需要保存的帧号"""
+    frame_interval = max(1, int(frame_interval))
+    first = -(-start // frame_interval) * frame_interval
+    return range(first, total_frames, frame_interval)
+
+
+def probe_seekable(video_path, total_frames=None):
+    """用独立的 VideoCapture 试探容器是否支持精确跳转"""
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        if not cap.isOpened():
+            return False
+        if total_frames is None:
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total_frames <= 1:
+            return False
+        target = total_frames // 2
+        if not cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+            return False
+        if not cap.grab():
+            return False
+        return int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == target + 1
+    finally:
+        cap.release()
+
+
+def _resolve_mode(cap, mode, video_path):
+    """把 'auto' 解析为 'seek' 或 'scan'"""
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"未知的采样模式: {mode}")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if total_frames <= 0:
+        return 'scan', total_frames
+    if mode == 'auto':
+        if video_path is not None:
+            mode = 'seek' if probe_seekable(video_path, total_frames) else 'scan'
+        else:
+            mode = 'seek'
+    return mode, total_frames
+
+
+def _scan(cap, position, wanted):
+    """线性扫描：跳过的帧只 grab()，wanted(帧号) 为真的帧才 retrieve()"""
+    while cap.grab():
+        if wanted(position):
+            ret, frame = cap.retrieve()
+            if ret:
+                yield position, frame
+        position += 1
+
+
+def _seek(cap, targets, fallback):
+    """
+    逐个跳转到目标帧
+
+    跳转落点与目标不一致时说明容器无法精确跳转，改用 fallback(当前位置, 目标帧) 线性扫描剩余部分
+    """
+    position = 0
+    for target in targets:
+        if target - position > SEEK_THRESHOLD:
+            # 远距离目标：让解码器定位到最近的关键帧，再解码到目标帧
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+            if position != target:
+                yield from fallback(max(position, 0), target)
+                return
+        else:
+            # 近距离目标：只 grab() 不 retrieve()，省去颜色转换和拷贝
+            while position < target:
+                if not cap.grab():
+                    return
+                position += 1
+
+        if not cap.grab():
+            return
+        position += 1
+        ret, frame = cap.retrieve()
+        if ret:
+            yield target, frame
+
+
+def iter_sampled_frames(cap, frame_interval, mode='auto', video_path=None, start=0):
+    """
+    按帧间隔采样视频帧
+
+    参数:
+        cap: 已打开的 cv2.VideoCapture
+        frame_interval: 两次保存之间的帧数
+        mode: 'seek' 跳转到目标帧, 'scan' 线性扫描, 'auto' 先试探能否精确跳转
+        video_path: 视频路径，auto 模式下用于独立试探，避免打乱 cap 的读取位置
+        start: 从该帧号开始采样（用于断点续跑）
+    返回:
+        生成器，逐个产出 (帧号, 帧)
+    """
+    frame_interval = max(1, int(frame_interval))
+    mode, total_frames = _resolve_mode(cap, mode, video_path)
+
+    def wanted(position, start=start):
+        return position >= start and position % frame_interval == 0
+
+    if mode == 'scan':
+        yield from _scan(cap, 0, wanted)
+        return
+
+    yield from _seek(cap, interval_targets(total_frames, frame_interval, start),
+                     lambda position, target: _scan(cap, position, lambda p: wanted(p, target)))
+
+
+def iter_frames_at(cap, targets, mode='auto', video_path=None):
+    """
+    读取指定帧号的帧
+
+    参数:
+        cap: 已打开的 cv2.VideoCapture
+        targets: 需要读取的帧号（会按升序处理）
+        mode / video_path: 同 iter_sampled_frames
+    返回:
+        生成器，逐个产出 (帧号, 帧)
+    """
+    targets = sorted(set(targets))
+    if not targets:
+        return
+    mode, _ = _resolve_mode(cap, mode, video_path)
+    last = targets[-1]
+
+    def scan_from(position, first):
+        remaining = {t for t in targets if t >= first}
+        for item in _scan(cap, position, remaining.__contains__):
+            yield item
+            if item[0] >= last:
+                return
+
+    if mode == 'scan':
+        yield from scan_from(0, 0)
+        return
+
+    yield from _seek(cap, targets, scan_from)
@@ -0,0 +1,201 @@
+"""场景切换选帧：在低分辨率缩略帧上打分，只在画面明显变化时取帧"""
+import cv2
+import numpy as np
+
+from extractor.ffmpeg_reader import FFmpegFrameReader
+from extractor.sampling import iter_sampled_frames
+
+# 颜色直方图每个通道量化为 8 级，共 512 个桶
+HIST_BITS = 3
+
+# 每攒够这么多缩略帧做一次批量打分，限制长视频的内存占用
+SCORE_CHUNK = 256
+
+
+def frame_histograms(frames):
+    """
+    批量计算颜色直方图
+
+    参数:
+        frames: (N, H, W, 3) 的 uint8 缩略帧
+    返回:
+        (N, 512) 的归一化直方图
+    """
+    frames = np.asarray(frames)
+    shift = 8 - HIST_BITS
+    quantized = (frames >> shift).astype(np.int32)
+    bins = (quantized[..., 0] << (2 * HIST_BITS)) | (quantized[..., 1] << HIST_BITS) | quantized[..., 2]
+    n = bins.shape[0]
+    size = 1 << (3 * HIST_BITS)
+    # 给每一帧的桶号加上偏移，一次 bincount 算完所有帧
+    offsets = (np.arange(n, dtype=np.int64) * size)[:, None]
+    counts = np.bincount((bins.reshape(n, -1) + offsets).ravel(), minlength=n * size)
+    counts = counts.reshape(n, size).astype(np.float32)
+    return counts / counts.sum(axis=1, keepdims=True)
+
+
+def change_scores(frames, previous=None, hist_weight=0.5):
+    """
+    计算相邻缩略帧之间的变化分数
+
+    分数由颜色直方图差异（0.5 * L1 距离）和灰度平均绝对差（SAD）加权得到，
+    取值范围 0-1。previous 为上一批的最后一帧，没有时第一帧的分数记为 1。
+    """
+    frames = np.asarray(frames)
+    if len(frames) == 0:
+        return np.zeros(0, dtype=np.float32)
+    if previous is not None:
+        frames = np.concatenate((previous[None], frames))
+    hists = frame_histograms(frames)
+    gray = frames.astype(np.float32).mean(axis=3)
+    hist_diff = 0.5 * np.abs(hists[1:] - hists[:-1]).sum(axis=1)
+    sad = np.abs(gray[1:] - gray[:-1]).mean(axis=(1, 2)) / 255.0
+    scores = hist_weight * hist_diff + (1.0 - hist_weight) * sad
+    if previous is None:
+        scores = np.concatenate(([1.0], scores))
+    return scores.astype(np.float32)
+
+
+def pick_scene_frames(times, scores, threshold, min_spacing=0.0, max_spacing=None, budget=None):
+    """
+    根据变化分数选帧
+
+    参数:
+        times: 每个候选帧的时间(秒)，升序
+        scores: 每个候选帧的变化分数
+        threshold: 分数达到该值才认为发生了场景切换
+        min_spacing: 相邻两次取帧的最小间隔(秒)
+        max_spacing: 超过该间隔仍没有场景切换时强制取一帧(秒)，None 表示不强制
+        budget: 每个视频最多取的帧数，超出时保留分数最高的帧
+    返回:
+        选中的候选帧下标列表（升序）
+    """
+    selected = []
+    last_time = None
+    for i, (t, score) in enumerate(zip(times, scores)):
+        if last_time is None:
+            selected.append(i)
+            last_time = t
+            continue
+        gap = t - last_time
+        if gap < min_spacing:
+            continue
+        if score >= threshold or (max_spacing is not None and gap >= max_spacing):
+            selected.append(i)
+            last_time = t
+
+    if budget is not None and len(selected) > budget:
+        # 第一帧始终保留，其余按分数取前 budget - 1 个
+        rest = sorted(selected[1:], key=lambda i: scores[i], reverse=True)[:max(0, budget - 1)]
+        selected = sorted(selected[:1] + rest)[:budget]
+    return selected
+
+
+class SceneSelector:
+    """
+    场景切换选帧器
+
+    先按 analysis_fps 对视频抽样并缩小到 analysis_width 宽的缩略帧打分，
+    再返回需要以原始分辨率保存的帧号。decoder 为 'ffmpeg' 时由 ffmpeg
+    直接输出低分辨率的缩略帧，为 'opencv' 时抽样解码后再缩小。
+
+    参数:
+        threshold: 场景切换分数阈值(0-1)
+        min_spacing: 相邻两次取帧的最小间隔(秒)
+        max_spacing: 长时间没有场景切换时强制取帧的间隔(秒)
+        budget: 每个视频最多取的帧数
+        analysis_fps: 打分时每秒抽样的帧数
+        analysis_width: 打分时缩略帧的宽度
+        decoder: 打分时使用的解码后端，'opencv' 或 'ffmpeg'
+    """
+
+    def __init__(self, threshold=0.3, min_spacing=1.0, max_spacing=None, budget=None,
+                 analysis_fps=2.0, analysis_width=160, decoder='opencv'):
+        self.threshold = threshold
+        self.min_spacing = min_spacing
+        self.max_spacing = max_spacing
+        self.budget = budget
+        self.analysis_fps = analysis_fps
+        self.analysis_width = analysis_width
+        self.decoder = decoder
+
+    def params(self):
+        """写入增量处理清单的参数"""
+        return dict(vars(self))
+
+    def __repr__(self):
+        args = ', '.join(f"{k}={v!r}" for k, v in vars(self).items())
+        return f"SceneSelector({args})"
+
+    def thumbnails(self, video_path, fps, log=print):
+        """逐个产出 (帧号, 缩略帧)"""
+        step = max(1, int(round(fps / self.analysis_fps))) if fps > 0 else 1
+        if self.decoder == 'ffmpeg':
+            reader = FFmpegFrameReader(video_path, step, width=self.analysis_width, log_callback=log)
+            for k, frame in reader:
+                # 缓冲区会被复用，缩略帧要留到批量打分，所以复制一份
+                yield k * step, frame.copy()
+            return
+
+        cap = cv2.VideoCapture(str(video_path))
+        try:
+            if not cap.isOpened():
+                return
+            for frame_index, frame in iter_sampled_frames(cap, step, 'auto', video_path):
+                height, width = frame.shape[:2]
+                if width > self.analysis_width:
+                    size = (self.analysis_width, max(1, round(height * self.analysis_width / width)))
+                    frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                yield frame_index, frame
+        finally:
+            cap.release()
+
+    def score(self, video_path, fps, log=print):
+        """
+        对视频打分
+
+        返回:
+            (帧号数组, 变化分数数组)
+        """
+        indices = []
+        scores = []
+        chunk = []
+        previous = None
+        for frame_index, frame in self.thumbnails(video_path, fps, log):
+            indices.append(frame_index)
+            chunk.append(frame)
+            if len(chunk) >= SCORE_CHUNK:
+                scores.append(change_scores(chunk, previous))
+                previous = chunk[-1]
+                chunk = []
+        if chunk:
+            scores.append(change_scores(chunk, previous))
+        if not scores:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return np.array(indices, dtype=np.int64), np.concatenate(scores)
+
+    def select(self, video_path, fps=None, log=print):
+        """
+        返回需要保存的帧号列表
+
+        参数:
+            video_path: 视频路径（打分时单独打开，不影响保存帧时使用的 VideoCapture）
+            fps: 视频帧率，None 时从视频中读取
+            log: 日志输出函数
+        """
+        if fps is None:
+            cap = cv2.VideoCapture(str(video_path))
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            cap.release()
+        indices, scores = self.score(video_path, fps, log)
+        if len(indices) == 0:
+            return []
+        times = indices / fps if fps > 0 else indices.astype(np.float64)
+        picked = pick_scene_frames(times, scores, self.threshold, self.min_spacing,
+                                   self.max_spacing, self.budget)
+        return [int(indices[i]) for i in picked]
+
+
+def scene_selector(scene=None, interval=1.0):
+    """返回给定的选帧器，未指定时以截图间隔作为最小取帧间隔创建默认选帧器"""
+    return scene if scene is not None else SceneSelector(min_spacing=interval)
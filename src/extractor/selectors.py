@@ -0,0 +1,62 @@
+"""选帧阶段：决定从视频中取哪些帧"""
+from extractor.scene import scene_selector
+
+
+class IntervalSelector:
+    """每隔 interval 秒取一帧"""
+
+    name = 'interval'
+
+    def __init__(self, interval=6.0):
+        self.interval = interval
+        # 预计输出的帧数，调用 frames 之后才知道，未知时为 None
+        self.expected = None
+
+    def params(self):
+        return {}
+
+    def frames(self, decoder, fps, start_index=0, buffers=None, log=print):
+        frame_interval = max(1, int(fps * self.interval))
+        log(f"⏱️ 每 {self.interval} 秒提取一帧（间隔 {frame_interval} 帧）")
+        if decoder.total_frames > 0:
+            self.expected = -(-decoder.total_frames // frame_interval)
+        return decoder.frames(frame_interval, start_index, buffers)
+
+
+class SceneChangeSelector:
+    """
+    只在场景切换时取帧
+
+    先在低分辨率缩略帧上找出场景切换的位置，再按原始分辨率读取这些帧；
+    scene 为 SceneSelector，默认以 interval 作为最小取帧间隔
+    """
+
+    name = 'scene'
+
+    def __init__(self, interval=6.0, scene=None):
+        self.interval = interval
+        self.scene = scene_selector(scene, interval)
+        self.expected = None
+
+    def params(self):
+        return {'scene': self.scene.params()}
+
+    def frames(self, decoder, fps, start_index=0, buffers=None, log=print):
+        targets = self.scene.select(decoder.video_path, fps, log)
+        log(f"🎬 场景切换选出 {len(targets)} 帧")
+        self.expected = len(targets)
+        return decoder.frames_at(targets[start_index:])
+
+
+SELECTOR_TYPES = {selector.name: selector for selector in (IntervalSelector, SceneChangeSelector)}
+
+
+def create_selector(mode, interval=6.0, scene=None):
+    """按选帧模式创建选帧器，mode 也可以直接是选帧器实例"""
+    if not isinstance(mode, str):
+        return mode
+    if mode == 'interval':
+        return IntervalSelector(interval)
+    if mode == 'scene':
+        return SceneChangeSelector(interval, scene)
+    raise ValueError(f"未知的选帧模式: {mode}")
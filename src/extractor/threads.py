@@ -0,0 +1,147 @@
+"""线程策略：按全局 CPU 预算给每个工作进程分配解码线程和编码线程，避免进程池叠加编解码线程造成超额订阅"""
+import os
+import time
+
+import cv2
+
+
+def cpu_count():
+    """当前进程可以使用的 CPU 核数"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class ThreadPolicy:
+    """
+    CPU 预算分配
+
+    每个工作进程分到 cpu_budget // workers 个核心，其中约三分之一给 JPEG
+    编码线程，其余给解码器（OpenCV 的 CAP_PROP_N_THREADS / ffmpeg 的 -threads）。
+    encoder_threads 为 0 时（例如由 ffmpeg 直接写图片）全部核心都给解码器。
+
+    参数:
+        cpu_budget: 可用的 CPU 核数，默认使用本机全部核心
+        workers: 并行的工作进程数
+        codec_threads: 指定每个进程的解码线程数，None 表示按预算计算
+        encoder_threads: 指定每个进程的编码线程数，None 表示按预算计算
+    """
+
+    def __init__(self, cpu_budget=None, workers=1, codec_threads=None, encoder_threads=None):
+        self.cpu_budget = max(1, cpu_budget or cpu_count())
+        self.workers = max(1, workers)
+        if encoder_threads is None:
+            encoder_threads = max(1, self.per_worker // 3)
+        self.encoder_threads = encoder_threads
+        self.codec_threads = codec_threads or max(1, self.per_worker - encoder_threads)
+
+    @property
+    def per_worker(self):
+        return max(1, self.cpu_budget // self.workers)
+
+    def __repr__(self):
+        return (f"ThreadPolicy(cpu_budget={self.cpu_budget}, workers={self.workers}, "
+                f"codec_threads={self.codec_threads}, encoder_threads={self.encoder_threads})")
+
+
+def apply_process_threads(codec_threads):
+    """限制 OpenCV 自身的并行线程池（颜色转换、缩放等），在工作进程中调用"""
+    if codec_threads:
+        cv2.setNumThreads(int(codec_threads))
+
+
+def open_capture(video_path, codec_threads=None):
+    """打开 VideoCapture，并设置解码线程数（OpenCV 版本不支持该参数时忽略）"""
+    if codec_threads and hasattr(cv2, 'CAP_PROP_N_THREADS'):
+        try:
+            cap = cv2.VideoCapture(str(video_path), cv2.CAP_ANY, [cv2.CAP_PROP_N_THREADS, int(codec_threads)])
+            if cap.isOpened():
+                return cap
+            cap.release()
+        except cv2.error:
+            pass
+    return cv2.VideoCapture(str(video_path))
+
+
+def measure_decode_fps(video_path, codec_threads, frames=120):
+    """用指定的解码线程数连续解码若干帧，返回每秒解码帧数"""
+    cap = open_capture(video_path, codec_threads)
+    try:
+        if not cap.isOpened():
+            return 0.0
+        # 第一帧包含打开解码器的开销，不计入测量
+        if not cap.grab():
+            return 0.0
+        decoded = 0
+        start = time.perf_counter()
+        while decoded < frames and cap.grab():
+            decoded += 1
+        elapsed = time.perf_counter() - start
+    finally:
+        cap.release()
+    return decoded / elapsed if elapsed > 0 else 0.0
+
+
+def autotune_codec_threads(video_path, max_threads, frames=120, tolerance=0.05, log_callback=print):
+    """
+    在第一个视频上测量几种解码线程数的速度，返回最合适的线程数
+
+    候选为 1, 2, 4, ... 直到 max_threads；速度相差不超过 tolerance 时选线程更少的，
+    把多余的核心留给其他工作进程。
+    """
+    candidates = []
+    n = 1
+    while n < max_threads:
+        candidates.append(n)
+        n *= 2
+    candidates.append(max(1, max_threads))
+
+    results = {n: measure_decode_fps(video_path, n, frames) for n in dict.fromkeys(candidates)}
+    best_fps = max(results.values())
+    best = min(n for n, fps in results.items() if fps >= best_fps * (1 - tolerance))
+    summary = ', '.join(f"{n} 线程 {fps:.0f} 帧/秒" for n, fps in results.items())
+    log_callback(f"[+] 解码线程测速: {summary}，选择 {best} 线程")
+    return best
+
+
+def thread_policy_for(workers, codec_threads=None, sample_video=None, log_callback=print, encoder_threads=None):
+    """
+    按并行进程数生成线程策略
+
+    codec_threads 为整数时直接使用；为 'auto' 时在 sample_video（通常是第一个待处理的视频）
+    上测速，在预算允许的范围内选定解码线程数，之后所有视频都使用这个值。
+    """
+    policy = ThreadPolicy(workers=workers, encoder_threads=encoder_threads)
+    if codec_threads == 'auto':
+        if sample_video:
+            policy.codec_threads = autotune_codec_threads(sample_video, policy.codec_threads,
+                                                          log_callback=log_callback)
+    elif codec_threads:
+        policy.codec_threads = int(codec_threads)
+    return policy
+
+
+def assign_threads(tasks, workers, codec_threads=None, log_callback=print, encoder_threads=True):
+    """
+    按实际会启动的进程数给批量任务分配线程，写入每个任务的参数
+
+    tasks 的格式同 run_batch；encoder_threads 为 False 时不分配编码线程（例如由 ffmpeg 直接写图片）。
+    """
+    if not tasks:
+        return None
+    if workers is None:
+        workers = max(1, cpu_count() - 1)
+    workers = max(1, min(workers, len(tasks)))
+    policy = thread_policy_for(workers, codec_threads, tasks[0][0], log_callback,
+                               encoder_threads=None if encoder_threads else 0)
+    for _, _, kwargs in tasks:
+        kwargs['codec_threads'] = policy.codec_threads
+        if encoder_threads:
+            kwargs['encoder_threads'] = policy.encoder_threads
+    if encoder_threads:
+        log_callback(f"[+] 线程分配: {workers} 个进程，每个进程 {policy.codec_threads} 个解码线程、"
+                     f"{policy.encoder_threads} 个编码线程")
+    else:
+        log_callback(f"[+] 线程分配: {workers} 个进程，每个进程 {policy.codec_threads} 个解码线程")
+    return policy
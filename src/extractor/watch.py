@@ -0,0 +1,390 @@
+"""
+监视输入文件夹，持续处理新出现的视频
+
+Linux 上通过 inotify（ctypes 调用 libc，不需要额外依赖）接收文件变化，其他平台或者 inotify 不可用时
+定期扫描文件夹；recursive 为 True 时同时监视所有子文件夹（包括之后新建的），和 process_folder 一样
+跳过以 . 开头的文件和文件夹。下载工具可能分多次写入同一个文件，收到变化后还要等文件大小和修改时间
+稳定 settle 秒才认为写完，然后立即交给进程池处理；同时在途的视频不超过进程数，其余排队等待。
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from extractor.batch import MAX_CRASHES, default_workers
+from extractor.discovery import iter_files
+from extractor.metrics import METRICS, call_with_metrics, export_from_env
+
+# inotify 事件
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+_EVENT = struct.Struct('iIII')
+
+# 从文件出现到帧提取完成的耗时
+LATENCY_METRIC = 'watch_latency_seconds'
+
+
+def _is_candidate(name, suffixes):
+    return not name.startswith('.') and name.lower().endswith(suffixes)
+
+
+def list_candidates(folder, suffixes, recursive=False):
+    """文件夹中扩展名匹配的文件路径，recursive 为 True 时包括子文件夹"""
+    if recursive:
+        return [found.path for found in iter_files(folder, suffixes)]
+    with os.scandir(folder) as entries:
+        return [entry.path for entry in entries if entry.is_file() and _is_candidate(entry.name, suffixes)]
+
+
+def list_folders(folder):
+    """文件夹本身和所有子文件夹（跳过以 . 开头的文件夹）"""
+    folders = []
+    for root, dirs, _ in os.walk(folder):
+        dirs[:] = [name for name in dirs if not name.startswith('.')]
+        folders.append(root)
+    return folders
+
+
+class PollingWatcher:
+    """定期扫描文件夹，返回新出现或者大小、修改时间有变化的文件"""
+
+    name = 'polling'
+
+    def __init__(self, folder, suffixes, interval=1.0, recursive=False):
+        self.folder = folder
+        self.suffixes = suffixes
+        self.interval = interval
+        self.recursive = recursive
+        self._seen = {}
+        self._next_scan = 0.0
+        self._scan()
+
+    def _scan(self):
+        changed = set()
+        seen = {}
+        for path in list_candidates(self.folder, self.suffixes, self.recursive):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            seen[path] = (st.st_size, st.st_mtime_ns)
+            if self._seen.get(path) != seen[path]:
+                changed.add(path)
+        self._seen = seen
+        self._next_scan = time.monotonic() + self.interval
+        return changed
+
+    def poll(self, timeout):
+        """最多等待 timeout 秒，返回有变化的文件路径集合"""
+        delay = min(timeout, self._next_scan - time.monotonic())
+        if delay > 0:
+            time.sleep(delay)
+        if time.monotonic() < self._next_scan:
+            return set()
+        return self._scan()
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    通过 inotify 接收文件夹中的文件变化（仅 Linux）
+
+    inotify 不会自动监视子文件夹：recursive 为 True 时给每个子文件夹单独添加监视，
+    收到新建（或移入）子文件夹的事件时再给它添加监视，并把其中已有的文件当作新文件返回。
+    """
+
+    name = 'inotify'
+
+    def __init__(self, folder, suffixes, recursive=False):
+        self.folder = folder
+        self.suffixes = suffixes
+        self.recursive = recursive
+        # 监视描述符 → 文件夹路径
+        self._folders = {}
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 失败')
+        try:
+            self._add_watch(folder)
+        except OSError:
+            os.close(self.fd)
+            raise
+        if recursive:
+            self._add_tree(folder)
+
+    def _add_watch(self, folder):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch 失败: {folder}')
+        self._folders[wd] = folder
+
+    def _add_tree(self, folder):
+        """监视 folder 及其所有子文件夹；已经监视的文件夹 inotify 返回同一个描述符"""
+        for path in list_folders(folder):
+            try:
+                self._add_watch(path)
+            except OSError:
+                # 文件夹刚被删除或者没有权限，跳过
+                continue
+
+    def _rescan(self):
+        if self.recursive:
+            self._add_tree(self.folder)
+        return set(list_candidates(self.folder, self.suffixes, self.recursive))
+
+    def poll(self, timeout):
+        """最多等待 timeout 秒，返回有变化的文件路径集合；事件队列溢出时返回文件夹中的所有文件"""
+        readable, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            raw_name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                # 丢失了部分事件，重新扫描一次
+                return self._rescan()
+            if mask & IN_IGNORED:
+                # 子文件夹被删除或者移走，inotify 已经自动移除了监视
+                self._folders.pop(wd, None)
+                continue
+            folder = self._folders.get(wd)
+            if folder is None:
+                continue
+            name = os.fsdecode(raw_name)
+            path = os.path.join(folder, name)
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith('.'):
+                    # 添加监视之前写入的文件收不到事件，直接当作新文件
+                    self._add_tree(path)
+                    changed.update(list_candidates(path, self.suffixes, recursive=True))
+            elif _is_candidate(name, self.suffixes):
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(folder, suffixes, poll_interval=1.0, use_inotify=None, log_callback=print, recursive=False):
+    """Linux 上优先使用 inotify，不可用时退回定期扫描"""
+    if use_inotify is None:
+        use_inotify = sys.platform.startswith('linux')
+    if use_inotify:
+        try:
+            return InotifyWatcher(folder, suffixes, recursive)
+        except (OSError, AttributeError) as e:
+            log_callback(f"[!] inotify 不可用，改为每 {poll_interval} 秒扫描一次: {e}")
+    return PollingWatcher(folder, suffixes, poll_interval, recursive)
+
+
+class StableFileTracker:
+    """记录文件最近一次变化的时间，大小和修改时间 settle 秒内没有变化的文件视为写完"""
+
+    def __init__(self, settle=2.0):
+        self.settle = settle
+        # 路径 → (大小, 修改时间, 最近一次变化的时间, 第一次发现的时间)
+        self._files = {}
+
+    def __len__(self):
+        return len(self._files)
+
+    def touch(self, path, now=None):
+        now = time.monotonic() if now is None else now
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._files.pop(path, None)
+            return
+        previous = self._files.get(path)
+        if previous is None:
+            self._files[path] = (st.st_size, st.st_mtime_ns, now, now)
+        elif previous[:2] != (st.st_size, st.st_mtime_ns):
+            self._files[path] = (st.st_size, st.st_mtime_ns, now, previous[3])
+
+    def pop_ready(self, now=None):
+        """返回已经写完的文件 [(路径, 第一次发现的时间)]，并停止跟踪它们"""
+        now = time.monotonic() if now is None else now
+        ready = []
+        for path in list(self._files):
+            self.touch(path, now)
+            record = self._files.get(path)
+            if record is not None and record[0] > 0 and now - record[2] >= self.settle:
+                ready.append((path, record[3]))
+                del self._files[path]
+        return ready
+
+
+class WatchDaemon:
+    """
+    持续处理输入文件夹中的新视频
+
+    参数:
+        plan_fn: plan_fn(视频路径, 相对目录) 返回 run_batch 格式的任务 (视频路径, 输出目录, 关键字参数)，
+            不需要处理（例如清单中已经处理完成）时返回 None；相对目录为视频所在文件夹相对于
+            input_folder 的路径（根目录下为空字符串），同 FoundFile.relative_dir
+        extract_fn: 同 run_batch，必须是模块级函数
+        workers: 进程池大小，也是同时在途的视频数上限
+        settle: 文件大小和修改时间保持不变多少秒后开始处理
+        poll_interval: 定期扫描的间隔，inotify 模式下为检查文件是否写完的间隔
+        recursive: 是否同时监视子文件夹
+    """
+
+    def __init__(self, input_folder, plan_fn, extract_fn, suffixes, workers=None, settle=2.0, poll_interval=1.0,
+                 use_inotify=None, log_callback=print, recursive=False):
+        self.input_folder = input_folder
+        self.plan_fn = plan_fn
+        self.extract_fn = extract_fn
+        self.suffixes = tuple(suffixes)
+        self.workers = workers or default_workers()
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.log_callback = log_callback
+        self.recursive = recursive
+        self.total_frames = 0
+        self.processed_videos = 0
+        self._tracker = StableFileTracker(settle)
+        self._queue = deque()
+        self._running = {}
+        self._crashes = {}
+
+    def _enqueue_ready(self):
+        busy = {task[0] for task, _ in self._running.values()} | {task[0] for task, _ in self._queue}
+        for path, seen_at in self._tracker.pop_ready():
+            if path in busy:
+                # 正在处理时又被改写，处理完后再检查一次
+                self._tracker.touch(path)
+                continue
+            relative_dir = os.path.relpath(os.path.dirname(path), self.input_folder)
+            try:
+                task = self.plan_fn(path, '' if relative_dir == os.curdir else relative_dir)
+            except Exception as e:
+                self.log_callback(f"❌ 无法处理视频: {path}: {e}")
+                continue
+            if task is None:
+                continue
+            self.log_callback(f"[+] 新视频: {os.path.basename(path)}")
+            self._queue.append((task, seen_at))
+
+    def _submit(self, pool):
+        # 崩溃过的视频单独运行，避免再次连累其他视频
+        while self._queue and len(self._running) < self.workers:
+            if any(self._crashes.get(task[0]) for task, _ in self._running.values()):
+                break
+            if self._crashes.get(self._queue[0][0][0]) and self._running:
+                break
+            task, seen_at = self._queue.popleft()
+            video_path, output_dir, kwargs = task
+            try:
+                future = pool.submit(call_with_metrics, self.extract_fn, video_path, output_dir, **kwargs)
+            except BrokenProcessPool:
+                self._queue.appendleft((task, seen_at))
+                return False
+            self._running[future] = (task, seen_at)
+        return True
+
+    def _requeue(self, task, seen_at):
+        video_path = task[0]
+        self._crashes[video_path] = self._crashes.get(video_path, 0) + 1
+        if self._crashes[video_path] >= MAX_CRASHES:
+            self.log_callback(f"❌ 视频多次导致工作进程崩溃，已跳过: {video_path}")
+        else:
+            self._queue.appendleft((task, seen_at))
+
+    def _collect(self, done):
+        """处理完成的任务，返回进程池是否已经损坏"""
+        broken = False
+        for future in done:
+            task, seen_at = self._running.pop(future)
+            video_path = task[0]
+            try:
+                frames_saved, snapshot = future.result()
+                frames_saved = frames_saved or 0
+                METRICS.merge(snapshot)
+            except BrokenProcessPool:
+                broken = True
+                self._requeue(task, seen_at)
+                continue
+            except Exception as e:
+                self.log_callback(f"❌ 处理视频失败: {video_path}: {str(e)}")
+                traceback.print_exc()
+                continue
+            latency = time.monotonic() - seen_at
+            METRICS.observe(LATENCY_METRIC, latency)
+            self.total_frames += frames_saved
+            self.processed_videos += 1
+            self.log_callback(f"✅ {os.path.basename(video_path)}: 保存 {frames_saved} 帧，"
+                              f"发现后 {latency:.1f} 秒完成")
+        return broken
+
+    def run(self, stop_event=None):
+        """
+        处理已有的视频，然后持续监视新视频，直到 stop_event 被设置或者按 Ctrl+C
+
+        返回:
+            (总共保存的帧数, 处理成功的视频数)
+        """
+        stop_event = stop_event or threading.Event()
+        watcher = create_watcher(self.input_folder, self.suffixes, self.poll_interval, self.use_inotify,
+                                 self.log_callback, self.recursive)
+        for path in list_candidates(self.input_folder, self.suffixes, self.recursive):
+            self._tracker.touch(path)
+        pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.log_callback(f"[+] 正在监视 {self.input_folder}（{watcher.name}，{self.workers} 个进程），按 Ctrl+C 停止")
+        try:
+            while not stop_event.is_set():
+                self._enqueue_ready()
+                if not self._submit(pool):
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=self.workers)
+                    continue
+                # 有文件在等待写完时按 settle 的节奏检查，否则只等待新的文件变化
+                timeout = min(self.poll_interval, self.settle / 2) if len(self._tracker) else self.poll_interval
+                if self._running:
+                    done, _ = wait(self._running, timeout=0)
+                    if done and self._collect(done):
+                        for task, seen_at in self._running.values():
+                            self._requeue(task, seen_at)
+                        self._running.clear()
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        self.log_callback("[!] 工作进程异常退出，重建进程池继续处理")
+                        pool = ProcessPoolExecutor(max_workers=self.workers)
+                        continue
+                    timeout = min(timeout, 0.1)
+                for path in watcher.poll(timeout):
+                    self._tracker.touch(path)
+        except KeyboardInterrupt:
+            self.log_callback("\n[!] 收到中断，等待正在处理的视频完成")
+        finally:
+            watcher.close()
+            if self._running:
+                self._collect(wait(self._running).done)
+            pool.shutdown(wait=True, cancel_futures=True)
+            export_from_env(self.log_callback)
+        self.log_callback(f"[+] 已停止监视，共处理 {self.processed_videos} 个视频，保存 {self.total_frames} 帧")
+        return self.total_frames, self.processed_videos
@@ -0,0 +1,160 @@
+"""后台提取：在工作线程中运行提取任务，通过线程安全的队列向界面报告日志和进度"""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from extractor.engine import ExtractionJob, JobControl, run_job
+from extractor.threads import assign_threads
+
+
+@dataclass
+class ProgressSnapshot:
+    """某一时刻的整体进度"""
+
+    videos_total: int
+    videos_done: int
+    # 按帧折算的已完成视频数，例如第二个视频处理到一半时为 1.5
+    progress: float
+    frames_done: int
+    elapsed: float
+    fps: float
+    eta: Optional[float]
+
+
+class ExtractionWorker(threading.Thread):
+    """
+    在后台线程中依次（或同时处理 workers 个视频）运行提取任务
+
+    界面线程不直接接触提取过程，只用 after() 定时读取 events 队列。队列中的事件:
+        ('log', 消息)
+        ('planned', 视频数)                        规划完成，之后开始处理
+        ('video', 序号, 视频路径)                  开始处理一个视频
+        ('progress', ProgressSnapshot)             每处理完一帧
+        ('done', 序号, ExtractionResult)           一个视频处理完成
+        ('finished', 总帧数, 处理的视频数, 是否取消)  全部结束，之后不再有事件
+
+    参数:
+        tasks: [(视频路径, 输出目录, ExtractionJob 的字段)]，同 plan_folder 的返回值；
+            也可以是函数 tasks(log_callback)，在后台线程中遍历目录、生成任务，大目录不会卡住界面
+        workers: 同时处理的视频数；在线程中运行，编解码都会释放 GIL
+        codec_threads: 同 assign_threads，规划完成后在后台线程中分配每个视频的线程数
+    """
+
+    def __init__(self, tasks, workers=1, codec_threads=None):
+        super().__init__(name='extraction-worker', daemon=True)
+        self.plan = tasks if callable(tasks) else None
+        self.tasks = [] if callable(tasks) else list(tasks)
+        self.workers = max(1, workers)
+        self.codec_threads = codec_threads
+        self.events = queue.Queue()
+        self.control = JobControl()
+        self._lock = threading.Lock()
+        # 每个视频的 (已完成帧数, 预计总帧数)
+        self._progress = {}
+        self._videos_done = 0
+        self._frames_done = 0
+        self._start_time = None
+
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+    def cancel(self):
+        self.control.cancel()
+
+    def _post(self, *event):
+        self.events.put(event)
+
+    def _log(self, message):
+        self._post('log', message)
+
+    def snapshot(self):
+        with self._lock:
+            progress = 0.0
+            for done, expected in self._progress.values():
+                if expected:
+                    progress += min(1.0, done / expected)
+            progress += self._videos_done
+            frames_done = self._frames_done
+            videos_done = self._videos_done
+        elapsed = time.perf_counter() - self._start_time
+        fps = frames_done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if progress > 0:
+            eta = elapsed * (len(self.tasks) - progress) / progress
+        return ProgressSnapshot(len(self.tasks), videos_done, progress, frames_done, elapsed, fps, eta)
+
+    def _prepare(self):
+        """遍历目录、分配线程（可能需要测速解码），都在后台线程中进行"""
+        if self.plan is not None:
+            self.tasks = list(self.plan(self._log))
+        self.workers = max(1, min(self.workers, len(self.tasks) or 1))
+        if self.tasks and not self.control.cancelled:
+            assign_threads(self.tasks, self.workers, self.codec_threads, log_callback=self._log)
+
+    def run(self):
+        total_frames = 0
+        processed_videos = 0
+        try:
+            self._prepare()
+        except Exception as e:
+            self._post('log', f"处理过程中发生错误: {str(e)}")
+            self.tasks = []
+        self._post('planned', len(self.tasks))
+        self._start_time = time.perf_counter()
+        if self.tasks:
+            with ThreadPoolExecutor(self.workers, thread_name_prefix='extraction-job') as pool:
+                futures = [pool.submit(self._run_task, number, *task)
+                           for number, task in enumerate(self.tasks, 1)]
+                # 一个视频出错不影响其他视频，全部结束后才报告完成
+                for future in futures:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self._post('log', f"处理过程中发生错误: {str(e)}")
+                        continue
+                    if result is not None:
+                        total_frames += result.saved
+                        processed_videos += result.completed
+        self._post('finished', total_frames, processed_videos, self.control.cancelled)
+
+    def _run_task(self, number, video_path, output_dir, options):
+        # 暂停时不开始新的视频，取消后剩下的视频都跳过
+        if not self.control.checkpoint():
+            return None
+        self._post('video', number, video_path)
+
+        def on_progress(done, expected):
+            with self._lock:
+                self._progress[number] = (done, expected)
+                self._frames_done += 1
+            self._post('progress', self.snapshot())
+
+        job = ExtractionJob(video_path, output_dir, **options)
+        result = run_job(job, log=self._log, on_progress=on_progress,
+                         control=self.control)
+        with self._lock:
+            self._progress.pop(number, None)
+            # 出错的视频也算处理过，取消时中途停下的视频不算
+            if result.completed or not self.control.cancelled:
+                self._videos_done += 1
+        self._post('done', number, result)
+        self._post('progress', self.snapshot())
+        return result
+
+
+def format_duration(seconds):
+    """把秒数格式化成 mm:ss 或 h:mm:ss"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
@@ -0,0 +1,29 @@
+"""写盘阶段：把编码好的 JPEG 字节保存到输出位置"""
+import os
+
+
+class FileWriter:
+    """直接把字节写到输出路径"""
+
+    name = 'file'
+
+    def prepare(self, output_dir, log=print):
+        """创建输出目录并检查是否可写，不可写时返回 False"""
+        os.makedirs(output_dir, exist_ok=True)
+        log(f"[+] 创建目录: {output_dir}")
+        test_file = os.path.join(output_dir, 'test.txt')
+        try:
+            with open(test_file, 'w') as f:
+                f.write('test')
+            os.remove(test_file)
+            log("[+] 输出目录可写")
+        except Exception as e:
+            log(f"[!] 警告：输出目录可能没有写入权限: {str(e)}")
+            return False
+        return True
+
+    def write(self, output_path, data):
+        """写入一帧，返回写入的字节数"""
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        return len(data)
@@ -18,14 +18,21 @@ from tkinter import ttk, filedialog, messagebox
 import cv2
 import os
 from pathlib import Path
-from patch import extract_frames, sanitize_folder_name
+import queue
+from extractor.engine import plan_folder
+from extractor.naming import trimmed_folder_name
+from extractor.worker import ExtractionWorker, format_duration
+
+# 界面读取后台事件的间隔（毫秒）
+POLL_INTERVAL_MS = 100
 
 class VideoFrameExtractor(tk.Tk):
     def __init__(self):
         super().__init__()
         
         self.title("视频帧提取工具")
-        self.geometry("600x400")
+        self.geometry("600x480")
+        self.worker = None
         
         # 创建主框架
         main_frame = ttk.Frame(self, padding="10")
@@ -48,8 +55,15 @@ class VideoFrameExtractor(tk.Tk):
         self.interval = tk.StringVar(value="6")
         ttk.Entry(main_frame, textvariable=self.interval, width=10).grid(row=2, column=1, sticky=tk.W, pady=5)
         
-        # 开始按钮
-        ttk.Button(main_frame, text="开始处理", command=self.start_processing).grid(row=3, column=0, columnspan=3, pady=20)
+        # 开始 / 暂停 / 取消按钮
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=3, column=0, columnspan=3, pady=20)
+        self.start_button = ttk.Button(button_frame, text="开始处理", command=self.start_processing)
+        self.start_button.pack(side=tk.LEFT, padx=5)
+        self.pause_button = ttk.Button(button_frame, text="暂停", command=self.toggle_pause, state=tk.DISABLED)
+        self.pause_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="取消", command=self.cancel_processing, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
         
         # 进度显示
         self.progress_var = tk.StringVar(value="准备就绪")
@@ -59,9 +73,13 @@ class VideoFrameExtractor(tk.Tk):
         self.progress = ttk.Progressbar(main_frame, length=400, mode='determinate')
         self.progress.grid(row=5, column=0, columnspan=3, pady=5)
         
+        # 速度和剩余时间
+        self.speed_var = tk.StringVar(value="")
+        ttk.Label(main_frame, textvariable=self.speed_var).grid(row=6, column=0, columnspan=3, pady=5)
+        
         # 日志显示
         self.log_text = tk.Text(main_frame, height=10, width=60)
-        self.log_text.grid(row=6, column=0, columnspan=3, pady=5)
+        self.log_text.grid(row=7, column=0, columnspan=3, pady=5)
         
     def select_input_folder(self):
         folder = filedialog.askdirectory(title="选择视频所在文件夹")
@@ -74,9 +92,9 @@ class VideoFrameExtractor(tk.Tk):
             self.output_path.set(folder)
             
     def log(self, message):
+        # 只在界面线程中调用，后台线程的日志经事件队列转过来
         self.log_text.insert(tk.END, message + "\n")
         self.log_text.see(tk.END)
-        self.update_idletasks()
         
     def start_processing(self):
         # 验证输入
@@ -98,50 +116,100 @@ class VideoFrameExtractor(tk.Tk):
         # 清空日志
         self.log_text.delete(1.0, tk.END)
         
-        # 开始处理
+        # 确保输出文件夹存在
         try:
-            # 支持的视频格式
-            video_extensions = ['.mp4', '.avi', '.mov', '.mkv']
-            
-            # 确保输出文件夹存在
             Path(output_folder).mkdir(parents=True, exist_ok=True)
-            
-            # 获取视频文件列表
-            video_files = [f for f in os.listdir(input_folder) 
-                         if any(f.lower().endswith(ext) for ext in video_extensions)]
-            
-            if not video_files:
-                self.log("未找到视频文件")
-                return
-                
-            # 设置进度条
-            self.progress["maximum"] = len(video_files)
-            self.progress["value"] = 0
-            
-            # 处理每个视频
-            total_frames = 0
-            for i, filename in enumerate(video_files, 1):
-                video_path = os.path.join(input_folder, filename)
-                video_name = os.path.splitext(filename)[0]
-                safe_video_name = sanitize_folder_name(video_name)
-                output_dir = os.path.join(output_folder, safe_video_name)
-                
-                self.progress_var.set(f"正在处理: {filename}")
-                self.log(f"\n处理视频 ({i}/{len(video_files)}): {filename}")
-                
-                frames_saved = extract_frames(video_path, output_dir, interval)
-                total_frames += frames_saved
-                
-                self.progress["value"] = i
-                
-            self.progress_var.set("处理完成!")
-            self.log(f"\n批量处理完成!")
-            self.log(f"处理的视频数量: {len(video_files)}")
-            self.log(f"总共保存的帧数: {total_frames}")
-            
         except Exception as e:
             messagebox.showerror("错误", f"处理过程中发生错误:\n{str(e)}")
             self.log(f"错误: {str(e)}")
+            return
+        
+        def plan(log_callback):
+            return plan_folder(input_folder, output_folder, trimmed_folder_name, incremental=False,
+                               log_callback=log_callback, interval=interval, naming='frame_{}.jpg')
+        
+        self.progress["value"] = 0
+        self.speed_var.set("")
+        self.progress_var.set("正在查找视频...")
+        
+        # 遍历目录、分配线程和提取都在后台线程中进行，界面线程定时读取事件队列
+        self.worker = ExtractionWorker(plan)
+        self.worker.start()
+        self.start_button.config(state=tk.DISABLED)
+        self.pause_button.config(state=tk.NORMAL, text="暂停")
+        self.cancel_button.config(state=tk.NORMAL)
+        self.after(POLL_INTERVAL_MS, self.poll_worker)
+        
+    def toggle_pause(self):
+        if self.worker is None:
+            return
+        if self.worker.control.paused:
+            self.worker.resume()
+            self.pause_button.config(text="暂停")
+            self.log("继续处理")
+        else:
+            self.worker.pause()
+            self.pause_button.config(text="继续")
+            self.log("已暂停，正在处理的帧写完后停下")
+            
+    def cancel_processing(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.pause_button.config(state=tk.DISABLED)
+            self.progress_var.set("正在取消...")
+            
+    def poll_worker(self):
+        worker = self.worker
+        if worker is None:
+            return
+        snapshot = None
+        try:
+            while True:
+                event = worker.events.get_nowait()
+                kind = event[0]
+                if kind == 'log':
+                    self.log(event[1])
+                elif kind == 'planned':
+                    # 设置进度条
+                    self.progress["maximum"] = max(1, event[1])
+                    if not event[1]:
+                        self.log("未找到视频文件")
+                elif kind == 'video':
+                    number, video_path = event[1], event[2]
+                    filename = os.path.basename(video_path)
+                    self.progress_var.set(f"正在处理: {filename}")
+                    self.log(f"\n处理视频 ({number}/{len(worker.tasks)}): {filename}")
+                elif kind == 'done':
+                    self.log(f"完成! 共保存了 {event[2].saved} 帧")
+                elif kind == 'progress':
+                    # 只显示最新的进度
+                    snapshot = event[1]
+                elif kind == 'finished':
+                    if snapshot is not None:
+                        self.show_progress(snapshot)
+                    self.finish_processing(*event[1:])
+                    return
+        except queue.Empty:
+            pass
+        if snapshot is not None:
+            self.show_progress(snapshot)
+        self.after(POLL_INTERVAL_MS, self.poll_worker)
+        
+    def show_progress(self, snapshot):
+        self.progress["value"] = snapshot.progress
+        self.speed_var.set(f"已保存 {snapshot.frames_done} 帧  {snapshot.fps:.1f} 帧/秒  "
+                           f"已用 {format_duration(snapshot.elapsed)}  预计剩余 {format_duration(snapshot.eta)}")
+        
+    def finish_processing(self, total_frames, processed_videos, cancelled):
+        self.worker = None
+        self.start_button.config(state=tk.NORMAL)
+        self.pause_button.config(state=tk.DISABLED, text="暂停")
+        self.cancel_button.config(state=tk.DISABLED)
+        self.progress_var.set("已取消" if cancelled else "处理完成!")
+        self.log(f"\n{'已取消' if cancelled else '批量处理完成!'}")
+        self.log(f"处理的视频数量: {processed_videos}")
+        self.log(f"总共保存的帧数: {total_frames}")
 
 if __name__ == "__main__":
     app = VideoFrameExtractor()
@@ -5,6 +5,19 @@ from typing import Optional
 from playwright.async_api import Page, async_playwright, Browser, Playwright
 import os
 import shutil
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from extractor.discovery import discover
+from extractor.metrics import METRICS, export_from_env
+from hailuo_jobs import STATUS_GENERATED, STATUS_SUBMITTED, JobStore
+
+# 各阶段耗时记录在 hailuo_stage_seconds{stage=...} 中
+STAGE_METRIC = 'hailuo_stage_seconds'
+
+# 会被提交的图片扩展名（不区分大小写）
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
 
 # 常量配置
 CONFIG = {
@@ -16,17 +29,133 @@ CONFIG = {
     },
     'WAITS': {
         'INTERVAL': 2,
-        'IMAGE_UPLOAD': 15
-    }
+        'IMAGE_UPLOAD': 15,
+        # 提交失败后第一次重试前等待的秒数，之后每次翻倍
+        'RETRY': 10,
+        'MAX_RETRY': 300
+    },
+    # 远端队列同时处理的视频数上限
+    'QUEUE_SLOTS': 3,
+    # 图片上传接口（POST 请求的 URL 片段）和上传完成后出现的预览图。这两项按 hailuo_mock.py 编写，
+    # 还没有在真实页面上确认：接口对不上时等满 upload_timeout（和原来固定等待 IMAGE_UPLOAD 秒相同），
+    # 预览图一直不出现时退回原来的固定等待 INTERVAL 秒
+    'UPLOAD_API': 'upload',
+    'UPLOAD_PREVIEW': 'img.upload-preview',
+    'UPLOAD_LOADING': 'img[alt="hai luo ai video light loading"]',
+    # 显示剩余额度的元素，额度不超过 MIN_QUOTA 时不再提交
+    'QUOTA_SELECTOR': 'span.select-none.font-light',
+    'MIN_QUOTA': 30,
+    # 页面状态（额度、队列）缓存的有效秒数；这些接口的响应会让缓存立即失效
+    'STATE_TTL': 1.0,
+    'STATE_APIS': ('generate/video',)
 }
 
+# 页面上正在排队或生成中的视频数，一次 evaluate 完成，不用三次 query_selector_all
+QUEUE_COUNT_JS = """() => ['Video generation is in progress', 'expected to wait for', 'Queuing']
+    .reduce((total, text) => total + document.evaluate(
+        `count(//*[contains(text(),"${text}")])`, document, null, XPathResult.NUMBER_TYPE, null
+    ).numberValue, 0)"""
+
+# 额度和队列计数一次读取，额度元素还没有出现时 quota 为 null
+PAGE_STATE_JS = f"""selector => {{
+    const quota = document.querySelector(selector);
+    return {{quota: quota ? quota.textContent.trim() : null, queue: ({QUEUE_COUNT_JS})()}};
+}}"""
+
+class AdaptiveTimeout:
+    """
+    根据观测到的耗时调整超时时间
+
+    还没有样本时使用 initial；之后取最近 samples 次耗时的最大值乘以 factor，
+    并限制在 [minimum, maximum] 之间。等待的事件一直没有出现（miss）时，每连续错过一次超时减半，
+    直到 minimum，避免每次都等满一个永远等不到的超时
+    """
+
+    def __init__(self, initial: float, minimum: float = 1.0, maximum: Optional[float] = None,
+                 factor: float = 2.0, samples: int = 20):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum if maximum is not None else initial * 4
+        self.factor = factor
+        self._samples = deque(maxlen=samples)
+        self.misses = 0
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self.misses = 0
+
+    def miss(self) -> None:
+        self.misses += 1
+
+    @property
+    def value(self) -> float:
+        value = self.initial if not self._samples else max(self._samples) * self.factor
+        value = min(self.maximum, max(self.minimum, value))
+        return max(self.minimum, value / 2 ** self.misses)
+
+
+@dataclass
+class GenerationResult:
+    """
+    一次 generate_video 的结果
+
+    status: 'submitted' 已提交并拿到视频 id；'timeout' 没有等到生成接口的响应；
+            'rejected' 生成接口返回了错误；'no_quota' 额度不足；'queue_full' 队列已满；
+            'skipped' 提示词为 NO_PROMPT；'invalid_image' 图片路径无效；'error' 提交过程中出现异常
+    latency: 从点击生成到收到响应的秒数
+    """
+
+    image_path: Optional[str]
+    status: str
+    video_id: Optional[str] = None
+    latency: Optional[float] = None
+
+    @property
+    def submitted(self) -> bool:
+        return self.status == 'submitted'
+
+
+class _Submission:
+    """一次等待生成接口响应的提交，按发出请求的顺序和请求对象对应起来"""
+
+    def __init__(self, image_path: Optional[str]):
+        self.image_path = image_path
+        self.future = asyncio.get_running_loop().create_future()
+        self.request = None
+        self.started = time.monotonic()
+
+
+@dataclass
+class PageState:
+    """页面状态快照：剩余额度（还没有显示时为 None）和队列中的视频数"""
+
+    quota: Optional[int]
+    queue: int
+    taken_at: float
+
+
 class HailuoClient:
     """海螺视频客户端"""
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.page = self.browser = self.playwright = None
+        # 最近一次提交得到的视频 id
         self.video_id = None
-        self.video_generated_event = asyncio.Event()
+        # 已点击生成、还没有发出请求的提交（按点击顺序）；以及已经发出请求、等待响应的提交
+        self._unsent_submissions = deque()
+        self._submissions_by_request = {}
+        # 由 new_page_client 创建的客户端共用浏览器连接，关闭时只关闭自己的页面
+        self._owns_browser = True
+        # 等待上传接口响应的 future，由网络监听按顺序完成
+        self._upload_waiters = deque()
+        self.upload_timeout = AdaptiveTimeout(CONFIG['WAITS']['IMAGE_UPLOAD'], minimum=5)
+        self.preview_timeout = AdaptiveTimeout(CONFIG['WAITS']['INTERVAL'] * 5, minimum=0.5)
+        self.submit_timeout = AdaptiveTimeout(CONFIG['TIMEOUTS']['VIDEO'], minimum=30, maximum=CONFIG['TIMEOUTS']['VIDEO'])
+        # 页面状态缓存，以及正在进行的读取（同时查询的调用方共用一次 evaluate）
+        self._state = None
+        self._state_task = None
+        self._last_quota = None
+        self.state_reads = 0
 
     async def initialize(self, browser_ws: str) -> None:
         """初始化浏览器连接"""
@@ -40,63 +169,156 @@ class HailuoClient:
             await self.close()
             raise Exception(f"初始化失败: {str(e)}")
 
+    @property
+    def connected(self) -> bool:
+        """页面和浏览器连接是否还可用"""
+        if self.page is None or self.page.is_closed():
+            return False
+        return self.browser is None or self.browser.is_connected()
+
+    async def new_page_client(self) -> 'HailuoClient':
+        """在同一个 CDP 连接上再打开一个页面，返回操作该页面的客户端"""
+        client = HailuoClient()
+        client._owns_browser = False
+        client.browser = self.browser
+        client.page = await self.browser.contexts[0].new_page()
+        await client._setup_network_listener()
+        return client
+
     async def _setup_network_listener(self):
         """设置网络监听"""
+        def on_request(request):
+            # 生成请求按点击顺序发出，把请求对象和最早的一次未发出的提交对应起来
+            if "generate/video" in request.url and request.method == 'POST':
+                while self._unsent_submissions:
+                    submission = self._unsent_submissions.popleft()
+                    if not submission.future.done():
+                        submission.request = request
+                        self._submissions_by_request[request] = submission
+                        break
+
         async def on_response(response):
             try:
+                if any(api in response.url for api in CONFIG['STATE_APIS']):
+                    self.invalidate_state()
+                if CONFIG['UPLOAD_API'] in response.url and response.request.method == 'POST':
+                    while self._upload_waiters:
+                        waiter = self._upload_waiters.popleft()
+                        if not waiter.done():
+                            waiter.set_result(response.status)
+                            break
                 if "generate/video" in response.url:
-                    data = await response.json()
-                    if video_id := data.get('data', {}).get('id'):
-                        self.video_id = video_id
-                        self.video_generated_event.set()
+                    # 只交给发出这个请求的那次提交；已经超时放弃的提交的迟到响应直接丢弃
+                    submission = self._submissions_by_request.pop(response.request, None)
+                    if submission is None or submission.future.done():
+                        return
+                    try:
+                        data = await response.json()
+                    except Exception:
+                        data = {}
+                    if not submission.future.done():
+                        submission.future.set_result((data.get('data') or {}).get('id'))
             except Exception:
                 pass
+        self.page.on("request", on_request)
         self.page.on("response", on_response)
         
+    def invalidate_state(self) -> None:
+        """丢弃缓存的页面状态，下次查询重新读取"""
+        self._state = None
+        # 失效前开始的读取结果可能已经过时，之后的查询不再共用它
+        self._state_task = None
+
+    async def _read_state(self) -> PageState:
+        self.state_reads += 1
+        METRICS.inc('hailuo_state_reads_total')
+        data = await self.page.evaluate(PAGE_STATE_JS, CONFIG['QUOTA_SELECTOR'])
+        try:
+            quota = int(data['quota'])
+        except (TypeError, ValueError):
+            quota = None
+        return PageState(quota, int(data['queue']), time.monotonic())
+
+    async def page_state(self, max_age: Optional[float] = None) -> PageState:
+        """
+        返回额度和队列的快照
+
+        一次 page.evaluate 同时读取两者；max_age 秒（默认 STATE_TTL）内的快照直接复用，
+        生成接口的响应会让快照失效。同时查询的调用方共用同一次读取。
+        """
+        max_age = CONFIG['STATE_TTL'] if max_age is None else max_age
+        state = self._state
+        if state is not None and time.monotonic() - state.taken_at <= max_age:
+            return state
+        if self._state_task is None or self._state_task.done():
+            self._state_task = asyncio.ensure_future(self._read_state())
+        task = self._state_task
+        state = await asyncio.shield(task)
+        if task is self._state_task:
+            self._state = state
+        return state
+
     async def check_quota(self) -> bool:
         """检查额度是否足够"""
         try:
-            # 查找特定元素
-            element_40 = await self.page.wait_for_selector('span.select-none.font-light')
-            if element_40:
-                content = await element_40.text_content()
-                # 输出调试信息
-                print(f"Quota content: {content}")
-                return int(content) > 30  # 返回True表示额度足够
+            state = await self.page_state()
+            if state.quota is None:
+                # 页面还没有显示额度，等待元素出现后重新读取
+                await self.page.wait_for_selector(CONFIG['QUOTA_SELECTOR'])
+                state = await self.page_state(max_age=0)
+            if state.quota != self._last_quota:
+                # 额度变化时才输出，避免频繁查询刷屏
+                print(f"Quota content: {state.quota}")
+                self._last_quota = state.quota
+            return state.quota is not None and state.quota > CONFIG['MIN_QUOTA']  # 返回True表示额度足够
         except Exception as e:
             # 输出异常信息
             print(f"Error checking quota: {e}")
         return False  # 默认返回False表示额度不足
 
+    async def queue_count(self) -> int:
+        """远端队列中正在排队或生成的视频数"""
+        try:
+            # 包含“Video generation is in progress”或“expected to wait for” 或“Queuing”文本的元素个数
+            return (await self.page_state()).queue
+        except Exception:
+            return 0
+
     async def check_queue_status(self) -> bool:
         """检查队列状态"""
+        return await self.queue_count() < CONFIG['QUEUE_SLOTS']
+
+    async def wait_for_queue_below(self, limit: int, timeout: float = CONFIG['TIMEOUTS']['VIDEO']) -> bool:
+        """
+        等待队列中的视频数小于 limit
+
+        由页面内的 requestAnimationFrame 检查 DOM，不需要每隔几秒通过 CDP 轮询一次；超时返回 False
+        """
         try:
-            # 查找包含“Video generation is in progress”或“expected to wait for” 或“Queuing”文本的元素
-            elements_video = await self.page.query_selector_all('//*[contains(text(),"Video generation is in progress")]')
-            elements_wait = await self.page.query_selector_all('//*[contains(text(),"expected to wait for")]')
-            elements_queuing = await self.page.query_selector_all('//*[contains(text(),"Queuing")]')
-            
-            # 获取出现次数
-            count_video = len(elements_video)
-            count_wait = len(elements_wait)
-            count_queuing = len(elements_queuing)
-            
-            # 判断出现次数是否等于3
-            return (count_video + count_wait+count_queuing) < 3
-        except Exception:
+            await self.page.wait_for_function(f"limit => ({QUEUE_COUNT_JS})() < limit", arg=limit,
+                                              polling='raf', timeout=timeout * 1000)
+            # 队列已经变化，缓存的快照不能再用
+            self.invalidate_state()
             return True
+        except Exception:
+            return False
+
+    async def generate_video(self, prompt: str, image_path: Optional[str] = None,
+                             on_click=None) -> GenerationResult:
+        """
+        生成视频，返回 GenerationResult（图片对应的视频 id 和响应耗时）
 
-    async def generate_video(self, prompt: str, image_path: Optional[str] = None) -> None:
-        """生成视频"""
+        on_click: 点击生成按钮之前的回调，之后中断就无法确定是否已经提交
+        """
 
         if prompt == 'NO_PROMPT':
-            return
+            return GenerationResult(image_path, 'skipped')
 
         if not await self.check_quota():
-            return
+            return GenerationResult(image_path, 'no_quota')
 
         if not await self.check_queue_status():
-            return
+            return GenerationResult(image_path, 'queue_full')
 
         # 输入提示词和上传图片
         await (await self.page.wait_for_selector('textarea.ant-input.css-o72qen')).fill(prompt)
@@ -105,47 +327,90 @@ class HailuoClient:
                 await self._upload_image(image_path)
             else:
                 self.logger.error(f"无效的图片路径: {image_path}")
-                return
+                return GenerationResult(image_path, 'invalid_image')
 
         # 等待图片上传完成
         await self.wait_for_image_upload_to_complete()
 
-        # 点击生成按钮
-        await (await self.page.wait_for_selector('div.create-btn-container div.create-btn')).click()
-
-        # 等待视频生成事件完成
+        # 点击生成按钮，点击前登记这次提交，网络监听据此对应请求和响应
+        submission = _Submission(image_path)
+        self._unsent_submissions.append(submission)
         try:
-            await asyncio.wait_for(self.video_generated_event.wait(), timeout=CONFIG['TIMEOUTS']['VIDEO'])
-            self.video_generated_event.clear()  # 清除事件以便下次使用
+            # 先找到按钮再登记点击：按钮没有出现（选择器超时）时什么都没有提交，任务还可以重试
+            button = await self.page.wait_for_selector('div.create-btn-container div.create-btn')
+            if on_click is not None:
+                on_click()
+            await button.click()
+
+            # 等待这次提交自己的响应
+            video_id = await asyncio.wait_for(asyncio.shield(submission.future), timeout=self.submit_timeout.value)
         except asyncio.TimeoutError:
-            self.logger.error("视频生成超时")
+            self.logger.error(f"视频生成超时: {image_path}")
+            return GenerationResult(image_path, 'timeout')
+        finally:
+            # 超时或出错时让迟到的响应找不到这次提交
+            if not submission.future.done():
+                submission.future.cancel()
+            self._submissions_by_request.pop(submission.request, None)
+
+        latency = time.monotonic() - submission.started
+        if not video_id:
+            self.logger.error(f"生成接口没有返回视频 id: {image_path}")
+            return GenerationResult(image_path, 'rejected', latency=latency)
+        self.submit_timeout.observe(latency)
+        METRICS.observe(STAGE_METRIC, latency, stage='generate')
+        self.video_id = video_id
+        return GenerationResult(image_path, 'submitted', video_id, latency)
 
     async def wait_for_image_upload_to_complete(self):
-        """等待图片上传完成"""
+        """等待图片上传完成：加载指示器消失，并且预览图已经出现"""
         try:
             # 等待加载指示器消失
-            await self.page.wait_for_selector('img[alt="hai luo ai video light loading"]', state='hidden', timeout=CONFIG['TIMEOUTS']['PAGE'])
-            
-            # 延迟2秒(避免出现图片没有上传到的情况)
-            await asyncio.sleep(2)
-            
+            await self.page.wait_for_selector(CONFIG['UPLOAD_LOADING'], state='hidden', timeout=CONFIG['TIMEOUTS']['PAGE'])
         except Exception as e:
             self.logger.error(f"等待图片上传完成时出错: {e}")
+            return
+
+        # 预览图出现说明页面已经拿到上传结果（避免出现图片没有上传到的情况）
+        started = time.monotonic()
+        try:
+            await self.page.wait_for_selector(CONFIG['UPLOAD_PREVIEW'], state='visible',
+                                              timeout=self.preview_timeout.value * 1000)
+        except Exception:
+            if not self.preview_timeout.misses:
+                self.logger.warning(f"没有等到上传预览图 {CONFIG['UPLOAD_PREVIEW']}，改为固定等待 "
+                                    f"{CONFIG['WAITS']['INTERVAL']} 秒")
+            self.preview_timeout.miss()
+            # 退回原来的固定等待，已经等过的时间计算在内
+            await asyncio.sleep(max(0.0, CONFIG['WAITS']['INTERVAL'] - (time.monotonic() - started)))
+            return
+        self.preview_timeout.observe(time.monotonic() - started)
+        METRICS.observe(STAGE_METRIC, time.monotonic() - started, stage='preview')
 
     async def _upload_image(self, image_path: str) -> None:
-        """上传图片"""
+        """上传图片，等到上传接口返回为止"""
         await (await self.page.wait_for_selector('div.relative.cursor-pointer.group')).click()
-        await asyncio.sleep(CONFIG['WAITS']['INTERVAL'])
 
         upload_btn = await self.page.wait_for_selector('div.ant-upload.ant-upload-select')
+        waiter = asyncio.get_running_loop().create_future()
+        self._upload_waiters.append(waiter)
+        started = time.monotonic()
         async with self.page.expect_file_chooser() as fc:
             await upload_btn.click()
             await (await fc.value).set_files(image_path)
-        await asyncio.sleep(CONFIG['WAITS']['IMAGE_UPLOAD'])
+        try:
+            status = await asyncio.wait_for(waiter, timeout=self.upload_timeout.value)
+            self.upload_timeout.observe(time.monotonic() - started)
+            METRICS.observe(STAGE_METRIC, time.monotonic() - started, stage='upload')
+            if status >= 400:
+                self.logger.error(f"图片上传失败，状态码 {status}: {image_path}")
+        except asyncio.TimeoutError:
+            self.logger.warning(f"{self.upload_timeout.value:.1f} 秒内没有等到上传接口响应: {image_path}")
 
     async def close(self) -> None:
         """关闭资源"""
-        for resource in [self.page, self.browser, self.playwright]:
+        resources = [self.page, self.browser, self.playwright] if self._owns_browser else [self.page]
+        for resource in resources:
             if resource:
                 try:
                     await resource.close()
@@ -153,48 +418,403 @@ class HailuoClient:
                     pass
         self.page = self.browser = self.playwright = None
 
-async def process_images_in_folder(ws_address: str, prompt: str, folder_path: str) -> None:
-    """处理文件夹内的所有图片生成视频"""
-    client = HailuoClient()
+class SubmissionScheduler:
+    """
+    保持远端队列满载的提交调度器
+
+    每个客户端（同一个 CDP 连接上的一个页面）是一个工作协程，多个页面同时上传图片；
+    提交前先在远端队列中预留名额，队列中的视频数加上正在提交的数量不超过 slots。
+    队列满时等待页面上的队列计数变小，而不是每隔几秒轮询一次。
+
+    任务状态保存在 store（JobStore）中，默认只保存在内存里；传入文件上的任务库时，
+    中断后重新运行会跳过已经提交的图片，失败的图片按指数退避重试。
+    account 为这些页面所属的账号，多个账号的调度器可以共用同一个任务库（见 AccountPool）。
+    """
+
+    def __init__(self, clients, prompt: str, slots: int = CONFIG['QUEUE_SLOTS'], processed_folder: Optional[str] = None,
+                 max_attempts: int = 2, store: Optional[JobStore] = None, account: Optional[str] = None):
+        self.clients = list(clients)
+        self.account = account
+        self.prompt = prompt
+        self.slots = slots
+        self.processed_folder = processed_folder
+        self.store = store or JobStore(max_attempts=max_attempts, retry_delay=CONFIG['WAITS']['RETRY'],
+                                       max_retry_delay=CONFIG['WAITS']['MAX_RETRY'])
+        self.logger = logging.getLogger(__name__)
+        self._capacity_lock = asyncio.Lock()
+        # 已经预留名额、但还没有出现在远端队列中的提交数
+        self._reserved = 0
+        self._released = asyncio.Event()
+        self._stopped = False
+        self.submitted = []
+        self.failed = []
+        # 每次成功提交的 GenerationResult（图片路径 → 视频 id、响应耗时）
+        self.results = []
+        self.started_at = None
+
+    async def _acquire_slot(self, client: HailuoClient) -> None:
+        """在远端队列中预留一个名额，队列满时等待"""
+        async with self._capacity_lock:
+            while True:
+                self._released.clear()
+                if self._reserved < self.slots and await client.queue_count() + self._reserved < self.slots:
+                    self._reserved += 1
+                    return
+                print("队列满了，等待中...")
+                # 远端队列有视频完成，或者其他页面的提交结束（成功的会出现在队列里，失败的让出名额）都要重新检查
+                waiters = [asyncio.ensure_future(self._released.wait())]
+                if self._reserved < self.slots:
+                    waiters.append(asyncio.ensure_future(client.wait_for_queue_below(self.slots - self._reserved)))
+                try:
+                    await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    for waiter in waiters:
+                        waiter.cancel()
+
+    def _release_slot(self) -> None:
+        self._reserved -= 1
+        self._released.set()
+
+    def _move_processed(self, image_path: str) -> None:
+        """移动已提交的图片到processed文件夹，子文件夹中的图片保持原来的子文件夹结构"""
+        if self.processed_folder and os.path.isfile(image_path):
+            relative = os.path.relpath(os.path.abspath(image_path),
+                                       os.path.dirname(os.path.abspath(self.processed_folder)))
+            if relative.startswith(os.pardir):
+                relative = os.path.basename(image_path)
+            target = os.path.join(self.processed_folder, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(image_path, target)
+
+    def _reroute(self, image_path: str) -> None:
+        """
+        浏览器断开时处理正在提交的图片
+
+        还没有点击生成的图片放回任务库（不计入重试次数），由其他页面或账号提交；已经点击的图片可能已经提交，
+        不能交给其他账号，标记为失败留给对账或 retry_failed()
+        """
+        job = self.store.get(image_path)
+        if job is not None and job['clicked_at'] is None:
+            self.store.release(image_path)
+            print(f"页面已断开，图片交给其他页面提交: {image_path}")
+            return
+        self.store.mark_failed(image_path, 'disconnected', retry=False)
+        self.failed.append(image_path)
+        print(f"页面在点击生成后断开，无法确定是否已经提交: {image_path}")
+
+    async def _worker(self, client: HailuoClient) -> None:
+        while not self._stopped:
+            if not client.connected:
+                print(f"页面已断开，停止使用{self.account and f'（{self.account}）' or ''}")
+                return
+            delay = self.store.next_retry_delay()
+            if delay is None:
+                if not self.store.in_flight():
+                    return
+                # 还有图片在其他页面上提交，失败时会退回任务库
+                await asyncio.sleep(CONFIG['WAITS']['INTERVAL'])
+                continue
+            if delay > 0:
+                # 剩下的任务都在等待重试
+                await asyncio.sleep(delay)
+                continue
+            if not await client.check_quota():
+                print("没有可用额度了，停止提交")
+                self._stopped = True
+                return
+            # 先在远端队列中预留名额再领取图片，多个账号时队列较空的账号先领到
+            with METRICS.timer(STAGE_METRIC, stage='queue_wait'):
+                await self._acquire_slot(client)
+            image_path = self.store.claim()
+            if image_path is None:
+                self._release_slot()
+                continue
+            try:
+                result = await client.generate_video(self.prompt, image_path,
+                                                     on_click=lambda: self.store.mark_clicked(image_path))
+            except Exception as e:
+                self.logger.error(f"提交图片失败: {image_path}: {e}")
+                result = GenerationResult(image_path, 'error')
+            finally:
+                self._release_slot()
+            METRICS.inc('hailuo_submissions_total', status=result.status)
+
+            if not result.submitted and not client.connected:
+                self._reroute(image_path)
+                continue
+
+            if result.submitted:
+                self.store.mark_submitted(image_path, result.video_id, result.latency, self.account)
+                self.submitted.append(image_path)
+                self.results.append(result)
+                print(f"已处理图片: {image_path} → 视频 {result.video_id}（{result.latency:.1f} 秒）")
+                self._move_processed(image_path)
+                continue
+
+            if result.status == 'queue_full':
+                # 还没有点击生成，不算一次失败：放回任务库，稍后再提交
+                self.store.release(image_path, delay=CONFIG['WAITS']['INTERVAL'])
+                continue
+
+            if result.status in ('no_quota', 'skipped'):
+                # 额度不足，或者提示词为 NO_PROMPT：图片没有提交，放回队列，所有页面都停止
+                if result.status == 'no_quota':
+                    print("没有可用额度了，停止提交")
+                self._stopped = True
+                self.store.release(image_path)
+                return
+
+            # 图片无效时重试也没有用；已经点击生成的任务不会重新提交，避免重复消耗额度
+            if not self.store.mark_failed(image_path, result.status, retry=result.status != 'invalid_image'):
+                self.failed.append(image_path)
+                print(f"图片提交失败: {image_path}")
+
+    def prepare(self, image_paths) -> None:
+        """登记图片，处理上次中断时进行中的任务"""
+        image_paths = list(image_paths)
+        self.store.add(image_paths)
+        requeued, interrupted = self.store.recover()
+        if requeued or interrupted:
+            print(f"上次中断的任务: {requeued} 个重新排队，{interrupted} 个无法确定是否已提交，标记为失败")
+        # 上次提交后还没来得及移动的图片
+        for image_path in image_paths:
+            job = self.store.get(image_path)
+            if job['status'] in (STATUS_SUBMITTED, STATUS_GENERATED):
+                self._move_processed(image_path)
+
+    async def submit_pending(self) -> dict:
+        """提交任务库中所有待提交的图片，返回统计信息"""
+        self.started_at = time.monotonic()
+        await asyncio.gather(*(self._worker(client) for client in self.clients))
+        return self.stats()
+
+    async def run(self, image_paths) -> dict:
+        """提交所有图片，返回统计信息；已经登记在任务库中的图片按记录的状态继续"""
+        self.prepare(image_paths)
+        return await self.submit_pending()
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            'submitted': len(self.submitted),
+            'failed': len(self.failed),
+            'elapsed': elapsed,
+            'images_per_hour': len(self.submitted) * 3600 / elapsed if elapsed > 0 else 0.0,
+            'results': [{'image': r.image_path, 'video_id': r.video_id, 'latency': r.latency}
+                        for r in self.results],
+            'jobs': self.store.counts(),
+        }
+
+
+class AccountPool:
+    """
+    多个账号（每个账号一个 CDP 端点）同时提交
+
+    每个账号有自己的额度和远端队列，各用一个 SubmissionScheduler；所有调度器从同一个任务库中领取图片，
+    只有队列有空位且额度足够的账号才会领取，因此图片按各账号的剩余额度和队列深度分配。
+    某个浏览器断开后，它正在提交、还没有点击生成的图片退回任务库，由其他账号继续提交；
+    已经点击生成的图片不会交给其他账号（可能已经提交过），标记为失败等待对账。
+
+    参数:
+        endpoints: CDP 地址列表，每个地址对应一个已经登录的浏览器（账号）
+        pages: 每个账号同时打开的页面数
+    """
+
+    def __init__(self, endpoints, prompt: str, pages: int = 1, base_url: Optional[str] = None,
+                 processed_folder: Optional[str] = None, store: Optional[JobStore] = None,
+                 slots: int = CONFIG['QUEUE_SLOTS']):
+        self.endpoints = list(endpoints)
+        self.prompt = prompt
+        self.pages = max(1, pages)
+        self.base_url = base_url or CONFIG['BASE_URL']
+        self.processed_folder = processed_folder
+        self.store = store or JobStore(retry_delay=CONFIG['WAITS']['RETRY'],
+                                       max_retry_delay=CONFIG['WAITS']['MAX_RETRY'])
+        self.slots = slots
+        self.logger = logging.getLogger(__name__)
+        # 已连接的账号: CDP 地址 -> 该账号的页面客户端列表
+        self.accounts = {}
+        self.schedulers = []
+        self.started_at = None
+
+    async def _connect(self, endpoint: str) -> list:
+        client = HailuoClient()
+        clients = [client]
+        try:
+            await client.initialize(endpoint)
+            for _ in range(self.pages - 1):
+                clients.append(await client.new_page_client())
+            # 打开网站
+            await asyncio.gather(*(c.page.goto(self.base_url, timeout=CONFIG['TIMEOUTS']['PAGE']) for c in clients))
+        except Exception:
+            for c in reversed(clients):
+                await c.close()
+            raise
+        return clients
+
+    async def start(self) -> None:
+        """连接所有账号，连接失败的账号跳过；一个都连不上时抛出异常"""
+        connected = await asyncio.gather(*(self._connect(endpoint) for endpoint in self.endpoints),
+                                         return_exceptions=True)
+        for endpoint, clients in zip(self.endpoints, connected):
+            if isinstance(clients, Exception):
+                self.logger.error(f"账号连接失败，跳过: {endpoint}: {clients}")
+                continue
+            self.accounts[endpoint] = clients
+            self.logger.info(f"已连接账号 {endpoint}，加载 {len(clients)} 个页面")
+        if not self.accounts:
+            raise Exception("没有可用的账号")
+
+    async def _ranked_accounts(self) -> list:
+        """按队列深度从浅到深、剩余额度从多到少排列账号，排在前面的先领取图片"""
+        async def probe(endpoint):
+            try:
+                state = await self.accounts[endpoint][0].page_state()
+                return state.queue, -(state.quota or 0)
+            except Exception:
+                return self.slots, 0
+
+        keys = await asyncio.gather(*(probe(endpoint) for endpoint in self.accounts))
+        ranked = sorted(zip(keys, self.accounts), key=lambda item: item[0])
+        for (queue, quota), endpoint in ranked:
+            print(f"账号 {endpoint}: 额度 {-quota}，队列 {queue}/{self.slots}")
+        return [endpoint for _, endpoint in ranked]
+
+    async def run(self, image_paths) -> dict:
+        """所有账号一起提交图片，返回汇总的统计信息"""
+        self.schedulers = [SubmissionScheduler(self.accounts[endpoint], self.prompt, self.slots, self.processed_folder,
+                                               store=self.store, account=endpoint)
+                           for endpoint in await self._ranked_accounts()]
+        # 登记图片、恢复中断的任务只做一次，所有调度器共用任务库
+        self.schedulers[0].prepare(image_paths)
+        self.started_at = time.monotonic()
+        await asyncio.gather(*(scheduler.submit_pending() for scheduler in self.schedulers))
+        return self.stats()
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        accounts = {}
+        for scheduler in self.schedulers:
+            account_stats = scheduler.stats()
+            accounts[scheduler.account] = {key: account_stats[key]
+                                           for key in ('submitted', 'failed', 'images_per_hour')}
+        submitted = sum(len(scheduler.submitted) for scheduler in self.schedulers)
+        return {
+            'submitted': submitted,
+            'failed': sum(len(scheduler.failed) for scheduler in self.schedulers),
+            'elapsed': elapsed,
+            'images_per_hour': submitted * 3600 / elapsed if elapsed > 0 else 0.0,
+            'results': [{'image': r.image_path, 'video_id': r.video_id, 'latency': r.latency}
+                        for scheduler in self.schedulers for r in scheduler.results],
+            'jobs': self.store.counts(),
+            'accounts': accounts,
+        }
+
+    async def cookie_headers(self) -> dict:
+        """各账号的登录 Cookie，用于下载该账号生成的视频: CDP 地址 -> 请求头"""
+        headers = {}
+        for endpoint, clients in self.accounts.items():
+            try:
+                cookies = await clients[0].page.context.cookies(self.base_url)
+            except Exception:
+                cookies = []
+            headers[endpoint] = {'Cookie': '; '.join(f"{c['name']}={c['value']}" for c in cookies)} if cookies else {}
+        return headers
+
+    async def close(self) -> None:
+        for clients in self.accounts.values():
+            for client in reversed(clients):
+                await client.close()
+        self.accounts = {}
+
+
+async def _submit_and_download(pool, image_files, download_folder, frames_folder, extract, extract_options) -> dict:
+    """提交图片的同时下载已经生成完成的视频，返回合并后的统计信息"""
+    from hailuo_download import VideoDownloadStage
+
+    # 下载请求带上提交该视频的账号在浏览器中的登录状态
+    account_headers = await pool.cookie_headers()
+    stage = VideoDownloadStage(pool.store, pool.base_url, download_folder, frames_folder, extract, extract_options,
+                               headers=lambda job: account_headers.get(job['account'], {}),
+                               # 生成时间包括在远端队列中排队的时间
+                               generation_timeout=CONFIG['TIMEOUTS']['VIDEO'] * 4)
+    submissions_done = asyncio.Event()
+
+    async def submit():
+        try:
+            return await pool.run(image_files)
+        finally:
+            submissions_done.set()
+
+    stats, download_stats = await asyncio.gather(submit(), stage.run(submissions_done))
+    print(f"视频下载完成: 下载 {download_stats['downloaded']} 个，失败 {download_stats['download_failed']} 个，"
+          f"提取 {download_stats['frames_saved']} 帧")
+    stats.update(download_stats)
+    return stats
+
+
+def _output_globs(folder_path, *folders):
+    """位于 folder_path 内的输出目录对应的排除模式（相对路径）"""
+    globs = []
+    for folder in folders:
+        if not folder:
+            continue
+        relative = os.path.relpath(os.path.abspath(folder), os.path.abspath(folder_path))
+        if relative != os.curdir and not relative.startswith(os.pardir):
+            globs.append(relative.replace(os.sep, '/'))
+    return globs
+
+async def process_images_in_folder(ws_address, prompt: str, folder_path: str, pages: int = 1,
+                                   base_url: Optional[str] = None, download_folder: Optional[str] = None,
+                                   frames_folder: Optional[str] = None, extract: str = 'frames',
+                                   extract_options: Optional[dict] = None) -> dict:
+    """
+    处理文件夹内的所有图片生成视频
+
+    ws_address 为一个 CDP 地址，或者多个账号的 CDP 地址列表（见 AccountPool）。
+    pages 为每个账号同时打开的页面数，多个页面并发上传；base_url 默认为海螺网站，测试时可以指向本地模拟服务。
+    任务状态保存在文件夹下的任务库中，中断后重新运行不会重复提交已经提交过的图片。
+
+    指定 download_folder 时，边提交边等待视频生成完成并下载；再指定 frames_folder 时下载后直接提取帧，
+    extract 为 'frames'（固定间隔，extract_options 例如 {'interval': 6}）或 'keyframes'。
+    """
+    endpoints = [ws_address] if isinstance(ws_address, str) else list(ws_address)
     processed_folder = os.path.join(folder_path, "processed")
+    store = JobStore.for_folder(folder_path, retry_delay=CONFIG['WAITS']['RETRY'],
+                                max_retry_delay=CONFIG['WAITS']['MAX_RETRY'])
+    pool = AccountPool(endpoints, prompt, pages, base_url, processed_folder, store)
+    stats = {}
     
     # 创建已处理图片的文件夹
     os.makedirs(processed_folder, exist_ok=True)
     
     try:
-        await client.initialize(ws_address)
-        
-        # 打开网站
-        await client.page.goto(CONFIG['BASE_URL'], timeout=CONFIG['TIMEOUTS']['PAGE'])
-        client.logger.info("页面已加载")
-        await asyncio.sleep(CONFIG['WAITS']['INTERVAL'])
+        await pool.start()
         
-        # 获取文件夹内的所有图片
-        image_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith(('.png', '.jpg', '.jpeg'))]
+        # 获取文件夹（包括子文件夹）内的所有图片，跳过已处理的图片和放在文件夹内的输出目录
+        image_files = [found.path for found in discover(folder_path, IMAGE_EXTENSIONS,
+                                                        exclude=_output_globs(folder_path, processed_folder,
+                                                                              download_folder, frames_folder),
+                                                        sort='name', window=None)]
         
-        for image_path in image_files:
-            # 检查可用额度
-            if not await client.check_quota():
-                print("没有可用额度了，退出循环")
-                break
-            
-            # 检查队列状态
-            while not await client.check_queue_status():
-                print("队列满了，等待中...")
-                await asyncio.sleep(CONFIG['WAITS']['INTERVAL'])
-            
-            # 生成视频
-            await client.generate_video(prompt, image_path)
-            print(f"已处理图片: {image_path}")
-            
-            # 移动已处理的图片到processed文件夹
-            shutil.move(image_path, processed_folder)
+        if download_folder:
+            stats = await _submit_and_download(pool, image_files, download_folder, frames_folder, extract,
+                                               extract_options)
+        else:
+            stats = await pool.run(image_files)
         
-        print("所有图片处理完成")
+        print(f"所有图片处理完成: 提交 {stats['submitted']} 张，失败 {stats['failed']} 张，"
+              f"约 {stats['images_per_hour']:.0f} 张/小时")
+        if len(stats['accounts']) > 1:
+            for account, account_stats in stats['accounts'].items():
+                print(f"  {account}: 提交 {account_stats['submitted']} 张，失败 {account_stats['failed']} 张")
     except Exception as e:
         logging.error(f"处理失败: {e}")
     finally:
-        await client.close()
+        await pool.close()
+        store.close()
+        export_from_env()
+    return stats
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
@@ -0,0 +1,396 @@
+"""
+生成视频的下载和后处理
+
+提交成功的任务（JobStore 中状态为 submitted）由 VideoDownloadStage 轮询生成状态，生成完成后
+通过复用的 HTTP 连接下载 MP4（中断后按 Range 续传），校验大小、MD5 和能否解码，
+再直接交给帧提取引擎（固定间隔取帧或 ffmpeg 关键帧），最后把任务标记为 generated。
+
+状态接口（路径模板 status_path，相对于 base_url）返回:
+    {"data": {"id", "status": "processing" / "finished" / "failed", "url", "size", "md5"}}
+这个接口只在 hailuo_mock.py 中实现过，还没有在真实网站上确认；接口不存在（连续返回 4xx）或者
+超过 generation_timeout 仍未生成完成时，任务记为下载失败，保持 submitted 状态留到下次运行。
+"""
+import asyncio
+import hashlib
+import http.client
+import json
+import os
+import threading
+import time
+from typing import Optional
+from urllib.parse import urljoin, urlsplit
+
+import cv2
+
+from extractor.engine import extract_video
+from extractor.metrics import METRICS
+from extractor.naming import alnum_folder_name
+from hailuo_jobs import STATUS_SUBMITTED
+
+# 未在真实网站上确认的状态接口（见模块说明）
+STATUS_PATH = 'api/video/{video_id}'
+FINISHED_STATUSES = ('finished', 'success')
+FAILED_STATUSES = ('failed', 'error')
+
+# 从开始等待到生成完成的最长秒数
+GENERATION_TIMEOUT = 1200
+# 状态接口连续返回这么多次 4xx 后不再查询
+MAX_CLIENT_ERRORS = 3
+
+# 每次从响应中读取的字节数
+CHUNK_SIZE = 1 << 20
+
+# 复用的连接断开后重试一次；下载中途断开按已下载的字节数续传
+RETRYABLE_ERRORS = (http.client.HTTPException, ConnectionError, TimeoutError, OSError)
+
+
+class DownloadError(Exception):
+    """下载失败或校验不通过，status 为 HTTP 状态码（没有收到响应时为 None）"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class ConnectionPool:
+    """
+    按 (协议, 主机, 端口) 复用 HTTP keep-alive 连接，可以在多个线程中使用
+
+    max_per_host: 每个主机最多保留的空闲连接数
+    """
+
+    def __init__(self, max_per_host=4, timeout=30):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _new_connection(self, key):
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout)
+
+    def _get(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._new_connection(key), False
+
+    def _put(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method, url, headers=None):
+        """
+        发送请求，返回 (响应, 归还连接的函数)
+
+        读完响应后调用 release() 把连接放回池中；响应没有读完整时调用 release(False) 关闭连接
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        conn, reused = self._get(key)
+        try:
+            conn.request(method, path or '/', headers=headers or {})
+            response = conn.getresponse()
+        except RETRYABLE_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            # 空闲连接可能已经被服务器关闭，换一个新连接重试
+            conn = self._new_connection(key)
+            conn.request(method, path or '/', headers=headers or {})
+            response = conn.getresponse()
+
+        def release(reuse=True):
+            if not reuse or response.will_close:
+                conn.close()
+            else:
+                self._put(key, conn)
+        return response, release
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for conn in idle:
+                    conn.close()
+            self._idle.clear()
+
+
+def fetch_json(pool, url, headers=None):
+    """GET 一个 JSON 接口"""
+    response, release = pool.request('GET', url, headers)
+    try:
+        body = response.read()
+    except RETRYABLE_ERRORS:
+        release(False)
+        raise
+    release()
+    if response.status != 200:
+        raise DownloadError(f"{url} 返回 {response.status}", response.status)
+    return json.loads(body or b'{}')
+
+
+def _total_size(response, offset):
+    """从 Content-Range 或 Content-Length 得到文件总大小，未知时返回 None"""
+    content_range = response.getheader('Content-Range')
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+    length = response.getheader('Content-Length')
+    return offset + int(length) if length and length.isdigit() else None
+
+
+def download_file(pool, url, path, headers=None, expected_size=None, expected_md5=None, attempts=3,
+                  chunk_size=CHUNK_SIZE):
+    """
+    下载文件到 path，返回文件大小
+
+    先写到 path + '.part'，已经存在时用 Range 请求从断点继续；下载中途断开会从当前位置续传，
+    最多尝试 attempts 次。大小或 MD5 不匹配时删除临时文件并抛出 DownloadError。
+    """
+    part_path = path + '.part'
+    total = expected_size
+    for attempt in range(1, attempts + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if total is not None and offset >= total:
+            break
+        request_headers = dict(headers or {})
+        if offset:
+            request_headers['Range'] = f'bytes={offset}-'
+        try:
+            response, release = pool.request('GET', url, request_headers)
+        except RETRYABLE_ERRORS as e:
+            if attempt == attempts:
+                raise DownloadError(f"下载失败: {url}: {e}") from e
+            continue
+
+        if response.status == 416:
+            # 临时文件已经完整（或比服务器上的文件还大），按总大小决定保留还是重新下载
+            total = _total_size(response, 0) or total
+            response.read()
+            release()
+            if total is not None and offset == total:
+                break
+            os.remove(part_path)
+            continue
+        if response.status not in (200, 206):
+            response.read()
+            release()
+            raise DownloadError(f"{url} 返回 {response.status}")
+        if response.status == 200:
+            # 服务器不支持 Range，从头下载
+            offset = 0
+        total = _total_size(response, offset) or total
+
+        try:
+            with open(part_path, 'r+b' if offset else 'wb') as f:
+                f.seek(offset)
+                f.truncate()
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+        except RETRYABLE_ERRORS as e:
+            release(False)
+            print(f"[!] 下载中断，从断点继续: {e}")
+            if attempt == attempts:
+                raise DownloadError(f"下载失败: {url}: {e}") from e
+            continue
+        if total is None or os.path.getsize(part_path) >= total:
+            release()
+            break
+        # 连接提前关闭，数据不完整
+        release(False)
+        print(f"[!] 下载中断，从断点继续: {os.path.getsize(part_path)}/{total} 字节")
+    else:
+        raise DownloadError(f"下载失败: {url}")
+
+    size = os.path.getsize(part_path)
+    if total is not None and size != total:
+        os.remove(part_path)
+        raise DownloadError(f"文件大小不匹配: {size} != {total}")
+    if expected_md5:
+        digest = hashlib.md5()
+        with open(part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        if digest.hexdigest() != expected_md5.lower():
+            os.remove(part_path)
+            raise DownloadError(f"MD5 不匹配: {url}")
+    os.replace(part_path, path)
+    return size
+
+
+def verify_video(path):
+    """能打开并解码出第一帧才算有效视频"""
+    cap = cv2.VideoCapture(path)
+    try:
+        return cap.isOpened() and cap.read()[0]
+    finally:
+        cap.release()
+
+
+def extract_keyframes_video(video_path, output_dir, **options):
+    """ffmpeg 关键帧提取，返回保存的帧数"""
+    # extract_keyframes 是同目录下的脚本，只在需要时导入
+    from extract_keyframes import extract_keyframes
+    return extract_keyframes(video_path, output_dir, **options)
+
+
+# 下载后的处理方式: 名称 -> 函数(视频路径, 输出目录, **选项)，返回保存的帧数
+EXTRACTORS = {
+    'frames': extract_video,
+    'keyframes': extract_keyframes_video,
+}
+
+
+class VideoDownloadStage:
+    """
+    等待已提交的视频生成完成，下载并提取帧
+
+    参数:
+        store: JobStore，处理状态为 submitted 的任务，完成后标记为 generated
+        base_url: 状态接口和相对下载地址的基础地址
+        download_folder: 视频保存目录，文件名为 视频id.mp4
+        frames_folder: 帧输出基础目录，每个视频一个子目录；为 None 时只下载不提取
+        extract: 'frames'（固定间隔取帧）/ 'keyframes'（ffmpeg 关键帧）
+        extract_options: 传给提取函数的参数，例如 {'interval': 6}
+        headers: 请求附带的头（例如登录后的 Cookie）；也可以是函数 headers(任务记录)，多个账号时按提交的账号返回
+        workers: 同时下载/提取的视频数
+        poll_interval: 轮询生成状态的间隔秒数
+        generation_timeout: 每个视频最多等待生成多少秒
+    """
+
+    def __init__(self, store, base_url, download_folder, frames_folder=None, extract='frames',
+                 extract_options=None, headers=None, workers=2, poll_interval=5.0, status_path=STATUS_PATH,
+                 pool=None, generation_timeout=GENERATION_TIMEOUT):
+        self.store = store
+        self.base_url = base_url
+        self.download_folder = download_folder
+        self.frames_folder = frames_folder
+        self.extract = EXTRACTORS[extract]
+        self.extract_options = extract_options or {}
+        self.headers = headers or {}
+        self.poll_interval = poll_interval
+        self.generation_timeout = generation_timeout
+        self.status_path = status_path
+        self.pool = pool or ConnectionPool(max_per_host=max(2, workers))
+        self._semaphore = asyncio.Semaphore(workers)
+        self._tasks = {}
+        self.downloaded = []
+        self.failed = []
+        self.frames_saved = 0
+
+    def _status_url(self, video_id):
+        return urljoin(self.base_url, self.status_path.format(video_id=video_id))
+
+    def _headers_for(self, job):
+        return self.headers(job) if callable(self.headers) else self.headers
+
+    async def _wait_until_generated(self, video_id, headers) -> Optional[dict]:
+        """
+        轮询生成状态，完成时返回状态数据，生成失败返回 None
+
+        超过 generation_timeout 或者状态接口连续 MAX_CLIENT_ERRORS 次返回 4xx 时抛出 DownloadError
+        """
+        deadline = time.monotonic() + self.generation_timeout
+        client_errors = 0
+        while True:
+            try:
+                data = (await asyncio.to_thread(fetch_json, self.pool, self._status_url(video_id),
+                                                headers)).get('data') or {}
+                client_errors = 0
+            except (DownloadError, ValueError, *RETRYABLE_ERRORS) as e:
+                print(f"[!] 查询视频状态失败: {video_id}: {e}")
+                data = {}
+                status_code = getattr(e, 'status', None)
+                client_errors = client_errors + 1 if status_code and 400 <= status_code < 500 else 0
+                if client_errors >= MAX_CLIENT_ERRORS:
+                    raise DownloadError(f"状态接口连续 {client_errors} 次返回 {status_code}，停止查询: {video_id}")
+            status = data.get('status')
+            if status in FINISHED_STATUSES and data.get('url'):
+                return data
+            if status in FAILED_STATUSES:
+                return None
+            if time.monotonic() + self.poll_interval > deadline:
+                raise DownloadError(f"{self.generation_timeout:.0f} 秒内没有生成完成: {video_id}")
+            await asyncio.sleep(self.poll_interval)
+
+    def _download_and_extract(self, video_id, info, headers):
+        """在线程中下载、校验、提取，返回保存的帧数"""
+        os.makedirs(self.download_folder, exist_ok=True)
+        video_path = os.path.join(self.download_folder, f'{video_id}.mp4')
+        if not os.path.exists(video_path):
+            with METRICS.timer('hailuo_stage_seconds', stage='download'):
+                size = download_file(self.pool, urljoin(self.base_url, info['url']), video_path, headers,
+                                     expected_size=info.get('size'), expected_md5=info.get('md5'))
+            METRICS.inc('hailuo_download_bytes_total', size)
+            print(f"[+] 已下载视频: {video_path}（{size / 2**20:.1f} MiB）")
+        if not verify_video(video_path):
+            os.remove(video_path)
+            raise DownloadError(f"无法解码下载的视频: {video_path}")
+        if self.frames_folder is None:
+            return 0
+        output_dir = os.path.join(self.frames_folder, alnum_folder_name(video_id))
+        return self.extract(video_path, output_dir, **self.extract_options)
+
+    async def _process(self, job) -> None:
+        video_id = job['video_id']
+        try:
+            headers = self._headers_for(job)
+            with METRICS.timer('hailuo_stage_seconds', stage='generation_wait'):
+                info = await self._wait_until_generated(video_id, headers)
+            if info is None:
+                print(f"❌ 视频生成失败: {video_id}")
+                self.store.mark_failed(job['image_path'], 'generation failed', retry=False)
+                self.failed.append(video_id)
+                return
+            async with self._semaphore:
+                frames = await asyncio.to_thread(self._download_and_extract, video_id, info, headers)
+        except (DownloadError, OSError) as e:
+            # 保留任务状态，下次运行时继续（.part 文件按 Range 续传）
+            print(f"❌ 处理视频失败: {video_id}: {e}")
+            self.failed.append(video_id)
+            return
+        self.store.mark_generated(video_id)
+        self.downloaded.append(video_id)
+        self.frames_saved += frames
+        print(f"✅ 视频 {video_id} 处理完成，保存 {frames} 帧")
+
+    def _start_new_jobs(self) -> None:
+        for job in self.store.jobs(STATUS_SUBMITTED):
+            if job['video_id'] and job['video_id'] not in self._tasks:
+                self._tasks[job['video_id']] = asyncio.ensure_future(self._process(job))
+
+    async def run(self, submissions_done: Optional[asyncio.Event] = None) -> dict:
+        """
+        处理所有已提交的任务，返回统计信息
+
+        submissions_done: 提交还在进行时，新提交的任务也会被处理，直到该事件被设置；为 None 时只处理当前已提交的任务
+        """
+        try:
+            while True:
+                self._start_new_jobs()
+                if submissions_done is None or submissions_done.is_set():
+                    # 提交已经结束，再取一次最后提交的任务后等待全部完成
+                    self._start_new_jobs()
+                    await asyncio.gather(*self._tasks.values())
+                    break
+                try:
+                    await asyncio.wait_for(submissions_done.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.pool.close()
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {'downloaded': len(self.downloaded), 'download_failed': len(self.failed),
+                'frames_saved': self.frames_saved}
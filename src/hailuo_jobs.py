@@ -0,0 +1,214 @@
+"""
+海螺提交任务的持久化队列
+
+每张图片是一个任务，状态保存在 SQLite 中，进程崩溃或中断后重新运行会接着处理：
+已经提交（拿到视频 id）的任务不会再次提交，避免重复消耗额度。
+
+状态:
+    pending    等待提交，失败重试的任务在 next_attempt_at 之后才会被取出
+    uploading  正在上传/提交；点击生成按钮之前会记录 clicked_at
+    submitted  已经提交并拿到视频 id
+    generated  视频已经生成（并下载）完成
+    failed     多次重试仍然失败，或者提交后中断、无法确定是否已经提交
+"""
+import os
+import sqlite3
+import time
+
+JOB_STORE_NAME = '.hailuo_jobs.sqlite3'
+
+STATUS_PENDING = 'pending'
+STATUS_UPLOADING = 'uploading'
+STATUS_SUBMITTED = 'submitted'
+STATUS_GENERATED = 'generated'
+STATUS_FAILED = 'failed'
+
+
+def job_store_path_for(folder_path):
+    """图片文件夹下的任务库路径"""
+    return os.path.join(folder_path, JOB_STORE_NAME)
+
+
+class JobStore:
+    """
+    以图片绝对路径为键的任务库
+
+    retry_delay / max_retry_delay: 失败后第 n 次重试前等待 retry_delay * 2 ** (n - 1) 秒，最多 max_retry_delay 秒
+    path 为 ':memory:' 时只保存在内存中（不需要断点续跑时使用）
+    """
+
+    def __init__(self, path=':memory:', max_attempts=2, retry_delay=10.0, max_retry_delay=300.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                image_path TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                video_id TEXT,
+                account TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                clicked_at REAL,
+                latency REAL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, next_attempt_at)')
+        self.conn.commit()
+
+    @classmethod
+    def for_folder(cls, folder_path, **options):
+        """打开图片文件夹下的任务库"""
+        return cls(job_store_path_for(folder_path), **options)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _update(self, image_path, **fields):
+        fields['updated_at'] = time.time()
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        with self.conn:
+            self.conn.execute(f'UPDATE jobs SET {columns} WHERE image_path = ?',
+                              (*fields.values(), os.path.abspath(image_path)))
+
+    def add(self, image_paths):
+        """登记新图片，已经登记过的图片保持原状态，返回新增的数量"""
+        now = time.time()
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO jobs (image_path, status, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                ((os.path.abspath(path), STATUS_PENDING, now, now) for path in image_paths))
+            return self.conn.total_changes - before
+
+    def recover(self):
+        """
+        处理上次中断时还在进行中的任务，返回 (重新排队数, 标记失败数)
+
+        还没有点击生成按钮的任务重新排队；已经点击、但没有记录视频 id 的任务无法确定是否已经提交，
+        标记为失败而不是重新提交，需要时用 retry_failed() 手动重试。
+        """
+        now = time.time()
+        with self.conn:
+            requeued = self.conn.execute(
+                'UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND clicked_at IS NULL',
+                (STATUS_PENDING, now, STATUS_UPLOADING)).rowcount
+            failed = self.conn.execute(
+                'UPDATE jobs SET status = ?, last_error = ?, updated_at = ? WHERE status = ?',
+                (STATUS_FAILED, '提交后中断，无法确定是否已经提交', now, STATUS_UPLOADING)).rowcount
+        return requeued, failed
+
+    def retry_failed(self):
+        """把失败的任务重新排队，重试次数清零，返回数量"""
+        with self.conn:
+            return self.conn.execute(
+                'UPDATE jobs SET status = ?, attempts = 0, next_attempt_at = 0, clicked_at = NULL, '
+                'last_error = NULL, updated_at = ? WHERE status = ?',
+                (STATUS_PENDING, time.time(), STATUS_FAILED)).rowcount
+
+    def claim(self):
+        """取出一个可以提交的任务并标记为 uploading，没有时返回 None"""
+        with self.conn:
+            row = self.conn.execute(
+                'SELECT image_path FROM jobs WHERE status = ? AND next_attempt_at <= ? '
+                'ORDER BY next_attempt_at, created_at LIMIT 1', (STATUS_PENDING, time.time())).fetchone()
+            if row is None:
+                return None
+            self.conn.execute('UPDATE jobs SET status = ?, clicked_at = NULL, updated_at = ? WHERE image_path = ?',
+                              (STATUS_UPLOADING, time.time(), row[0]))
+        return row[0]
+
+    def next_retry_delay(self):
+        """距离下一个等待重试的任务还有多少秒，没有待提交的任务时返回 None"""
+        row = self.conn.execute('SELECT MIN(next_attempt_at) FROM jobs WHERE status = ?',
+                                (STATUS_PENDING,)).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def in_flight(self):
+        """正在上传/提交的任务数"""
+        return self.conn.execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (STATUS_UPLOADING,)).fetchone()[0]
+
+    def release(self, image_path, delay=0.0):
+        """任务没有提交就放回队列（例如额度不足、队列已满），不计入重试次数，delay 秒后才会再被取出"""
+        self._update(image_path, status=STATUS_PENDING, clicked_at=None, next_attempt_at=time.time() + delay)
+
+    def mark_clicked(self, image_path):
+        """即将点击生成按钮，此后中断的任务不会自动重新提交"""
+        self._update(image_path, clicked_at=time.time())
+
+    def mark_submitted(self, image_path, video_id, latency=None, account=None):
+        """记录提交得到的视频 id 和提交的账号（下载时使用该账号的登录状态）"""
+        self._update(image_path, status=STATUS_SUBMITTED, video_id=video_id, latency=latency, account=account,
+                     last_error=None)
+
+    def mark_generated(self, video_id):
+        with self.conn:
+            self.conn.execute('UPDATE jobs SET status = ?, updated_at = ? WHERE video_id = ?',
+                              (STATUS_GENERATED, time.time(), video_id))
+
+    def mark_failed(self, image_path, error, retry=True):
+        """
+        记录一次失败，返回任务是否还会重试
+
+        retry 为 False 或者重试次数用完时标记为 failed，否则按指数退避重新排队。
+        已经点击生成按钮的任务（超时、出错、被拒绝）可能已经提交，和 recover() 一样标记为失败而不是重新提交，
+        需要时用 retry_failed() 手动重试。
+        """
+        source = os.path.abspath(image_path)
+        row = self.conn.execute('SELECT attempts, clicked_at FROM jobs WHERE image_path = ?', (source,)).fetchone()
+        attempts = (row[0] if row else 0) + 1
+        if row is not None and row[1] is not None:
+            self._update(image_path, status=STATUS_FAILED, attempts=attempts,
+                         last_error=f'{error}（已点击生成，无法确定是否已经提交）')
+            return False
+        if retry and attempts < self.max_attempts:
+            delay = min(self.max_retry_delay, self.retry_delay * 2 ** (attempts - 1))
+            self._update(image_path, status=STATUS_PENDING, attempts=attempts, next_attempt_at=time.time() + delay,
+                         clicked_at=None, last_error=error)
+            return True
+        self._update(image_path, status=STATUS_FAILED, attempts=attempts, last_error=error)
+        return False
+
+    def get(self, image_path):
+        """返回任务记录，未登记时返回 None"""
+        self.conn.row_factory = sqlite3.Row
+        try:
+            row = self.conn.execute('SELECT * FROM jobs WHERE image_path = ?',
+                                    (os.path.abspath(image_path),)).fetchone()
+        finally:
+            self.conn.row_factory = None
+        return dict(row) if row is not None else None
+
+    def jobs(self, status=None):
+        """列出任务记录，可以按状态过滤"""
+        self.conn.row_factory = sqlite3.Row
+        try:
+            if status is None:
+                rows = self.conn.execute('SELECT * FROM jobs ORDER BY created_at').fetchall()
+            else:
+                rows = self.conn.execute('SELECT * FROM jobs WHERE status = ? ORDER BY created_at',
+                                         (status,)).fetchall()
+        finally:
+            self.conn.row_factory = None
+        return [dict(row) for row in rows]
+
+    def counts(self):
+        """各状态的任务数"""
+        return dict(self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
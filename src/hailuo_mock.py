@@ -0,0 +1,427 @@
+"""
+海螺网站的本地模拟服务
+
+只实现 hailuo.py 用到的页面元素和接口，用来在不消耗真实额度的情况下测试提交流程、
+测量吞吐量（张/小时）。远端队列、上传耗时、生成耗时都可以配置。
+
+用法:
+    python hailuo_mock.py --port 8765                      # 只启动模拟服务
+    python hailuo_mock.py --bench 图片文件夹 --pages 3       # 启动模拟服务和本地 Chromium，跑一遍提交流程
+    python hailuo_mock.py --bench 图片文件夹 --accounts 3    # 启动 3 个 Chromium，模拟 3 个账号同时提交
+
+每个浏览器第一次打开页面时分配一个账号 Cookie，不同账号的额度和队列互相独立。
+
+接口:
+    GET  /                      模拟页面
+    GET  /api/state             {"quota": 剩余额度, "queue": [{"id", "status"}]}
+    POST /api/upload            上传图片，返回 {"data": {"url"}}
+    POST /api/generate/video    提交生成，返回 {"data": {"id"}}；队列已满或额度不足时返回 400
+    GET  /api/video/{id}        生成状态 {"data": {"id", "status", "url", "size", "md5"}}
+    GET  /videos/{id}.mp4       生成的视频，支持 Range 请求
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+PAGE_HTML = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Hailuo Mock</title>
+<style>
+  .hidden { display: none; }
+  .ant-upload { border: 1px dashed #999; padding: 20px; }
+  .create-btn { background: #333; color: #fff; padding: 8px; display: inline-block; cursor: pointer; }
+</style>
+</head>
+<body>
+  <div>Credits: <span class="select-none font-light" id="quota"></span></div>
+  <textarea class="ant-input css-o72qen" id="prompt"></textarea>
+  <div class="relative cursor-pointer group" id="open-upload">Image to video</div>
+  <div id="upload-panel" class="hidden">
+    <div class="ant-upload ant-upload-select" id="upload-btn">Upload</div>
+    <input type="file" id="file-input" accept="image/*" class="hidden">
+    <img alt="hai luo ai video light loading" id="loading" class="hidden">
+    <img class="upload-preview hidden" id="preview">
+  </div>
+  <div class="create-btn-container"><div class="create-btn" id="create">Create</div></div>
+  <div id="queue"></div>
+<script>
+  let uploadedUrl = null;
+  const $ = id => document.getElementById(id);
+
+  async function refresh() {
+    try {
+      const state = await (await fetch('/api/state')).json();
+      $('quota').textContent = state.quota;
+      $('queue').innerHTML = state.queue
+        .map(job => `<div class="queue-item" data-id="${job.id}">${job.status}</div>`).join('');
+    } catch (e) {}
+  }
+  setInterval(refresh, 500);
+  refresh();
+
+  $('open-upload').addEventListener('click', () => $('upload-panel').classList.remove('hidden'));
+  $('upload-btn').addEventListener('click', () => $('file-input').click());
+  $('file-input').addEventListener('change', async () => {
+    const file = $('file-input').files[0];
+    if (!file) return;
+    $('preview').classList.add('hidden');
+    $('loading').classList.remove('hidden');
+    const response = await fetch('/api/upload?name=' + encodeURIComponent(file.name), {method: 'POST', body: file});
+    const data = await response.json();
+    uploadedUrl = data.data.url;
+    $('loading').classList.add('hidden');
+    $('preview').src = uploadedUrl;
+    $('preview').classList.remove('hidden');
+  });
+  $('create').addEventListener('click', async () => {
+    await fetch('/api/generate/video', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify({prompt: $('prompt').value, image: uploadedUrl}),
+    });
+    uploadedUrl = null;
+    $('file-input').value = '';
+    $('preview').classList.add('hidden');
+    refresh();
+  });
+</script>
+</body>
+</html>
+"""
+
+
+class MockSite:
+    """
+    模拟网站的状态
+
+    参数:
+        quota: 初始额度，页面上显示的数字
+        cost: 每次生成消耗的额度
+        slots: 同时排队/生成的视频数上限
+        upload_seconds: 上传接口的响应耗时
+        generation_seconds: 每个视频从提交到生成完成的耗时，队列中的视频同时生成
+        video_file: 生成完成后提供下载的视频，默认生成一段 2 秒的合成视频
+        flaky_downloads: 每个视频第一次下载只发送一半内容就断开，用于测试断点续传
+    """
+
+    def __init__(self, quota=1000, cost=10, slots=3, upload_seconds=0.5, generation_seconds=10.0,
+                 video_file=None, flaky_downloads=False):
+        self.quota = quota
+        self.cost = cost
+        self.slots = slots
+        self.upload_seconds = upload_seconds
+        self.generation_seconds = generation_seconds
+        self.video_file = video_file
+        self.flaky_downloads = flaky_downloads
+        self.jobs = []
+        self.finished = []
+        self.downloads = {}
+        self.lock = threading.Lock()
+        self._video_bytes = None
+
+    def clone(self):
+        """同样配置的新账号，共用视频内容"""
+        site = MockSite(self.quota, self.cost, self.slots, self.upload_seconds, self.generation_seconds,
+                        self.video_file, self.flaky_downloads)
+        site._video_bytes = self._video_bytes
+        return site
+
+    def video_bytes(self):
+        """所有生成的视频共用同一段内容"""
+        with self.lock:
+            if self._video_bytes is None:
+                if self.video_file:
+                    with open(self.video_file, 'rb') as f:
+                        self._video_bytes = f.read()
+                else:
+                    self._video_bytes = synthetic_video()
+            return self._video_bytes
+
+    def video_info(self, video_id):
+        """生成状态，未知的视频 id 返回 None"""
+        with self.lock:
+            self._expire()
+            if any(job['id'] == video_id for job in self.jobs):
+                return {'id': video_id, 'status': 'processing'}
+            if not any(job['id'] == video_id for job in self.finished):
+                return None
+        data = self.video_bytes()
+        return {'id': video_id, 'status': 'finished', 'url': f'/videos/{video_id}.mp4', 'size': len(data),
+                'md5': hashlib.md5(data).hexdigest()}
+
+    def _expire(self):
+        """把已经生成完的视频移出队列，调用方持有锁"""
+        now = time.monotonic()
+        while self.jobs and now - self.jobs[0]['submitted'] >= self.generation_seconds:
+            job = self.jobs.pop(0)
+            job['finished'] = job['submitted'] + self.generation_seconds
+            self.finished.append(job)
+
+    def state(self):
+        with self.lock:
+            self._expire()
+            queue = [{'id': job['id'], 'status': 'Video generation is in progress'} for job in self.jobs]
+            return {'quota': self.quota, 'queue': queue}
+
+    def submit(self, prompt, image):
+        """提交一个生成任务，返回 (HTTP 状态码, 响应内容)"""
+        with self.lock:
+            self._expire()
+            if len(self.jobs) >= self.slots:
+                return 400, {'code': 1, 'message': 'queue is full'}
+            if self.quota < self.cost:
+                return 400, {'code': 2, 'message': 'insufficient credits'}
+            self.quota -= self.cost
+            job = {'id': uuid.uuid4().hex[:16], 'prompt': prompt, 'image': image, 'submitted': time.monotonic()}
+            self.jobs.append(job)
+            return 200, {'code': 0, 'data': {'id': job['id']}}
+
+
+def synthetic_video(seconds=2, fps=10, size=(160, 120)):
+    """用 OpenCV 生成一段合成视频，返回文件内容"""
+    fd, path = tempfile.mkstemp(suffix='.mp4')
+    os.close(fd)
+    try:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+        for index in range(seconds * fps):
+            frame = np.full((size[1], size[0], 3), (index * 12) % 256, dtype=np.uint8)
+            writer.write(frame)
+        writer.release()
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+ACCOUNT_COOKIE = 'mock_account'
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    # keep-alive，下载阶段会复用连接
+    protocol_version = 'HTTP/1.1'
+    # 默认账号；per_account 时每个账号 Cookie 对应 sites 中的一个 site.clone()
+    site = None
+    per_account = False
+    sites = None
+    sites_lock = None
+
+    def _account(self):
+        for part in (self.headers.get('Cookie') or '').split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == ACCOUNT_COOKIE:
+                return value
+        return None
+
+    @property
+    def account_site(self):
+        """当前请求所属账号的状态"""
+        account = self._account()
+        if not self.per_account or account is None:
+            return self.site
+        with self.sites_lock:
+            if account not in self.sites:
+                self.sites[account] = self.site.clone()
+            return self.sites[account]
+
+    def _find_video(self, video_id):
+        """在所有账号中查找视频的生成状态"""
+        with self.sites_lock:
+            sites = [self.site, *self.sites.values()]
+        for site in sites:
+            info = site.video_info(video_id)
+            if info is not None:
+                return site, info
+        return None, None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def do_GET(self):
+        if self.path == '/' or self.path.startswith('/?'):
+            body = PAGE_HTML.encode('utf-8')
+            self.send_response(200)
+            if self.per_account and self._account() is None:
+                self.send_header('Set-Cookie', f'{ACCOUNT_COOKIE}={uuid.uuid4().hex[:8]}; Path=/')
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == '/api/state':
+            self._send_json(200, self.account_site.state())
+        elif self.path.startswith('/uploads/'):
+            # 预览图不需要真实内容
+            self.send_response(204)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.path.startswith('/api/video/'):
+            _, info = self._find_video(self.path.rsplit('/', 1)[1])
+            if info is None:
+                self._send_json(404, {'message': 'not found'})
+            else:
+                self._send_json(200, {'code': 0, 'data': info})
+        elif self.path.startswith('/videos/') and self.path.endswith('.mp4'):
+            self._send_video(self.path[len('/videos/'):-len('.mp4')])
+        else:
+            self._send_json(404, {'message': 'not found'})
+
+    def _send_video(self, video_id):
+        site, info = self._find_video(video_id)
+        if info is None or info['status'] != 'finished':
+            self._send_json(404, {'message': 'not found'})
+            return
+        data = site.video_bytes()
+        start = 0
+        range_header = self.headers.get('Range')
+        if range_header and range_header.startswith('bytes='):
+            start = int(range_header[len('bytes='):].split('-')[0] or 0)
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(data)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(data) - 1}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(len(data) - start))
+        self.end_headers()
+
+        with site.lock:
+            count = site.downloads[video_id] = site.downloads.get(video_id, 0) + 1
+        if site.flaky_downloads and count == 1:
+            # 只发送一半就断开连接
+            self.wfile.write(data[start:start + (len(data) - start) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(data[start:])
+
+    def do_POST(self):
+        if self.path.startswith('/api/upload'):
+            self._read_body()
+            time.sleep(self.account_site.upload_seconds)
+            self._send_json(200, {'code': 0, 'data': {'url': f'/uploads/{uuid.uuid4().hex[:8]}.jpg'}})
+        elif self.path == '/api/generate/video':
+            try:
+                payload = json.loads(self._read_body() or b'{}')
+            except ValueError:
+                payload = {}
+            status, response = self.account_site.submit(payload.get('prompt'), payload.get('image'))
+            self._send_json(status, response)
+        else:
+            self._send_json(404, {'message': 'not found'})
+
+
+def start_mock_server(site=None, host='127.0.0.1', port=0, per_account=False):
+    """
+    在后台线程中启动模拟服务，返回 (server, 页面地址)
+
+    per_account 为 True 时每个浏览器（账号 Cookie）使用一份独立的 site.clone()，server.sites 为 账号 -> MockSite
+    """
+    site = site or MockSite()
+    sites = {}
+    handler = type('BoundMockHandler', (MockHandler,), {'site': site, 'per_account': per_account, 'sites': sites,
+                                                        'sites_lock': threading.Lock()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.site = site
+    server.sites = sites
+    thread = threading.Thread(target=server.serve_forever, name='hailuo-mock', daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_address[1]}/'
+
+
+async def run_bench(image_folder, pages=1, site=None, debug_port=9333, download_folder=None, frames_folder=None,
+                    accounts=1):
+    """
+    启动模拟服务和本地 Chromium，用 hailuo.process_images_in_folder 提交图片，返回统计信息
+
+    指定 download_folder / frames_folder 时同时测试下载和提取帧；accounts 为模拟的账号数，
+    每个账号一个 Chromium（调试端口从 debug_port 开始递增）
+    """
+    from playwright.async_api import async_playwright
+    from hailuo import process_images_in_folder
+
+    server, url = start_mock_server(site, per_account=accounts > 1)
+    # process_images_in_folder 会移动图片，先复制到临时目录
+    work_dir = tempfile.mkdtemp(prefix='hailuo_bench_')
+    for name in os.listdir(image_folder):
+        if name.endswith(('.png', '.jpg', '.jpeg')):
+            shutil.copy(os.path.join(image_folder, name), work_dir)
+    try:
+        async with async_playwright() as playwright:
+            ports = [debug_port + i for i in range(max(1, accounts))]
+            browsers = [await playwright.chromium.launch(args=[f'--remote-debugging-port={port}']) for port in ports]
+            try:
+                endpoints = [f'http://127.0.0.1:{port}' for port in ports]
+                return await process_images_in_folder(endpoints, 'mock prompt', work_dir,
+                                                      pages=pages, base_url=url, download_folder=download_folder,
+                                                      frames_folder=frames_folder)
+            finally:
+                for browser in browsers:
+                    await browser.close()
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='海螺网站本地模拟服务')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--quota', type=int, default=1000)
+    parser.add_argument('--cost', type=int, default=10)
+    parser.add_argument('--slots', type=int, default=3)
+    parser.add_argument('--upload-seconds', type=float, default=0.5)
+    parser.add_argument('--generation-seconds', type=float, default=10.0)
+    parser.add_argument('--bench', metavar='IMAGE_FOLDER', help='跑一遍提交流程并输出吞吐量')
+    parser.add_argument('--pages', type=int, default=1, help='--bench 时每个账号同时打开的页面数')
+    parser.add_argument('--accounts', type=int, default=1, help='--bench 时模拟的账号（浏览器）数')
+    parser.add_argument('--video-file', help='生成完成后提供下载的视频，默认使用合成视频')
+    parser.add_argument('--flaky-downloads', action='store_true', help='每个视频第一次下载中途断开')
+    parser.add_argument('--download', metavar='FOLDER', help='--bench 时下载生成的视频到该目录')
+    parser.add_argument('--frames', metavar='FOLDER', help='--bench 时从下载的视频中提取帧到该目录')
+    args = parser.parse_args()
+
+    site = MockSite(args.quota, args.cost, args.slots, args.upload_seconds, args.generation_seconds,
+                    args.video_file, args.flaky_downloads)
+    if args.bench:
+        stats = asyncio.run(run_bench(args.bench, args.pages, site, download_folder=args.download,
+                                      frames_folder=args.frames, accounts=args.accounts))
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+        return
+
+    server, url = start_mock_server(site, port=args.port)
+    print(f"[+] 模拟服务已启动: {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,14 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import ttk, filedialog, messagebox
 import sys
 import os
-import cv2
-from PIL import Image
+import multiprocessing
+import queue
+from extractor.engine import ExtractionJob, run_job, process_folder, plan_folder
+from extractor.naming import alnum_folder_name
+from extractor.progress import ProgressLine
+from extractor.batch import default_workers
+from extractor.worker import ExtractionWorker, format_duration
 
 # 设置控制台编码为 UTF-8
 if sys.platform.startswith('win'):
@@ -29,112 +34,43 @@ except (AttributeError, IOError):
 
 def sanitize_folder_name(name, max_length=20):
     """处理文件夹名称，只保留数字和字母"""
-    # 只保留字母数字字符
-    name = ''.join(c for c in name if c.isalnum())
-    return name[:max_length]
+    return alnum_folder_name(name, max_length)
 
-def extract_frames(video_path, output_dir, interval=6):
-    """从视频中每隔指定秒数提取一帧并保存"""
-    try:
-        os.makedirs(output_dir, exist_ok=True)
-        print(f"[+] 创建目录: {output_dir}")
-        
-        test_file = os.path.join(output_dir, 'test.txt')
-        try:
-            with open(test_file, 'w') as f:
-                f.write('test')
-            os.remove(test_file)
-            print("[+] 输出目录可写")
-        except Exception as e:
-            print(f"[!] 警告：输出目录可能没有写入权限: {str(e)}")
-            return 0
-            
-        # 打开视频文件
-        cap = cv2.VideoCapture(str(video_path))
-        
-        if not cap.isOpened():
-            print(f"❌ 错误：无法打开视频文件: {video_path}")
-            return 0
-        
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        print(f"📊 视频信息 - FPS: {fps}, 总帧数: {total_frames}")
-        
-        frame_interval = int(fps * interval)
-        print(f"⏱️ 每 {interval} 秒提取一帧（间隔 {frame_interval} 帧）")
-        
-        frame_count = 0
-        saved_count = 0
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            if frame_count % frame_interval == 0:
-                try:
-                    # 使用简单的文件名
-                    output_path = os.path.join(output_dir, f'frame_{saved_count:03d}.jpg')
-                    
-                    # 转换 BGR 到 RGB
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    
-                    # 使用 PIL 保存图片
-                    img = Image.fromarray(frame_rgb)
-                    img.save(output_path, quality=95)
-                    
-                    if os.path.exists(output_path):
-                        print(f'✅ 成功保存第 {saved_count} 帧')
-                        print(f"📊 文件大小: {os.path.getsize(output_path)} 字节")
-                    else:
-                        print(f'❌ 保存失败: {output_path}')
-                except Exception as e:
-                    print(f"保存图片时出错: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
-                    
-                saved_count += 1
-            frame_count += 1
-            
-    except Exception as e:
-        print(f"处理视频时出错: {str(e)}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        cap.release()
-        
-    return saved_count
-
-def process_videos_in_folder(input_folder, output_base_folder, interval=6.0, log_callback=print):
-    """处理指定文件夹中的所有视频文件"""
-    video_extensions = ['.mp4', '.avi', '.mov', '.mkv']
-    total_frames = 0
-    processed_videos = 0
+def extract_frames(video_path, output_dir, interval=6, **options):
+    """
+    从视频中每隔指定秒数提取一帧并保存，返回保存的帧数
     
-    for filename in os.listdir(input_folder):
-        if any(filename.lower().endswith(ext) for ext in video_extensions):
-            video_path = os.path.join(input_folder, filename)
-            
-            # 使用简化的文件夹名称
-            video_name = os.path.splitext(filename)[0]
-            safe_video_name = sanitize_folder_name(video_name)
-            output_dir = os.path.join(output_base_folder, safe_video_name)
-            
-            log_callback(f"\n处理视频: {filename}")
-            log_callback(f"输出目录: {output_dir}")
-            
-            # 传递间隔参数
-            frames_saved = extract_frames(video_path, output_dir, interval)
-            total_frames += frames_saved
-            processed_videos += 1
+    options 为 ExtractionJob 的其他字段（sampling、mode、decoder、encoder、quality、
+    manifest_path、scene、dedup 等），含义见 extractor.engine.ExtractionJob
+    """
+    job = ExtractionJob(video_path, output_dir, interval, **options)
+    # 不再每保存一帧打印一次，只输出限速的进度行；重复帧数量在结束时汇总输出
+    progress = ProgressLine(os.path.basename(video_path))
+    result = run_job(job, on_progress=progress.update)
+    progress.close()
+    print(f'✅ 保存 {result.saved} 帧，共 {result.bytes_written} 字节')
+    return result.saved
+
+def process_videos_in_folder(input_folder, output_base_folder, interval=6.0, workers=1, incremental=True, log_callback=print,
+                             mode='interval', scene=None, dedup=False, decoder='opencv', codec_threads=None):
+    """
+    处理指定文件夹中的所有视频文件
     
-    return total_frames, processed_videos
+    workers > 1 时按视频分发到多个进程并行处理；incremental 为 True 时
+    跳过内容和参数都没有变化的视频，并从上次中断的帧继续；mode/scene/decoder 同 ExtractionJob；
+    dedup 为 True 时使用输出基础目录中的去重索引，也可以直接传入 FrameDeduplicator；
+    codec_threads 为每个进程的解码线程数，None 表示按 CPU 预算分配，'auto' 表示在第一个视频上测速后选定
+    """
+    return process_folder(input_folder, output_base_folder, extract_frames, sanitize_folder_name, workers,
+                          incremental, log_callback, codec_threads,
+                          interval=interval, mode=mode, scene=scene, dedup=dedup, decoder=decoder)
 
 class VideoFrameExtractor:
     def __init__(self):
         self.window = tk.Tk()
         self.window.title("视频帧提取工具")
-        self.window.geometry("600x400")
+        self.window.geometry("600x520")
+        self.worker = None
         
         # 创建输入控件
         self.create_widgets()
@@ -162,8 +98,27 @@ class VideoFrameExtractor:
         self.interval.insert(0, "6.0")
         self.interval.pack()
         
-        # 处理按钮
-        tk.Button(self.window, text="开始处理", command=self.start_process).pack(pady=20)
+        # 同时处理的视频数
+        tk.Label(self.window, text="同时处理的视频数:").pack(pady=5)
+        self.workers = tk.Entry(self.window)
+        self.workers.insert(0, str(default_workers()))
+        self.workers.pack()
+        
+        # 开始 / 暂停 / 取消按钮
+        self.button_frame = tk.Frame(self.window)
+        self.button_frame.pack(pady=10)
+        self.start_button = tk.Button(self.button_frame, text="开始处理", command=self.start_process)
+        self.start_button.pack(side=tk.LEFT, padx=5)
+        self.pause_button = tk.Button(self.button_frame, text="暂停", command=self.toggle_pause, state=tk.DISABLED)
+        self.pause_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = tk.Button(self.button_frame, text="取消", command=self.cancel_process, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        
+        # 进度条和速度
+        self.progress = ttk.Progressbar(self.window, mode='determinate')
+        self.progress.pack(fill=tk.X, padx=20)
+        self.status = tk.Label(self.window, text="准备就绪")
+        self.status.pack(pady=5)
         
         # 日志显示
         self.log_text = tk.Text(self.window, height=10)
@@ -182,9 +137,9 @@ class VideoFrameExtractor:
             self.output_path.insert(0, folder)
             
     def log(self, message):
+        # 只在界面线程中调用，后台线程的日志经事件队列转过来
         self.log_text.insert(tk.END, message + "\n")
         self.log_text.see(tk.END)
-        self.window.update()
         
     def start_process(self):
         input_folder = self.input_path.get()
@@ -199,18 +154,96 @@ class VideoFrameExtractor:
             messagebox.showerror("错误", "请输入有效的数字")
             return
             
+        try:
+            workers = int(self.workers.get())
+            if workers <= 0:
+                messagebox.showerror("错误", "同时处理的视频数必须大于0")
+                return
+        except ValueError:
+            messagebox.showerror("错误", "请输入有效的同时处理的视频数")
+            return
+            
         if not os.path.exists(input_folder):
             messagebox.showerror("错误", f"输入文件夹不存在: {input_folder}")
             return
             
         self.log("开始处理视频...")
-        total_frames, processed_videos = process_videos_in_folder(input_folder, output_folder, interval)
-        self.log(f"\n处理完成!\n处理的视频数量: {processed_videos}\n总共保存的帧数: {total_frames}")
+        
+        def plan(log_callback):
+            return plan_folder(input_folder, output_folder, sanitize_folder_name, log_callback=log_callback,
+                               interval=interval)
+        
+        # 遍历目录、分配线程和提取都在后台线程中进行，界面线程定时读取事件队列，窗口不会卡住
+        self.worker = ExtractionWorker(plan, workers)
+        self.worker.start()
+        self.progress["value"] = 0
+        self.status.config(text="正在查找视频...")
+        self.start_button.config(state=tk.DISABLED)
+        self.pause_button.config(state=tk.NORMAL, text="暂停")
+        self.cancel_button.config(state=tk.NORMAL)
+        self.window.after(100, self.poll_worker)
+        
+    def toggle_pause(self):
+        if self.worker is None:
+            return
+        if self.worker.control.paused:
+            self.worker.resume()
+            self.pause_button.config(text="暂停")
+        else:
+            self.worker.pause()
+            self.pause_button.config(text="继续")
+            
+    def cancel_process(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.pause_button.config(state=tk.DISABLED)
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status.config(text="正在取消...")
+            
+    def poll_worker(self):
+        worker = self.worker
+        if worker is None:
+            return
+        snapshot = None
+        try:
+            while True:
+                event = worker.events.get_nowait()
+                if event[0] == 'log':
+                    self.log(event[1])
+                elif event[0] == 'planned':
+                    self.progress["maximum"] = max(1, event[1])
+                    if not event[1]:
+                        self.log("没有需要处理的视频")
+                elif event[0] == 'video':
+                    self.log(f"\n🎬 ({event[1]}/{len(worker.tasks)}) {os.path.basename(event[2])}")
+                elif event[0] == 'done':
+                    self.log(f"✅ {os.path.basename(event[2].video_path)}: 保存 {event[2].saved} 帧")
+                elif event[0] == 'progress':
+                    snapshot = event[1]
+                elif event[0] == 'finished':
+                    total_frames, processed_videos, cancelled = event[1:]
+                    self.worker = None
+                    self.start_button.config(state=tk.NORMAL)
+                    self.pause_button.config(state=tk.DISABLED, text="暂停")
+                    self.cancel_button.config(state=tk.DISABLED)
+                    self.status.config(text="已取消" if cancelled else "处理完成!")
+                    self.log(f"\n{'已取消，下次从中断的帧继续' if cancelled else '处理完成!'}\n"
+                             f"处理的视频数量: {processed_videos}\n总共保存的帧数: {total_frames}")
+                    return
+        except queue.Empty:
+            pass
+        if snapshot is not None:
+            self.progress["value"] = snapshot.progress
+            self.status.config(text=f"视频 {snapshot.videos_done}/{snapshot.videos_total}  "
+                                    f"已保存 {snapshot.frames_done} 帧  {snapshot.fps:.1f} 帧/秒  "
+                                    f"预计剩余 {format_duration(snapshot.eta)}")
+        self.window.after(100, self.poll_worker)
         
     def run(self):
         self.window.mainloop()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     # 修改主程序入口
     app = VideoFrameExtractor()
     app.run()
\ No newline at end of file
@@ -1,8 +1,12 @@
 import sys
 import os
+import multiprocessing
 import cv2
 import numpy as np
-from PIL import Image
+from extractor.engine import ExtractionJob, run_job, process_folder, watch_folder
+from extractor.naming import alnum_folder_name
+from extractor.progress import ProgressLine
+from extractor.batch import default_workers
 
 # 设置控制台编码为 UTF-8
 if sys.platform.startswith('win'):
@@ -20,108 +24,50 @@ sys.stdout.reconfigure(encoding='utf-8')
 
 def sanitize_folder_name(name, max_length=20):
     """处理文件夹名称，只保留数字和字母"""
-    # 只保留字母数字字符
-    name = ''.join(c for c in name if c.isalnum())
-    return name[:max_length]
+    return alnum_folder_name(name, max_length)
 
-def extract_frames(video_path, output_dir, interval=6):
-    """从视频中每隔指定秒数提取一帧并保存"""
-    try:
-        os.makedirs(output_dir, exist_ok=True)
-        print(f"[+] 创建目录: {output_dir}")
-        
-        test_file = os.path.join(output_dir, 'test.txt')
-        try:
-            with open(test_file, 'w') as f:
-                f.write('test')
-            os.remove(test_file)
-            print("[+] 输出目录可写")
-        except Exception as e:
-            print(f"[!] 警告：输出目录可能没有写入权限: {str(e)}")
-            return 0
-            
-        # 打开视频文件
-        cap = cv2.VideoCapture(str(video_path))
-        
-        if not cap.isOpened():
-            print(f"❌ 错误：无法打开视频文件: {video_path}")
-            return 0
-        
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        print(f"📊 视频信息 - FPS: {fps}, 总帧数: {total_frames}")
-        
-        frame_interval = int(fps * interval)
-        print(f"⏱️ 每 {interval} 秒提取一帧（间隔 {frame_interval} 帧）")
-        
-        frame_count = 0
-        saved_count = 0
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            if frame_count % frame_interval == 0:
-                try:
-                    # 使用简单的文件名
-                    output_path = os.path.join(output_dir, f'frame_{saved_count:03d}.jpg')
-                    
-                    # 转换 BGR 到 RGB
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    
-                    # 使用 PIL 保存图片
-                    img = Image.fromarray(frame_rgb)
-                    img.save(output_path, quality=95)
-                    
-                    if os.path.exists(output_path):
-                        print(f'✅ 成功保存第 {saved_count} 帧')
-                        print(f"📊 文件大小: {os.path.getsize(output_path)} 字节")
-                    else:
-                        print(f'❌ 保存失败: {output_path}')
-                except Exception as e:
-                    print(f"保存图片时出错: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
-                    
-                saved_count += 1
-            frame_count += 1
-            
-    except Exception as e:
-        print(f"处理视频时出错: {str(e)}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        cap.release()
-        
-    return saved_count
+def extract_frames(video_path, output_dir, interval=6, **options):
+    """
+    从视频中每隔指定秒数提取一帧并保存，返回保存的帧数
+    
+    options 为 ExtractionJob 的其他字段（sampling、mode、decoder、encoder、quality、
+    manifest_path、scene、dedup 等），含义见 extractor.engine.ExtractionJob
+    """
+    job = ExtractionJob(video_path, output_dir, interval, **options)
+    # 不再每保存一帧打印一次，只输出限速的进度行；重复帧数量在结束时汇总输出
+    progress = ProgressLine(os.path.basename(video_path))
+    result = run_job(job, on_progress=progress.update)
+    progress.close()
+    print(f'✅ 保存 {result.saved} 帧，共 {result.bytes_written} 字节')
+    return result.saved
 
-def process_videos_in_folder(input_folder, output_base_folder, interval=6.0):
-    """处理指定文件夹中的所有视频文件"""
-    video_extensions = ['.mp4', '.avi', '.mov', '.mkv']
-    total_frames = 0
-    processed_videos = 0
+def process_videos_in_folder(input_folder, output_base_folder, interval=6.0, workers=1, incremental=True,
+                             mode='interval', scene=None, dedup=False, decoder='opencv', codec_threads=None):
+    """
+    处理指定文件夹中的所有视频文件
     
-    for filename in os.listdir(input_folder):
-        if any(filename.lower().endswith(ext) for ext in video_extensions):
-            video_path = os.path.join(input_folder, filename)
-            
-            # 使用简化的文件夹名称
-            video_name = os.path.splitext(filename)[0]
-            safe_video_name = sanitize_folder_name(video_name)
-            output_dir = os.path.join(output_base_folder, safe_video_name)
-            
-            print(f"\n处理视频: {filename}")
-            print(f"输出目录: {output_dir}")
-            
-            # 传递间隔参数
-            frames_saved = extract_frames(video_path, output_dir, interval)
-            total_frames += frames_saved
-            processed_videos += 1
+    workers > 1 时按视频分发到多个进程并行处理；incremental 为 True 时
+    跳过内容和参数都没有变化的视频，并从上次中断的帧继续；mode/scene/decoder 同 ExtractionJob；
+    dedup 为 True 时使用输出基础目录中的去重索引，也可以直接传入 FrameDeduplicator；
+    codec_threads 为每个进程的解码线程数，None 表示按 CPU 预算分配，'auto' 表示在第一个视频上测速后选定
+    """
+    return process_folder(input_folder, output_base_folder, extract_frames, sanitize_folder_name, workers,
+                          incremental, print, codec_threads,
+                          interval=interval, mode=mode, scene=scene, dedup=dedup, decoder=decoder)
+
+def watch_videos_in_folder(input_folder, output_base_folder, interval=6.0, workers=None, mode='interval', scene=None,
+                           dedup=False, decoder='opencv', codec_threads=None, settle=2.0, stop_event=None):
+    """
+    持续监视文件夹（包括子文件夹），新视频写完（大小 settle 秒不变）后立即提取，按 Ctrl+C 或者设置 stop_event 时停止
     
-    return total_frames, processed_videos
+    启动时先处理已有的视频；输出目录和清单与 process_videos_in_folder 相同，其余参数也相同
+    """
+    return watch_folder(input_folder, output_base_folder, extract_frames, sanitize_folder_name, workers,
+                        log_callback=print, codec_threads=codec_threads, settle=settle, stop_event=stop_event,
+                        interval=interval, mode=mode, scene=scene, dedup=dedup, decoder=decoder)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     try:
         print("[*] 视频帧提取工具启动中...")
         print(f"[*] OpenCV 版本: {cv2.__version__}")
@@ -141,14 +87,28 @@ if __name__ == "__main__":
             except ValueError:
                 print("[-] 请输入有效的数字")
         
+        mode = 'scene' if input("[>] 选帧模式 1 固定间隔 / 2 场景切换(直接回车为 1): ").strip() == '2' else 'interval'
+        dedup = input("[>] 是否去除重复帧(y/N): ").strip().lower() == 'y'
+        
+        workers_text = input(f"[>] 请输入并行进程数(直接回车使用 {default_workers()}): ").strip()
+        workers = int(workers_text) if workers_text.isdigit() and int(workers_text) > 0 else default_workers()
+        watch = input("[>] 是否持续监视文件夹、自动处理新加入的视频(y/N): ").strip().lower() == 'y'
+        
         if not os.path.exists(input_folder):
             print(f"❌ 错误：输入文件夹不存在: {input_folder}")
         else:
             print(f"\n🚀 开始处理文件夹: {input_folder}")
             print(f"📂 输出基础目录: {output_base_folder}")
             print(f"⏱️ 截图间隔: {interval} 秒")
+            print(f"🎬 选帧模式: {'场景切换' if mode == 'scene' else '固定间隔'}")
+            print(f"⚙️ 并行进程数: {workers}")
             
-            total_frames, processed_videos = process_videos_in_folder(input_folder, output_base_folder, interval)
+            if watch:
+                total_frames, processed_videos = watch_videos_in_folder(input_folder, output_base_folder, interval,
+                                                                        workers, mode=mode, dedup=dedup)
+            else:
+                total_frames, processed_videos = process_videos_in_folder(input_folder, output_base_folder, interval,
+                                                                          workers, mode=mode, dedup=dedup)
             
             print(f"\n✅ 处理完成!")
             print(f"📊 处理的视频数量: {processed_videos}")
@@ -0,0 +1,445 @@
+"""
+微信界面操作的驱动层
+
+扫描和打标签的逻辑只通过 WeChatDriver 的方法操作微信：
+    WxautoDriver  Windows 上通过 wxauto 操作已经登录的微信（wxauto / pywin32 / pyperclip 在创建时才导入）
+    FakeDriver    内存中的模拟微信，在 Linux 上测试和测量扫描速度
+固定的 sleep 换成 wait_until 条件等待：条件满足立即继续，超时抛出 WaitTimeout。
+"""
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# 朋友圈设置为仅三天可见时页面上显示的文字
+THREE_DAYS_TEXT = "仅三天可见"
+# 朋友圈页面的标题：点击菜单或者加载中的占位内容也会改变窗口文字，标题出现后才开始判断状态
+MOMENTS_MARKER = "朋友圈"
+
+STATUS_THREE_DAYS = "仅三天可见"
+STATUS_NORMAL = "正常可见"
+STATUS_FAILED = "检查失败"
+
+# 窗口内的点击坐标（相对坐标）
+COORDS = {
+    'MENU': (880, 30),            # 聊天窗口右上角菜单
+    'MOMENTS': (780, 160),        # 菜单中的朋友圈按钮
+    'CONTACT': (200, 100),        # 右键联系人
+    'TAG_MENU': (250, 280),       # 右键菜单中的"标签"
+    'NEW_TAG': (250, 400),        # "新建标签"
+    'TAG_CONFIRM': (400, 400),    # 确定
+    # 通讯录管理窗口（批量修改标签）
+    'CONTACTS_TAB': (28, 140),        # 左侧"通讯录"
+    'CONTACT_MANAGER': (150, 60),     # "通讯录管理"
+    'MANAGER_SEARCH': (120, 60),      # 搜索框
+    'MANAGER_FIRST_ROW': (40, 120),   # 搜索结果第一行的勾选框
+    'MANAGER_ROW_NAME': (160, 120),   # 搜索结果第一行的名字
+    'MANAGER_EDIT_TAGS': (420, 560),  # 选中后底部的"修改标签"
+    'MANAGER_CLOSE': (760, 20),       # 关闭通讯录管理
+}
+
+# 一次批量修改标签最多选中的好友数，太多时分几批进行
+TAG_BATCH_SIZE = 100
+# 通讯录管理搜索结果的行高，以及最多检查前几行（搜索是前缀匹配，完全同名的好友不一定在第一行）
+MANAGER_ROW_HEIGHT = 56
+MANAGER_MAX_ROWS = 5
+
+# 条件等待的默认超时和轮询间隔（秒）
+TIMEOUTS = {
+    'STARTUP': 10,
+    'CHAT': 5,
+    'MOMENTS': 8,
+    'CLOSE': 3,
+    'MENU': 2,
+    # 朋友圈标题出现后，页面文字保持这么多秒不变才认为动态已经加载完
+    'MOMENTS_SETTLE': 0.3,
+}
+POLL_INTERVAL = 0.05
+
+
+class WaitTimeout(Exception):
+    """条件在超时前没有满足"""
+
+
+def wait_until(condition, timeout, interval=POLL_INTERVAL, message=None):
+    """
+    每隔 interval 秒检查一次 condition()，返回第一次为真的结果
+
+    timeout 秒内一直不满足时抛出 WaitTimeout；condition 抛出的异常视为不满足
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            value = condition()
+        except Exception:
+            value = None
+        if value:
+            return value
+        if time.monotonic() >= deadline:
+            raise WaitTimeout(message or f"{timeout} 秒内条件没有满足")
+        time.sleep(interval)
+
+
+def wait_for_moments(read_text, before, timeout, settle, message=None):
+    """
+    等待朋友圈加载完成，返回页面文字
+
+    出现仅三天可见的文字时立即返回；否则要等朋友圈标题出现（比打开前多出一个 MOMENTS_MARKER），
+    并且页面文字保持 settle 秒不变，避免动态还没有显示出来就判断为正常可见
+    """
+    before_markers = before.count(MOMENTS_MARKER)
+    last = {'text': None, 'since': 0.0}
+
+    def loaded():
+        text = read_text() or ''
+        if THREE_DAYS_TEXT in text:
+            return text
+        if text.count(MOMENTS_MARKER) <= before_markers:
+            last['text'] = None
+            return None
+        now = time.monotonic()
+        if text != last['text']:
+            last['text'], last['since'] = text, now
+            return None
+        return text if now - last['since'] >= settle else None
+
+    return wait_until(loaded, timeout, message=message)
+
+
+@dataclass
+class Contact:
+    """一个好友，tags 为微信里已有的标签"""
+
+    nickname: str
+    remark: str = ''
+    tags: List[str] = field(default_factory=list)
+    wxid: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        """界面上显示的名字，优先使用备注名"""
+        return self.remark or self.nickname
+
+    @classmethod
+    def from_wxauto(cls, data: dict) -> 'Contact':
+        return cls(data.get('nickname') or '', data.get('remark') or '', list(data.get('tags') or []),
+                   data.get('wxid'))
+
+
+class WeChatDriver:
+    """
+    微信界面操作接口
+
+    一个驱动对应一个微信窗口，同一时间只能在一个线程中使用
+    """
+
+    name = None
+
+    def friends(self) -> List[Contact]:
+        """所有好友"""
+        raise NotImplementedError
+
+    def open_moments(self, contact: Contact) -> str:
+        """打开好友的朋友圈，等待页面加载后返回页面文字"""
+        raise NotImplementedError
+
+    def close_moments(self) -> None:
+        """关闭朋友圈，回到聊天界面"""
+        raise NotImplementedError
+
+    def add_tag(self, contact: Contact, tag: str) -> None:
+        """给好友添加标签"""
+        raise NotImplementedError
+
+    def add_tags(self, contacts: List[Contact], tag: str) -> List[Contact]:
+        """
+        给多个好友添加同一个标签，返回成功添加的好友
+
+        默认逐个添加，驱动可以改为一次批量操作；找不到的好友跳过，不影响其他好友
+        """
+        tagged = []
+        for contact in contacts:
+            try:
+                self.add_tag(contact, tag)
+            except WaitTimeout:
+                continue
+            tagged.append(contact)
+        return tagged
+
+    def close(self) -> None:
+        pass
+
+
+class WxautoDriver(WeChatDriver):
+    """通过 wxauto 操作 Windows 上已经登录的微信"""
+
+    name = 'wxauto'
+
+    def __init__(self, timeouts=None):
+        # 这些依赖只在 Windows 上可用，创建驱动时才导入
+        import pyperclip
+        import uiautomation
+        import win32con
+        import win32gui
+        import wxauto
+
+        self._pyperclip = pyperclip
+        self._uia = uiautomation
+        self._win32con = win32con
+        self._win32gui = win32gui
+        self.timeouts = dict(TIMEOUTS, **(timeouts or {}))
+        # 连接到已经登录的微信，等到窗口句柄可用
+        self.wx = wxauto.WeChat()
+        wait_until(lambda: self.wx.hwnd, self.timeouts['STARTUP'], message="没有找到微信窗口")
+
+    def _window_text(self) -> str:
+        return self.wx.GetWindowText() or ''
+
+    def friends(self) -> List[Contact]:
+        return [Contact.from_wxauto(data) for data in self.wx.GetAllFriends()]
+
+    def _open_chat(self, contact: Contact) -> None:
+        self.wx.ChatWith(contact.name)
+        current_chat = getattr(self.wx, 'CurrentChat', None)
+        if current_chat is not None:
+            wait_until(lambda: current_chat() == contact.name, self.timeouts['CHAT'],
+                       message=f"没有打开和 {contact.name} 的聊天")
+        else:
+            wait_until(lambda: contact.name in self._window_text(), self.timeouts['CHAT'],
+                       message=f"没有打开和 {contact.name} 的聊天")
+
+    def open_moments(self, contact: Contact) -> str:
+        self._open_chat(contact)
+        before = self._window_text()
+        self.wx.ClickOnWindow(*COORDS['MENU'])
+        self.wx.ClickOnWindow(*COORDS['MOMENTS'])
+        return wait_for_moments(self._window_text, before, self.timeouts['MOMENTS'],
+                                self.timeouts['MOMENTS_SETTLE'], message=f"{contact.name} 的朋友圈没有加载出来")
+
+    def close_moments(self) -> None:
+        moments = self._window_text()
+        self._win32gui.PostMessage(self.wx.hwnd, self._win32con.WM_KEYDOWN, self._win32con.VK_ESCAPE, 0)
+        try:
+            wait_until(lambda: self._window_text() != moments, self.timeouts['CLOSE'])
+        except WaitTimeout:
+            # 有些页面关闭后文字不变，继续下一个好友
+            pass
+
+    def _click_and_wait_change(self, coords, right_click=False):
+        before = self._window_text()
+        if right_click:
+            self.wx.ClickOnWindow(*coords, right_click=True)
+        else:
+            self.wx.ClickOnWindow(*coords)
+        try:
+            wait_until(lambda: self._window_text() != before, self.timeouts['MENU'])
+        except WaitTimeout:
+            pass
+
+    def add_tag(self, contact: Contact, tag: str) -> None:
+        self._open_chat(contact)
+        # 右键菜单 → 标签 → 新建标签 → 输入 → 确定
+        self._click_and_wait_change(COORDS['CONTACT'], right_click=True)
+        self._click_and_wait_change(COORDS['TAG_MENU'])
+        self._click_and_wait_change(COORDS['NEW_TAG'])
+        self._pyperclip.copy(tag)
+        self.wx.SendKeys('^v')  # Ctrl+V
+        self._click_and_wait_change(COORDS['TAG_CONFIRM'])
+
+    def _text_at(self, x, y) -> str:
+        """窗口内相对坐标处控件的文字"""
+        left, top, _, _ = self._win32gui.GetWindowRect(self.wx.hwnd)
+        return self._uia.ControlFromPoint(left + x, top + y).Name or ''
+
+    def _matching_checkbox(self, contact: Contact) -> Optional[tuple]:
+        """搜索结果中名字和好友完全相同的那一行的勾选框坐标，没有时返回 None"""
+        names = {name for name in (contact.name, contact.nickname, contact.remark) if name}
+        name_x, name_y = COORDS['MANAGER_ROW_NAME']
+        box_x, box_y = COORDS['MANAGER_FIRST_ROW']
+        for row in range(MANAGER_MAX_ROWS):
+            offset = row * MANAGER_ROW_HEIGHT
+            text = self._text_at(name_x, name_y + offset).strip()
+            if not text:
+                return None
+            if text in names:
+                return box_x, box_y + offset
+        return None
+
+    def add_tags(self, contacts: List[Contact], tag: str) -> List[Contact]:
+        """
+        在通讯录管理中勾选所有好友，再一次修改标签
+
+        每个好友只需要搜索和勾选，不再切换聊天、打开右键菜单和标签对话框。搜索结果按前缀匹配，
+        只勾选名字完全相同的那一行；搜不到的好友跳过，不影响同一批的其他好友。
+        """
+        tagged = []
+        for start in range(0, len(contacts), TAG_BATCH_SIZE):
+            batch = contacts[start:start + TAG_BATCH_SIZE]
+            self._click_and_wait_change(COORDS['CONTACTS_TAB'])
+            self._click_and_wait_change(COORDS['CONTACT_MANAGER'])
+            try:
+                selected = []
+                for contact in batch:
+                    self.wx.ClickOnWindow(*COORDS['MANAGER_SEARCH'])
+                    self._pyperclip.copy(contact.name)
+                    self.wx.SendKeys('^a')
+                    self.wx.SendKeys('^v')
+                    try:
+                        checkbox = wait_until(lambda: self._matching_checkbox(contact), self.timeouts['MENU'])
+                    except WaitTimeout:
+                        continue
+                    self.wx.ClickOnWindow(*checkbox)
+                    selected.append(contact)
+                if not selected:
+                    continue
+                self._click_and_wait_change(COORDS['MANAGER_EDIT_TAGS'])
+                self._click_and_wait_change(COORDS['NEW_TAG'])
+                self._pyperclip.copy(tag)
+                self.wx.SendKeys('^v')
+                self._click_and_wait_change(COORDS['TAG_CONFIRM'])
+                tagged.extend(selected)
+            finally:
+                self._click_and_wait_change(COORDS['MANAGER_CLOSE'])
+        return tagged
+
+
+class FakeDriver(WeChatDriver):
+    """
+    内存中的模拟微信
+
+    参数:
+        contacts: 好友列表，每项为 Contact 或 dict（nickname / remark / tags / moments），
+            moments 为该好友朋友圈的状态（STATUS_THREE_DAYS / STATUS_NORMAL），缺省为正常可见
+        action_delay: 每次简单操作（点击勾选框、按键、粘贴）的耗时
+        transition_delay: 每次界面切换（切换聊天、弹出菜单、打开或关闭窗口）的耗时
+        load_delay: 朋友圈从点击到标题出现的耗时，传入 (最小, 最大) 时每次随机；之前显示加载中的占位内容
+        render_delay: 标题出现后到动态（以及仅三天可见的文字）显示出来的耗时
+        fail_names: 朋友圈一直加载不出来的好友名
+    """
+
+    name = 'fake'
+
+    def __init__(self, contacts, action_delay=0.0, transition_delay=0.0, load_delay=0.0, render_delay=0.0,
+                 fail_names=(), timeouts=None, seed=0):
+        self.contacts = [c if isinstance(c, Contact) else Contact(c['nickname'], c.get('remark', ''),
+                                                                 list(c.get('tags') or []), c.get('wxid'))
+                         for c in contacts]
+        self._by_name = {contact.name: contact for contact in self.contacts}
+        self.moments = {}
+        for raw, contact in zip(contacts, self.contacts):
+            status = raw.get('moments', STATUS_NORMAL) if isinstance(raw, dict) else STATUS_NORMAL
+            self.moments[contact.name] = status
+        self.action_delay = action_delay
+        self.transition_delay = transition_delay
+        self.load_delay = load_delay
+        self.render_delay = render_delay
+        self.fail_names = set(fail_names)
+        self.timeouts = dict(TIMEOUTS, **(timeouts or {}))
+        self.random = random.Random(seed)
+        # 操作次数和其中的界面切换次数，用于比较不同流程的开销
+        self.actions = 0
+        self.transitions = 0
+        self._ready_at = None
+        self._current = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def generate(cls, count, three_days_ratio=0.2, seed=0, **options):
+        """生成 count 个好友，其中约 three_days_ratio 比例开启了仅三天可见"""
+        rng = random.Random(seed)
+        contacts = [{'nickname': f'好友{i:05d}', 'remark': f'备注{i:05d}' if rng.random() < 0.5 else '',
+                     'wxid': f'wxid_{i:05d}',
+                     'moments': STATUS_THREE_DAYS if rng.random() < three_days_ratio else STATUS_NORMAL}
+                    for i in range(count)]
+        return cls(contacts, seed=seed, **options)
+
+    def _action(self, count=1):
+        self.actions += count
+        if self.action_delay:
+            time.sleep(self.action_delay * count)
+
+    def _transition(self, count=1):
+        self.actions += count
+        self.transitions += count
+        if self.transition_delay:
+            time.sleep(self.transition_delay * count)
+
+    def _contact(self, name) -> Contact:
+        return self._by_name[name]
+
+    def friends(self) -> List[Contact]:
+        self._transition()
+        return [Contact(c.nickname, c.remark, list(c.tags), c.wxid) for c in self.contacts]
+
+    def _moments_text(self) -> str:
+        if self._current is None:
+            return ''
+        now = time.monotonic()
+        if now < self._ready_at:
+            return f"{self._current}\n加载中"
+        if now < self._ready_at + self.render_delay or self.moments[self._current] != STATUS_THREE_DAYS:
+            return f"{self._current}\n{MOMENTS_MARKER}"
+        return f"{self._current}\n{MOMENTS_MARKER}\n{THREE_DAYS_TEXT}"
+
+    def open_moments(self, contact: Contact) -> str:
+        with self._lock:
+            # 切换聊天、菜单、朋友圈
+            self._transition(3)
+            delay = self.load_delay
+            if isinstance(delay, tuple):
+                delay = self.random.uniform(*delay)
+            self._current = contact.name
+            self._ready_at = float('inf') if contact.name in self.fail_names else time.monotonic() + delay
+        return wait_for_moments(self._moments_text, '', self.timeouts['MOMENTS'], self.timeouts['MOMENTS_SETTLE'],
+                                message=f"{contact.name} 的朋友圈没有加载出来")
+
+    def close_moments(self) -> None:
+        with self._lock:
+            self._transition()
+            self._current = None
+
+    def add_tag(self, contact: Contact, tag: str) -> None:
+        with self._lock:
+            if contact.name not in self._by_name:
+                # 切换聊天失败
+                self._transition()
+                raise WaitTimeout(f"没有打开和 {contact.name} 的聊天")
+            # 切换聊天、右键菜单、标签、新建标签；粘贴；确定
+            self._transition(4)
+            self._action()
+            self._transition()
+            self._tag(contact, tag)
+
+    def add_tags(self, contacts: List[Contact], tag: str) -> List[Contact]:
+        tagged = []
+        with self._lock:
+            for start in range(0, len(contacts), TAG_BATCH_SIZE):
+                batch = contacts[start:start + TAG_BATCH_SIZE]
+                # 通讯录、通讯录管理
+                self._transition(2)
+                selected = []
+                for contact in batch:
+                    # 搜索框、粘贴
+                    self._action(2)
+                    if contact.name not in self._by_name:
+                        continue
+                    # 勾选
+                    self._action()
+                    selected.append(contact)
+                if selected:
+                    # 修改标签、新建标签；粘贴；确定
+                    self._transition(2)
+                    self._action()
+                    self._transition()
+                    for contact in selected:
+                        self._tag(contact, tag)
+                # 关闭
+                self._transition()
+                tagged.extend(selected)
+        return tagged
+
+    def _tag(self, contact, tag):
+        target = self._contact(contact.name)
+        if tag not in target.tags:
+            target.tags.append(tag)
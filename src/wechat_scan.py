@@ -0,0 +1,245 @@
+"""
+好友朋友圈扫描
+
+FriendScanner 通过驱动（wechat_driver）逐个打开好友的朋友圈，判断是否开启了仅三天可见，
+并统计每分钟检查的好友数。扫描和打标签分开进行：扫描完成后收集需要标签的好友，
+由 tag_contacts 一次批量添加。不连接微信也可以用模拟驱动测量速度：
+
+    python wechat_scan.py --fake 500 --load-delay 0.05 0.2 --transition-delay 0.3 --tag
+"""
+import argparse
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from extractor.metrics import METRICS
+from wechat_driver import (STATUS_FAILED, STATUS_NORMAL, STATUS_THREE_DAYS, THREE_DAYS_TEXT, Contact,
+                           FakeDriver, WaitTimeout)
+
+SCAN_METRIC = 'wechat_scan_seconds'
+TAG_METRIC = 'wechat_tag_seconds'
+
+# 开启了仅三天可见的好友添加的标签
+DEFAULT_TAG = "仅三天可见"
+
+
+@dataclass
+class ScanResult:
+    """一个好友的检查结果"""
+
+    contact: Contact
+    status: str
+    elapsed: float
+    error: Optional[str] = None
+
+
+def moments_status(text):
+    """根据朋友圈页面文字判断状态"""
+    return STATUS_THREE_DAYS if THREE_DAYS_TEXT in text else STATUS_NORMAL
+
+
+class FriendScanner:
+    """
+    用一个驱动依次检查好友的朋友圈
+
+    参数:
+        driver: WeChatDriver
+        on_result: 每检查完一个好友调用 on_result(driver, result)，此时已经回到聊天界面，
+            可以继续用 driver 操作（例如添加标签）
+        store: ScanStore，只检查需要重新检查的好友，每个结果检查完立即写入；
+            on_result 出错时记录为检查失败，下次扫描会重新检查
+        report_every: 每检查多少个好友输出一次速度
+    微信窗口同一时间只能执行一个操作，驱动的所有调用（包括 on_result）都在持有锁时进行，
+    可以从多个线程调用 check。
+    """
+
+    def __init__(self, driver, on_result=None, store=None, report_every=20, log_callback=print):
+        self.driver = driver
+        self.on_result = on_result
+        self.store = store
+        self.report_every = report_every
+        self.log_callback = log_callback
+        self.results = []
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def check(self, contact: Contact) -> ScanResult:
+        """检查一个好友，出错时返回状态为检查失败的结果"""
+        with self._lock:
+            start = time.perf_counter()
+            error = None
+            try:
+                status = moments_status(self.driver.open_moments(contact))
+            except Exception as e:
+                status, error = STATUS_FAILED, str(e)
+            finally:
+                try:
+                    self.driver.close_moments()
+                except Exception as e:
+                    self.log_callback(f"[!] 关闭 {contact.name} 的朋友圈失败: {e}")
+            result = ScanResult(contact, status, time.perf_counter() - start, error)
+            METRICS.observe(SCAN_METRIC, result.elapsed, status=status)
+            if self.on_result:
+                try:
+                    self.on_result(self.driver, result)
+                except Exception as e:
+                    result.status, result.error = STATUS_FAILED, f"处理结果时出错: {e}"
+            if self.store is not None:
+                self.store.record(result)
+            self.results.append(result)
+        return result
+
+    def _log_result(self, result):
+        name = result.contact.name
+        if result.status == STATUS_THREE_DAYS:
+            self.log_callback(f"[+] {name} 开启了仅三天可见")
+        elif result.status == STATUS_FAILED:
+            self.log_callback(f"❌ 处理 {name} 时出错: {result.error}")
+
+    def run(self, contacts=None):
+        """检查 contacts（默认为全部好友），返回结果列表"""
+        if contacts is None:
+            contacts = self.driver.friends()
+            self.log_callback(f"[+] 获取到 {len(contacts)} 个好友")
+        contacts = list(contacts)
+        if self.store is not None:
+            stale = self.store.stale(contacts)
+            if len(stale) < len(contacts):
+                self.log_callback(f"[+] 跳过 {len(contacts) - len(stale)} 个有效期内已检查的好友")
+            contacts = stale
+        start = time.perf_counter()
+        for index, contact in enumerate(contacts, 1):
+            self._log_result(self.check(contact))
+            if self.report_every and index % self.report_every == 0 and index < len(contacts):
+                rate = index * 60 / (time.perf_counter() - start)
+                self.log_callback(f"📊 已检查 {index}/{len(contacts)} 个好友，{rate:.1f} 人/分钟")
+        self.elapsed += time.perf_counter() - start
+        stats = self.stats()
+        self.log_callback(f"✅ 检查完成: {stats['total']} 个好友，仅三天可见 {stats['three_days']} 个，"
+                          f"失败 {stats['failed']} 个，用时 {stats['elapsed']:.1f} 秒，"
+                          f"{stats['per_minute']:.1f} 人/分钟")
+        return self.results
+
+    def stats(self):
+        counts = {STATUS_THREE_DAYS: 0, STATUS_NORMAL: 0, STATUS_FAILED: 0}
+        for result in self.results:
+            counts[result.status] += 1
+        total = len(self.results)
+        return {
+            'total': total,
+            'three_days': counts[STATUS_THREE_DAYS],
+            'normal': counts[STATUS_NORMAL],
+            'failed': counts[STATUS_FAILED],
+            'elapsed': self.elapsed,
+            'per_minute': total * 60 / self.elapsed if self.elapsed > 0 else 0.0,
+        }
+
+
+def contacts_to_tag(contacts, tag, store=None, results=()):
+    """
+    开启了仅三天可见、还没有 tag 标签的好友
+
+    状态优先取本次扫描的结果 results，没有扫描的好友（有效期内跳过的）取 store 中的记录
+    """
+    statuses = {id(result.contact): result.status for result in results}
+    flagged = []
+    for contact in contacts:
+        if tag in contact.tags:
+            continue
+        status = statuses.get(id(contact))
+        if status is None and store is not None:
+            record = store.get(contact)
+            status = record['status'] if record else None
+        if status == STATUS_THREE_DAYS:
+            flagged.append(contact)
+    return flagged
+
+
+def tag_contacts(driver, contacts, tag, store=None, bulk=True, log_callback=print):
+    """
+    给 contacts 添加 tag 标签，返回成功添加的好友
+
+    bulk 为 True 时通过 driver.add_tags 一次批量添加，否则逐个调用 driver.add_tag（用于对比速度）。
+    找不到的好友跳过并输出，不影响其他好友；成功后更新 contact.tags 和 store 中记录的标签。
+    """
+    if not contacts:
+        log_callback("[+] 没有需要添加标签的好友")
+        return []
+    mode = 'bulk' if bulk else 'each'
+    log_callback(f"[+] 正在为 {len(contacts)} 个好友添加标签: {tag}")
+    start = time.perf_counter()
+    tagged = []
+    try:
+        if bulk:
+            tagged = driver.add_tags(contacts, tag)
+        else:
+            for contact in contacts:
+                try:
+                    driver.add_tag(contact, tag)
+                except WaitTimeout:
+                    continue
+                tagged.append(contact)
+    except Exception as e:
+        log_callback(f"❌ 添加标签失败: {e}")
+        return []
+    finally:
+        METRICS.observe(TAG_METRIC, time.perf_counter() - start, mode=mode)
+    tagged_ids = {id(contact) for contact in tagged}
+    for contact in contacts:
+        if id(contact) not in tagged_ids:
+            log_callback(f"[!] 没有找到 {contact.name}，跳过添加标签")
+            continue
+        contact.tags.append(tag)
+        if store is not None:
+            store.update_tags(contact)
+    elapsed = time.perf_counter() - start
+    log_callback(f"✅ 已为 {len(tagged)} 个好友添加标签，用时 {elapsed:.1f} 秒")
+    return tagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用模拟微信测量好友扫描和添加标签的速度')
+    parser.add_argument('--fake', type=int, default=200, help='模拟好友数')
+    parser.add_argument('--three-days-ratio', type=float, default=0.2, help='开启仅三天可见的好友比例')
+    parser.add_argument('--action-delay', type=float, default=0.0, help='每次简单操作（点击、按键）的耗时（秒）')
+    parser.add_argument('--transition-delay', type=float, default=0.0,
+                        help='每次界面切换（切换聊天、弹出菜单、打开窗口）的耗时（秒）')
+    parser.add_argument('--load-delay', type=float, nargs='+', default=[0.02],
+                        help='朋友圈加载耗时（秒），给出两个值时在范围内随机')
+    parser.add_argument('--render-delay', type=float, default=0.0, help='朋友圈标题出现后动态显示出来的耗时（秒）')
+    parser.add_argument('--settle', type=float, default=0.3, help='朋友圈标题出现后页面文字保持不变多少秒才判断状态')
+    parser.add_argument('--fail', type=int, default=0, help='朋友圈一直加载不出来的好友数')
+    parser.add_argument('--timeout', type=float, default=1.0, help='等待朋友圈加载的超时（秒）')
+    parser.add_argument('--tag', action='store_true', help='扫描后为仅三天可见的好友批量添加标签')
+    parser.add_argument('--tag-each', action='store_true', help='扫描后逐个添加标签（对比批量添加的速度）')
+    args = parser.parse_args()
+
+    load_delay = tuple(args.load_delay) if len(args.load_delay) > 1 else args.load_delay[0]
+    driver = FakeDriver.generate(args.fake, three_days_ratio=args.three_days_ratio, action_delay=args.action_delay,
+                                 transition_delay=args.transition_delay, load_delay=load_delay,
+                                 render_delay=args.render_delay,
+                                 timeouts={'MOMENTS': args.timeout, 'MOMENTS_SETTLE': args.settle})
+    driver.fail_names = {contact.name for contact in driver.contacts[:args.fail]}
+    scanner = FriendScanner(driver, report_every=max(1, args.fake // 10))
+    friends = driver.friends()
+    results = scanner.run(friends)
+    print(f"📊 扫描: 操作 {driver.actions} 次，其中界面切换 {driver.transitions} 次")
+
+    for bulk, enabled in ((True, args.tag), (False, args.tag_each)):
+        if not enabled:
+            continue
+        contacts = contacts_to_tag(friends, DEFAULT_TAG, results=results)
+        actions, transitions = driver.actions, driver.transitions
+        start = time.perf_counter()
+        tagged = tag_contacts(driver, contacts, DEFAULT_TAG, bulk=bulk)
+        print(f"📊 {'批量' if bulk else '逐个'}添加标签: {len(contacts)} 个好友，用时 {time.perf_counter() - start:.2f} 秒，"
+              f"操作 {driver.actions - actions} 次，其中界面切换 {driver.transitions - transitions} 次")
+        # 下一种方式从头添加，便于对比
+        for contact in tagged:
+            contact.tags.remove(DEFAULT_TAG)
+            driver._contact(contact.name).tags.remove(DEFAULT_TAG)
+
+
+if __name__ == '__main__':
+    main()
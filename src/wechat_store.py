@@ -0,0 +1,211 @@
+"""
+好友扫描结果的持久化记录
+
+每个好友一条记录，保存在 SQLite 中：上次检查时间、朋友圈状态和当时的标签。每检查完一个好友立即写入，
+扫描中断不会丢失已经检查的结果；再次扫描时只检查超过有效期、标签有变化或者上次检查失败的好友。
+
+好友按稳定的身份区分：有 wxid 时使用 wxid，否则使用昵称（备注名可能随时修改）。
+旧版 friend_info.json 只记录了显示名，导入后按显示名匹配，第一次写入新结果时换成稳定的身份。
+"""
+import json
+import os
+import sqlite3
+import time
+
+from wechat_driver import STATUS_FAILED
+
+SCAN_STORE_NAME = 'friend_scan.sqlite3'
+
+# 检查结果的有效期（秒）
+DEFAULT_TTL = 7 * 24 * 3600
+
+LEGACY_CHECKED = '已检查'
+
+# export_json 写入的检查时间格式
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def contact_key(contact):
+    """好友的稳定身份"""
+    if contact.wxid:
+        return f'wxid:{contact.wxid}'
+    return f'nickname:{contact.nickname}'
+
+
+def _legacy_key(name):
+    return f'name:{name}'
+
+
+def _dump_tags(tags):
+    return json.dumps(sorted(tags or []), ensure_ascii=False)
+
+
+def _parse_time(text, default):
+    try:
+        return time.mktime(time.strptime(text, TIME_FORMAT))
+    except (TypeError, ValueError):
+        return default
+
+
+class ScanStore:
+    """
+    好友扫描记录
+
+    path 为 ':memory:' 时只保存在内存中
+    """
+
+    def __init__(self, path=SCAN_STORE_NAME, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS contacts (
+                contact_key TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                nickname TEXT,
+                remark TEXT,
+                wxid TEXT,
+                status TEXT,
+                tags TEXT,
+                last_checked REAL NOT NULL,
+                last_error TEXT,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS contacts_name ON contacts (name)')
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get(self, contact):
+        """好友的记录，没有检查过时返回 None"""
+        row = self.conn.execute('SELECT * FROM contacts WHERE contact_key = ?', (contact_key(contact),)).fetchone()
+        if row is None:
+            row = self.conn.execute('SELECT * FROM contacts WHERE contact_key = ?',
+                                    (_legacy_key(contact.name),)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record['tags'] = json.loads(record['tags']) if record['tags'] is not None else None
+        return record
+
+    def needs_check(self, contact, now=None):
+        """
+        是否需要（重新）检查好友
+
+        没有记录、记录超过有效期、上次检查失败、或者标签和上次检查时不同时需要检查。
+        旧版导入的记录没有标签，不比较标签。
+        """
+        record = self.get(contact)
+        if record is None or record['status'] == STATUS_FAILED:
+            return True
+        now = time.time() if now is None else now
+        if now - record['last_checked'] >= self.ttl:
+            return True
+        return record['tags'] is not None and record['tags'] != sorted(contact.tags)
+
+    def stale(self, contacts, now=None):
+        """需要检查的好友"""
+        now = time.time() if now is None else now
+        return [contact for contact in contacts if self.needs_check(contact, now)]
+
+    def record(self, result):
+        """写入一个好友的检查结果（单独一个事务）"""
+        contact = result.contact
+        now = time.time()
+        with self.conn:
+            self.conn.execute('DELETE FROM contacts WHERE contact_key = ?', (_legacy_key(contact.name),))
+            self.conn.execute(
+                'INSERT OR REPLACE INTO contacts (contact_key, name, nickname, remark, wxid, status, tags, '
+                'last_checked, last_error, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (contact_key(contact), contact.name, contact.nickname, contact.remark, contact.wxid, result.status,
+                 _dump_tags(contact.tags), now, result.error, now))
+
+    def update_tags(self, contact):
+        """添加标签后更新记录中的标签，不改变检查时间（否则下次扫描会因为标签变化重新检查）"""
+        with self.conn:
+            self.conn.execute('UPDATE contacts SET tags = ?, updated_at = ? WHERE contact_key = ?',
+                              (_dump_tags(contact.tags), time.time(), contact_key(contact)))
+
+    def import_legacy(self, path):
+        """
+        导入旧版的 friend_info.json，返回导入的好友数
+
+        支持 {显示名: "已检查"} 和 main1.py 输出的 {显示名: {"朋友圈状态": ...}} 两种格式，
+        已经有记录的好友不会被覆盖，可以重复导入。记录中有检查时间（export_json 导出的文件）时使用该时间，
+        否则以文件的修改时间作为检查时间。
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        checked_at = os.path.getmtime(path)
+        rows = []
+        for name, value in data.items():
+            if isinstance(value, dict):
+                status = value.get('朋友圈状态')
+                tags = value.get('当前标签')
+                rows.append((_legacy_key(name), name, value.get('昵称'), value.get('备注'), status,
+                             _dump_tags(tags) if tags is not None else None,
+                             _parse_time(value.get('检查时间'), checked_at)))
+            else:
+                rows.append((_legacy_key(name), name, None, None, None, None, checked_at))
+        with self.conn:
+            before = self.conn.total_changes
+            for key, name, nickname, remark, status, tags, last_checked in rows:
+                exists = self.conn.execute('SELECT 1 FROM contacts WHERE contact_key = ? OR name = ?',
+                                           (key, name)).fetchone()
+                if exists is None:
+                    self.conn.execute(
+                        'INSERT INTO contacts (contact_key, name, nickname, remark, status, tags, last_checked, '
+                        'updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (key, name, nickname, remark, status, tags, last_checked, time.time()))
+            return self.conn.total_changes - before
+
+    def records(self, status=None):
+        """列出记录，可以按朋友圈状态过滤"""
+        if status is None:
+            rows = self.conn.execute('SELECT * FROM contacts ORDER BY name').fetchall()
+        else:
+            rows = self.conn.execute('SELECT * FROM contacts WHERE status = ? ORDER BY name', (status,)).fetchall()
+        records = []
+        for row in rows:
+            record = dict(row)
+            record['tags'] = json.loads(record['tags']) if record['tags'] is not None else None
+            records.append(record)
+        return records
+
+    def export_json(self, path):
+        """按 main1.py 的格式导出 {显示名: 记录}，先写临时文件再替换，返回导出的好友数"""
+        friend_info = {}
+        for record in self.records():
+            if record['status'] is None:
+                friend_info[record['name']] = LEGACY_CHECKED
+                continue
+            friend_info[record['name']] = {
+                "昵称": record['nickname'],
+                "备注": record['remark'],
+                "朋友圈状态": record['status'],
+                "当前标签": record['tags'] or [],
+                "检查时间": time.strftime(TIME_FORMAT, time.localtime(record['last_checked'])),
+            }
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(friend_info, f, ensure_ascii=False, indent=4)
+        os.replace(temp_path, path)
+        return len(friend_info)
+
+    def counts(self):
+        """各朋友圈状态的好友数，旧版导入的记录状态为 None"""
+        return {row[0]: row[1] for row in
+                self.conn.execute('SELECT status, COUNT(*) FROM contacts GROUP BY status').fetchall()}
@@ -0,0 +1,5 @@
+"""测试直接导入 src 下的脚本和 extractor 包，与在 src 中运行脚本时一致"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
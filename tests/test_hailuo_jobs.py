@@ -0,0 +1,177 @@
+"""海螺任务队列：断点续跑时不重复提交、失败退避和取出顺序"""
+import pytest
+
+import hailuo_jobs
+from hailuo_jobs import (STATUS_FAILED, STATUS_GENERATED, STATUS_PENDING, STATUS_SUBMITTED, STATUS_UPLOADING,
+                         JobStore)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(hailuo_jobs.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def store(clock):
+    with JobStore(max_attempts=4, retry_delay=10.0, max_retry_delay=25.0) as store:
+        yield store
+
+
+def add_in_order(store, clock, *paths):
+    # created_at 相同时取出顺序不确定，每登记一张图片前进一秒
+    for path in paths:
+        store.add([path])
+        clock.advance(1)
+
+
+def status(store, path):
+    return store.get(path)['status']
+
+
+def test_add_ignores_known_images(store):
+    assert store.add(['/img/a.png', '/img/b.png']) == 2
+    store.mark_submitted('/img/a.png', 'v1')
+    assert store.add(['/img/a.png', '/img/c.png']) == 1
+    assert status(store, '/img/a.png') == STATUS_SUBMITTED
+
+
+def test_recover_requeues_unclicked_and_fails_clicked(store, clock):
+    add_in_order(store, clock, '/img/a.png', '/img/b.png', '/img/c.png', '/img/d.png')
+    # a: 上传中还没有点击；b: 已经点击生成；c: 已经拿到视频 id；d: 视频已经生成
+    for _ in range(4):
+        store.claim()
+    store.mark_clicked('/img/b.png')
+    store.mark_clicked('/img/c.png')
+    store.mark_submitted('/img/c.png', 'v3', account='A')
+    store.mark_clicked('/img/d.png')
+    store.mark_submitted('/img/d.png', 'v4')
+    store.mark_generated('v4')
+
+    assert store.recover() == (1, 1)
+    assert status(store, '/img/a.png') == STATUS_PENDING
+    assert status(store, '/img/b.png') == STATUS_FAILED
+    assert '无法确定是否已经提交' in store.get('/img/b.png')['last_error']
+    assert status(store, '/img/c.png') == STATUS_SUBMITTED
+    assert store.get('/img/c.png')['video_id'] == 'v3'
+    assert status(store, '/img/d.png') == STATUS_GENERATED
+    assert store.in_flight() == 0
+    # 再次恢复不会改变任何任务
+    assert store.recover() == (0, 0)
+
+
+def test_recover_then_claim_never_returns_submitted(store, clock):
+    add_in_order(store, clock, '/img/a.png', '/img/b.png')
+    store.claim()
+    store.mark_clicked('/img/a.png')
+    store.mark_submitted('/img/a.png', 'v1')
+    store.claim()
+    store.recover()
+    assert store.claim() == '/img/b.png'
+    assert store.claim() is None
+
+
+def test_mark_failed_never_requeues_clicked_job(store):
+    store.add(['/img/a.png'])
+    assert store.claim() == '/img/a.png'
+    store.mark_clicked('/img/a.png')
+    assert store.mark_failed('/img/a.png', 'timeout') is False
+    job = store.get('/img/a.png')
+    assert job['status'] == STATUS_FAILED
+    assert job['attempts'] == 1
+    assert job['last_error'].startswith('timeout')
+    assert store.claim() is None
+
+
+def test_retry_failed_clears_click(store):
+    store.add(['/img/a.png'])
+    store.claim()
+    store.mark_clicked('/img/a.png')
+    store.mark_failed('/img/a.png', 'timeout')
+    assert store.retry_failed() == 1
+    job = store.get('/img/a.png')
+    assert (job['status'], job['attempts'], job['clicked_at']) == (STATUS_PENDING, 0, None)
+    assert store.claim() == '/img/a.png'
+
+
+def test_mark_failed_backs_off_exponentially(store, clock):
+    store.add(['/img/a.png'])
+    delays = []
+    for _ in range(3):
+        assert store.claim() == '/img/a.png'
+        assert store.mark_failed('/img/a.png', 'upload error') is True
+        delays.append(store.next_retry_delay())
+        # 等待期间不会被取出
+        clock.advance(delays[-1] - 0.5)
+        assert store.claim() is None
+        clock.advance(0.5)
+    # retry_delay * 2 ** (n - 1)，最多 max_retry_delay
+    assert delays == [10.0, 20.0, 25.0]
+    assert store.claim() == '/img/a.png'
+    assert store.mark_failed('/img/a.png', 'upload error') is False
+    assert status(store, '/img/a.png') == STATUS_FAILED
+    assert store.next_retry_delay() is None
+
+
+def test_mark_failed_without_retry(store):
+    store.add(['/img/a.png'])
+    store.claim()
+    assert store.mark_failed('/img/a.png', 'invalid_image', retry=False) is False
+    assert status(store, '/img/a.png') == STATUS_FAILED
+
+
+def test_release_does_not_count_attempt(store, clock):
+    add_in_order(store, clock, '/img/a.png', '/img/b.png')
+    assert store.claim() == '/img/a.png'
+    store.mark_clicked('/img/a.png')
+    store.release('/img/a.png', delay=30)
+    job = store.get('/img/a.png')
+    assert (job['status'], job['attempts'], job['clicked_at']) == (STATUS_PENDING, 0, None)
+    # 放回的任务 delay 秒内不会被取出，其他任务照常取出
+    assert store.claim() == '/img/b.png'
+    assert store.claim() is None
+    assert store.next_retry_delay() == pytest.approx(30)
+    clock.advance(30)
+    assert store.claim() == '/img/a.png'
+
+
+def test_claim_order(store, clock):
+    add_in_order(store, clock, '/img/a.png', '/img/b.png', '/img/c.png')
+    assert store.claim() == '/img/a.png'
+    # 没有等待时间的放回任务排在从未提交过的任务之后
+    store.release('/img/a.png')
+    assert store.claim() == '/img/b.png'
+    assert store.claim() == '/img/c.png'
+    assert store.claim() == '/img/a.png'
+    assert store.in_flight() == 3
+    assert store.claim() is None
+
+
+def test_counts_and_jobs(store, clock):
+    add_in_order(store, clock, '/img/a.png', '/img/b.png')
+    store.claim()
+    assert store.counts() == {STATUS_UPLOADING: 1, STATUS_PENDING: 1}
+    assert [job['image_path'] for job in store.jobs(STATUS_PENDING)] == ['/img/b.png']
+    assert len(store.jobs()) == 2
+
+
+def test_reopen_file_store_keeps_jobs(tmp_path):
+    with JobStore.for_folder(str(tmp_path)) as store:
+        store.add([str(tmp_path / 'a.png')])
+        store.claim()
+        store.mark_clicked(str(tmp_path / 'a.png'))
+    with JobStore.for_folder(str(tmp_path)) as store:
+        assert store.recover() == (0, 1)
+        assert store.claim() is None
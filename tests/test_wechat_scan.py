@@ -0,0 +1,111 @@
+"""用模拟驱动检查朋友圈扫描和批量添加标签，不需要连接微信"""
+import pytest
+
+from wechat_driver import STATUS_FAILED, STATUS_NORMAL, STATUS_THREE_DAYS, Contact, FakeDriver
+from wechat_scan import DEFAULT_TAG, FriendScanner, ScanResult, contacts_to_tag, tag_contacts
+
+# 打开朋友圈后 0.01 秒出现标题，再过 render_delay 秒动态才显示出来
+FAST_TIMEOUTS = {'MOMENTS': 1.0, 'MOMENTS_SETTLE': 0.08}
+
+
+def quiet(message):
+    pass
+
+
+def expected_flagged(driver):
+    return sorted(name for name, status in driver.moments.items() if status == STATUS_THREE_DAYS)
+
+
+def flagged_names(results):
+    return sorted(result.contact.name for result in results if result.status == STATUS_THREE_DAYS)
+
+
+def test_scan_finds_flagged_friends_after_render_delay():
+    driver = FakeDriver.generate(12, three_days_ratio=0.5, load_delay=0.01, render_delay=0.04,
+                                 timeouts=FAST_TIMEOUTS)
+    assert expected_flagged(driver)
+    results = FriendScanner(driver, log_callback=quiet).run()
+    assert len(results) == 12
+    # 标题出现后仅三天可见的文字还没有显示，不能在这时判断为正常可见
+    assert flagged_names(results) == expected_flagged(driver)
+    assert all(result.status != STATUS_FAILED for result in results)
+
+
+def test_scan_without_settle_misses_late_render():
+    # 对照：不等页面稳定时，标题一出现就判断，渲染慢的好友全部被误判为正常可见
+    driver = FakeDriver.generate(8, three_days_ratio=1.0, load_delay=0.01, render_delay=0.1,
+                                 timeouts=dict(FAST_TIMEOUTS, MOMENTS_SETTLE=0))
+    results = FriendScanner(driver, log_callback=quiet).run()
+    assert flagged_names(results) == []
+
+
+def test_fail_names_are_reported_as_failed():
+    driver = FakeDriver.generate(6, three_days_ratio=0.5, timeouts={'MOMENTS': 0.1, 'MOMENTS_SETTLE': 0.02})
+    failing = [contact.name for contact in driver.contacts[:2]]
+    driver.fail_names = set(failing)
+    scanner = FriendScanner(driver, log_callback=quiet)
+    results = scanner.run()
+    failed = [result for result in results if result.status == STATUS_FAILED]
+    assert sorted(result.contact.name for result in failed) == sorted(failing)
+    assert all('没有加载出来' in result.error for result in failed)
+    # 失败的好友之后的检查不受影响
+    others = [result for result in results if result.contact.name not in failing]
+    assert all(result.status in (STATUS_THREE_DAYS, STATUS_NORMAL) for result in others)
+    assert driver._current is None
+
+
+def test_stats_counts_and_rate():
+    driver = FakeDriver.generate(10, three_days_ratio=0.3, timeouts={'MOMENTS': 0.1, 'MOMENTS_SETTLE': 0.02})
+    driver.fail_names = {driver.contacts[0].name}
+    scanner = FriendScanner(driver, log_callback=quiet)
+    results = scanner.run()
+    stats = scanner.stats()
+    assert stats['total'] == 10
+    assert stats['failed'] == 1
+    assert stats['three_days'] == len(flagged_names(results))
+    assert stats['three_days'] + stats['normal'] + stats['failed'] == 10
+    assert stats['elapsed'] == scanner.elapsed > 0
+    assert stats['per_minute'] == pytest.approx(10 * 60 / scanner.elapsed)
+
+
+def test_stats_per_minute_from_elapsed():
+    scanner = FriendScanner(FakeDriver([]), log_callback=quiet)
+    assert scanner.stats()['per_minute'] == 0.0
+    contact = Contact('a')
+    scanner.results = [ScanResult(contact, STATUS_THREE_DAYS, 0.5)] * 3 + [ScanResult(contact, STATUS_NORMAL, 0.5)]
+    scanner.elapsed = 2.0
+    stats = scanner.stats()
+    assert (stats['three_days'], stats['normal'], stats['failed']) == (3, 1, 0)
+    assert stats['per_minute'] == pytest.approx(120.0)
+
+
+@pytest.mark.parametrize('bulk', [True, False])
+def test_tag_contacts_skips_unknown_contacts(bulk):
+    driver = FakeDriver.generate(5, three_days_ratio=1.0)
+    contacts = driver.friends()
+    unknown = Contact('不存在的好友')
+    messages = []
+    tagged = tag_contacts(driver, contacts[:2] + [unknown] + contacts[2:], DEFAULT_TAG, bulk=bulk,
+                          log_callback=messages.append)
+    assert [contact.name for contact in tagged] == [contact.name for contact in contacts]
+    assert all(DEFAULT_TAG in contact.tags for contact in driver.contacts)
+    assert all(DEFAULT_TAG in contact.tags for contact in contacts)
+    assert unknown.tags == []
+    assert any('不存在的好友' in message and '跳过' in message for message in messages)
+
+
+def test_tag_contacts_nothing_to_tag():
+    driver = FakeDriver.generate(3)
+    assert tag_contacts(driver, [], DEFAULT_TAG, log_callback=quiet) == []
+    assert driver.actions == 0
+
+
+def test_contacts_to_tag_uses_scan_results():
+    driver = FakeDriver.generate(12, three_days_ratio=0.5, timeouts={'MOMENTS': 0.2, 'MOMENTS_SETTLE': 0.02})
+    contacts = driver.friends()
+    contacts[0].tags.append(DEFAULT_TAG)
+    results = FriendScanner(driver, log_callback=quiet).run(contacts)
+    flagged = contacts_to_tag(contacts, DEFAULT_TAG, results=results)
+    expected = [result.contact for result in results
+                if result.status == STATUS_THREE_DAYS and DEFAULT_TAG not in result.contact.tags]
+    assert flagged == expected
@@ -0,0 +1,151 @@
+"""好友扫描记录：有效期、增量检查和旧版 friend_info.json 的导入导出"""
+import json
+import os
+
+import pytest
+
+import wechat_store
+from wechat_driver import STATUS_FAILED, STATUS_NORMAL, STATUS_THREE_DAYS, Contact
+from wechat_scan import ScanResult
+from wechat_store import LEGACY_CHECKED, ScanStore
+
+TTL = 3600
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(wechat_store.time, 'time', lambda: NOW)
+    with ScanStore(':memory:', ttl=TTL) as store:
+        yield store
+
+
+def keys(store):
+    return sorted(record['contact_key'] for record in store.records())
+
+
+def write_legacy(tmp_path, data, name='friend_info.json'):
+    path = tmp_path / name
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+    os.utime(path, (NOW - 60, NOW - 60))
+    return str(path)
+
+
+def test_needs_check_ttl_boundary(store):
+    contact = Contact('小明', wxid='wxid_a')
+    assert store.needs_check(contact)
+    store.record(ScanResult(contact, STATUS_NORMAL, 1.0))
+    assert not store.needs_check(contact, now=NOW)
+    assert not store.needs_check(contact, now=NOW + TTL - 1)
+    # 刚好到有效期时重新检查
+    assert store.needs_check(contact, now=NOW + TTL)
+
+
+def test_needs_check_after_tag_change(store):
+    contact = Contact('小明', tags=['同事', '朋友'], wxid='wxid_a')
+    store.record(ScanResult(contact, STATUS_NORMAL, 1.0))
+    # 标签顺序不同不算变化
+    assert not store.needs_check(Contact('小明', tags=['朋友', '同事'], wxid='wxid_a'), now=NOW)
+    assert store.needs_check(Contact('小明', tags=['朋友'], wxid='wxid_a'), now=NOW)
+
+
+def test_update_tags_does_not_trigger_recheck(store):
+    contact = Contact('小明', wxid='wxid_a')
+    store.record(ScanResult(contact, STATUS_THREE_DAYS, 1.0))
+    contact.tags.append('仅三天可见')
+    assert store.needs_check(contact, now=NOW)
+    store.update_tags(contact)
+    assert not store.needs_check(contact, now=NOW)
+    assert store.get(contact)['last_checked'] == NOW
+
+
+def test_needs_check_after_failure(store):
+    contact = Contact('小明', wxid='wxid_a')
+    store.record(ScanResult(contact, STATUS_FAILED, 8.0, '朋友圈没有加载出来'))
+    assert store.needs_check(contact, now=NOW)
+    assert store.get(contact)['last_error'] == '朋友圈没有加载出来'
+
+
+def test_stale_filters_contacts(store):
+    fresh, failed, new = Contact('a', wxid='1'), Contact('b', wxid='2'), Contact('c', wxid='3')
+    store.record(ScanResult(fresh, STATUS_NORMAL, 1.0))
+    store.record(ScanResult(failed, STATUS_FAILED, 1.0))
+    assert store.stale([fresh, failed, new], now=NOW) == [failed, new]
+
+
+def test_contact_key_prefers_wxid_then_nickname(store):
+    store.record(ScanResult(Contact('小明', remark='明哥', wxid='wxid_a'), STATUS_NORMAL, 1.0))
+    store.record(ScanResult(Contact('小红', remark='红姐'), STATUS_NORMAL, 1.0))
+    assert keys(store) == ['nickname:小红', 'wxid:wxid_a']
+    # 备注名修改后仍然是同一个好友
+    assert store.get(Contact('小红', remark='新备注')) is not None
+
+
+def test_record_replaces_legacy_key(store, tmp_path):
+    path = write_legacy(tmp_path, {'明哥': LEGACY_CHECKED, '小红': {'朋友圈状态': STATUS_NORMAL, '当前标签': []}})
+    assert store.import_legacy(path) == 2
+    assert keys(store) == ['name:小红', 'name:明哥']
+
+    # 旧记录按显示名匹配
+    with_wxid = Contact('小明', remark='明哥', wxid='wxid_a')
+    without_wxid = Contact('小红')
+    assert store.get(with_wxid)['contact_key'] == 'name:明哥'
+    # 旧版只记录了“已检查”，没有标签，不比较标签；有效期从文件修改时间算起
+    assert not store.needs_check(with_wxid, now=NOW)
+    assert store.needs_check(with_wxid, now=NOW - 60 + TTL)
+
+    store.record(ScanResult(with_wxid, STATUS_THREE_DAYS, 1.0))
+    store.record(ScanResult(without_wxid, STATUS_NORMAL, 1.0))
+    assert keys(store) == ['nickname:小红', 'wxid:wxid_a']
+    assert store.get(with_wxid)['status'] == STATUS_THREE_DAYS
+
+
+def test_import_legacy_keeps_existing_rows(store, tmp_path):
+    contact = Contact('小明', remark='明哥', tags=['同事'], wxid='wxid_a')
+    store.record(ScanResult(contact, STATUS_THREE_DAYS, 1.0))
+    simple = write_legacy(tmp_path, {'明哥': LEGACY_CHECKED, '小红': LEGACY_CHECKED}, 'simple.json')
+    detailed = write_legacy(tmp_path, {
+        '明哥': {'昵称': '小明', '备注': '明哥', '朋友圈状态': STATUS_NORMAL, '当前标签': []},
+        '小刚': {'昵称': '小刚', '备注': '', '朋友圈状态': STATUS_THREE_DAYS, '当前标签': ['仅三天可见']},
+    }, 'detailed.json')
+
+    assert store.import_legacy(simple) == 1
+    assert store.import_legacy(detailed) == 1
+    # 重复导入不会增加或覆盖记录
+    assert store.import_legacy(simple) == 0
+    assert store.import_legacy(detailed) == 0
+
+    record = store.get(contact)
+    assert (record['contact_key'], record['status'], record['tags']) == ('wxid:wxid_a', STATUS_THREE_DAYS, ['同事'])
+    assert store.get(Contact('小红'))['status'] is None
+    gang = store.get(Contact('小刚'))
+    # 没有检查时间的记录以文件修改时间作为检查时间
+    assert (gang['status'], gang['tags'], gang['last_checked']) == (STATUS_THREE_DAYS, ['仅三天可见'], NOW - 60)
+    assert store.counts() == {STATUS_THREE_DAYS: 2, None: 1}
+
+
+def test_export_json_round_trip(store, tmp_path):
+    store.record(ScanResult(Contact('小明', remark='明哥', tags=['同事'], wxid='wxid_a'), STATUS_THREE_DAYS, 1.0))
+    store.record(ScanResult(Contact('小红'), STATUS_NORMAL, 1.0))
+    store.import_legacy(write_legacy(tmp_path, {'老王': LEGACY_CHECKED}))
+    path = str(tmp_path / 'export.json')
+
+    assert store.export_json(path) == 3
+    assert not os.path.exists(path + '.tmp')
+    with open(path, encoding='utf-8') as f:
+        exported = json.load(f)
+    assert exported['老王'] == LEGACY_CHECKED
+    assert exported['明哥']['朋友圈状态'] == STATUS_THREE_DAYS
+    assert exported['明哥']['当前标签'] == ['同事']
+
+    with ScanStore(':memory:', ttl=TTL) as restored:
+        assert restored.import_legacy(path) == 3
+        fields = ('name', 'nickname', 'remark', 'status', 'tags')
+        assert ([{key: record[key] for key in fields} for record in restored.records()] ==
+                [{key: record[key] for key in fields} for record in store.records()])
+        # 检查时间按导出的时间恢复，不会因为导入而延长有效期；旧格式的“已检查”没有检查时间
+        assert ([record['last_checked'] for record in restored.records(STATUS_THREE_DAYS)] ==
+                [record['last_checked'] for record in store.records(STATUS_THREE_DAYS)] == [NOW])
+        restored.export_json(path)
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f) == exported